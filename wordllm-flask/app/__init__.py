@@ -22,6 +22,9 @@ def create_app(config_class=None):
         app.config.from_object('config.Config')
     else:
         app.config.from_object(config_class)
+    # 没有应用上下文的线程通过app.utils.app_config.get_config读取本应用的配置
+    from app.utils.app_config import set_app_config
+    set_app_config(app.config)
     
     # 确保必要的目录存在
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -32,7 +35,9 @@ def create_app(config_class=None):
     migrate.init_app(app, db)
     jwt.init_app(app)
     CORS(app, origins=app.config['CORS_ORIGIN'], supports_credentials=True)
-    socketio.init_app(app, cors_allowed_origins=app.config['CORS_ORIGIN'], ping_interval=app.config['WS_HEARTBEAT_INTERVAL']//1000)
+    # 配置消息队列后，各进程的推送经队列转发给所有Web进程上的客户端
+    socketio.init_app(app, cors_allowed_origins=app.config['CORS_ORIGIN'], ping_interval=app.config['WS_HEARTBEAT_INTERVAL']//1000,
+                      message_queue=app.config.get('WS_MESSAGE_QUEUE') or None)
     
     # 设置日志
     if not app.debug:
@@ -59,6 +64,10 @@ def create_app(config_class=None):
     from app.websocket import register_websocket_handlers
     register_websocket_handlers(socketio)
     
+    # 检查常用查询依赖的索引是否已通过迁移创建
+    from app.utils.schema_check import check_indexes
+    check_indexes(app)
+    
     @app.route('/')
     def index():
         return {'status': 'WordLLM API is running'}
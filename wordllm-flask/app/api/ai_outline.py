@@ -1,6 +1,4 @@
 from flask import request, jsonify, current_app, Response, stream_with_context
-import os
-import uuid
 import json
 from datetime import datetime
 from app.api import bp
@@ -11,11 +9,39 @@ from app.services.ai_service import get_ai_service
 from app.services.ai.model_caller import ModelCaller
 from app.services.ai.prompt_handler import PromptHandler
 from app.services.ai.content_extractor import ContentExtractor
-from werkzeug.utils import secure_filename
+from app.services.input_files import InputFileService
+from app.services.ai.async_model_caller import AsyncModelCaller
+from app.services.ai.async_runner import get_async_runner
+from app.services.ai.client_registry import get_async_openai_client
+from app.services.ai.outline_stream import OutlineStreamParser, StreamClock, outline_stream_timings
+from app.services.chapter_store import ChapterStore
+from app.services.event_streams import get_event_streams
 import logging
 
 logger = logging.getLogger(__name__)
 
+def stream_outline_text(ai_service, prompt, use_async=False, use_cache=True):
+    """流式调用模型生成大纲，返回文本增量的同步迭代器
+    
+    Args:
+        ai_service: AI服务实例
+        prompt: 提示词
+        use_async: 是否通过共享事件循环异步调用
+        use_cache: 是否使用响应缓存，重新生成时为False
+    """
+    if use_async:
+        runner = get_async_runner()
+        client = get_async_openai_client()
+        return runner.iterate(AsyncModelCaller.stream_model(client, ai_service.model, prompt, use_cache=use_cache))
+    
+    def sync_stream():
+        response_stream = ModelCaller.call_model_streaming(ai_service.client, ai_service.model, prompt, use_cache=use_cache)
+        # 新版OpenAI SDK (1.0.0+)的流式响应格式
+        for chunk in response_stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    return sync_stream()
+
 @bp.route('/outlines/generate-streaming', methods=['POST'])
 def generate_outline_streaming():
     """
@@ -23,6 +49,12 @@ def generate_outline_streaming():
     请求体应包含:
     - template_id: 模板ID
     - input_file: (可选) 输入文件
+    - regenerate: (可选) 为true时跳过响应缓存，强制重新调用模型
+    - input_file_id: (可选) 已登记的输入文件ID，代替input_file
+    查询参数:
+    - format: (可选) 为ndjson时每行返回一个事件，章节在闭合时立即以chapter事件返回并落库；
+      为sse时以text/event-stream返回token、chapter、progress、done、error事件，
+      响应头X-Stream-Id为流ID，断线后可通过GET /api/streams/<流ID>携带Last-Event-ID续传
     """
     try:
         # 检查模板ID
@@ -34,51 +66,11 @@ def generate_outline_streaming():
         if not template:
             return not_found(f'未找到ID为{template_id}的模板')
         
-        # 处理上传的输入文件
-        input_file_path = None
-        if 'input_file' in request.files:
-            input_file = request.files['input_file']
-            if input_file.filename:
-                # 保存上传的文件
-                original_filename = input_file.filename
-                logger.info(f"原始文件名: {original_filename}")
-                
-                filename = secure_filename(original_filename)
-                logger.info(f"secure_filename后的文件名: {filename}")
-                
-                # 为避免文件名冲突，添加时间戳
-                file_ext = os.path.splitext(filename)[1]
-                logger.info(f"提取的文件扩展名: '{file_ext}'")
-                
-                # 修正: 如果没有扩展名，尝试从content-type推断
-                if not file_ext:
-                    content_type = input_file.content_type
-                    logger.info(f"文件的Content-Type: {content_type}")
-                    
-                    # 根据MIME类型推断扩展名
-                    if content_type == 'application/msword' or content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                        file_ext = '.docx'
-                        logger.info("从content-type推断出扩展名.docx")
-                    elif content_type == 'text/plain':
-                        file_ext = '.txt'
-                        logger.info("从content-type推断出扩展名.txt")
-                    elif content_type == 'application/pdf':
-                        file_ext = '.pdf'
-                        logger.info("从content-type推断出扩展名.pdf")
-                    else:
-                        logger.warning(f"未知的content-type: {content_type}，使用.docx作为默认扩展名")
-                        file_ext = '.docx'  # 默认使用.docx
-                        
-                unique_filename = f"input_{uuid.uuid4().hex}{file_ext}"
-                logger.info(f"生成的唯一文件名: {unique_filename}")
-                
-                # 确保目录存在
-                upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'inputs')
-                os.makedirs(upload_folder, exist_ok=True)
-                
-                input_file_path = os.path.join(upload_folder, unique_filename)
-                input_file.save(input_file_path)
-                logger.info(f"已保存输入文件: {input_file_path}")
+        # 处理输入文件: 引用已登记的input_file_id，或上传input_file(按内容去重登记)
+        try:
+            input_file_path = InputFileService.resolve_request_input(request.form.get('project_id'))
+        except ValueError as e:
+            return bad_request(str(e))
         
         # 检查是否有自定义提示词
         outline_prompt = request.form.get('outline_prompt')
@@ -98,106 +90,136 @@ def generate_outline_streaming():
         if input_file_path:
             input_content = ContentExtractor.extract_file_content(input_file_path)
         
-        # 3. 使用PromptHandler构建提示词
-        prompt = PromptHandler.build_outline_prompt(template_content, input_content, outline_prompt)
-        print(f"[测试-后端] 使用的提示词类型: {'自定义' if outline_prompt else '默认'}")
-        
-        # 4. 获取AI客户端
+        # 3. 获取AI客户端
         ai_service = get_ai_service()
         
-        def generate():
-            """流式生成响应内容"""
+        # 4. 使用PromptHandler构建提示词
+        prompt = PromptHandler.build_outline_prompt(template_content, input_content, outline_prompt, model=ai_service.model)
+        print(f"[测试-后端] 使用的提示词类型: {'自定义' if outline_prompt else '默认'}")
+        # 是否走异步模型调用（共享事件循环，不为每个上游调用占用线程）
+        use_async = request.args.get('async', str(current_app.config.get('ASYNC_MODEL_CALLS', False))).lower() in ('1', 'true')
+        # 用户点击"重新生成"时跳过响应缓存
+        use_cache = request.form.get('regenerate', 'false').lower() not in ('1', 'true')
+        
+        # format=ndjson时逐行返回结构化事件，format=sse时返回SSE事件流，否则保持原有的单个JSON字符串格式
+        response_format = request.args.get('format')
+        # 生成在后台执行时请求中的模板对象已失效，只保留需要的字段
+        template_info = {'id': template.id, 'title': template.title}
+        
+        def outline_events():
+            """调用模型并在每个章节闭合时立即落库，产出(事件类型, 数据)"""
+            from app.models.project import Chapter
+            clock = StreamClock()
+            parser = OutlineStreamParser()
+            order_index = 0
+            # 模型偶尔会重复输出同一编号，(project_id, chapter_number)有唯一索引
+            seen_numbers = set()
             try:
-                # 使用流式响应调用模型
-                # 注意：使用ai_service实例已初始化的client
-                # 如果在ModelCaller中无法获取到client，它会自动从配置文件创建新的客户端
-                # 传送ai_service.client而不是None
-                response_stream = ModelCaller.call_model_streaming(ai_service.client, ai_service.model, prompt)
-                
-                # 发送响应头部，告诉前端这是JSON类型
-                yield '{"success":true,"streaming":true,"content":"'
-                
-                # 保存完整的响应内容，用于后续解析和存储
-                full_content = ""
-                
-                # 新版OpenAI SDK (1.0.0+)的流式响应格式
-                for chunk in response_stream:
-                    if hasattr(chunk.choices[0].delta, 'content') and chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        if content:
-                            # 对特殊字符进行转义，确保JSON有效
-                            escaped_content = content.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
-                            full_content += content
-                            # 实时返回内容
-                            yield escaped_content
+                # 使用流式响应调用模型，得到文本增量的迭代器
+                text_stream = stream_outline_text(ai_service, prompt, use_async, use_cache)
+                for content in text_stream:
+                    yield 'delta', content
+                    chapters = []
+                    for ch in parser.feed(content):
+                        if ch['chapterNumber'] not in seen_numbers:
+                            seen_numbers.add(ch['chapterNumber'])
+                            chapters.append(ch)
+                    if not chapters:
+                        continue
+                    if order_index == 0:
+                        # 第一个章节到达时才删除旧章节，模型调用失败时保留原有大纲
+                        Chapter.query.filter_by(project_id=project_id).delete()
+                    saved = []
+                    for ch in chapters:
+                        db_chapter = Chapter(
+                            project_id=project_id,
+                            chapter_number=ch['chapterNumber'],
+                            title=ch['title'],
+                            content=ch['content'],
+                            parent_id=ch['parent_id'],
+                            order_index=order_index
+                        )
+                        db.session.add(db_chapter)
+                        saved.append(db_chapter)
+                        order_index += 1
+                    db.session.commit()
+                    clock.mark_chapter()
+                    for db_chapter in saved:
+                        yield 'chapter', {
+                            'id': db_chapter.id,
+                            'chapterNumber': db_chapter.chapter_number,
+                            'title': db_chapter.title,
+                            'parent_id': db_chapter.parent_id,
+                            'order_index': db_chapter.order_index
+                        }
             except Exception as e:
                 logger.error(f"流式调用错误: {str(e)}")
                 logger.exception(e)  # 输出完整堆栈跟踪
-                yield f'\\n\\n错误: {str(e)}"}}'
-                return  # 值退出生成器
-            
-            # 尝试解析全部内容为JSON
-            try:
-                from sqlalchemy import and_
-                from app.models.project import Chapter
-                from app import db
-                
-                # 尝试解析JSON内容
-                # 清理可能的非JSON前缀
-                processed_content = full_content
-                if '```json' in processed_content:
-                    processed_content = processed_content.split('```json')[1]
-                if '```' in processed_content:
-                    processed_content = processed_content.split('```')[0]
-                
-                # 查找JSON开始和结束的位置
-                start_idx = processed_content.find('{')
-                end_idx = processed_content.rfind('}')
-                if start_idx >= 0 and end_idx > start_idx:
-                    processed_content = processed_content[start_idx:end_idx+1]
-                
-                # 解析为JSON对象
-                outline_result = json.loads(processed_content)
-                
-                # 设置chapters如果不存在
-                if 'chapters' not in outline_result:
-                    if isinstance(outline_result, list):
-                        outline_result = {"chapters": outline_result}
-                    else:
-                        outline_result = {"chapters": []}
-                
-                # 先删除该项目下所有章节
-                Chapter.query.filter_by(project_id=project_id).delete()
-                db.session.commit()
-                
-                # 保存章节到数据库
-                ai_chapters = outline_result.get('chapters', [])
-                for idx, ch in enumerate(ai_chapters):
-                    chapter_number = ch.get('chapterNumber') or ch.get('chapter_number') or ch.get('id')
-                    title = ch.get('title') or '未命名章节'
-                    content = ch.get('content', '')
-                    parent_id = ch.get('parent_id') or ch.get('parentId')
-                    
-                    db_chapter = Chapter(
-                        project_id=project_id,
-                        chapter_number=chapter_number,
-                        title=title,
-                        content=content,
-                        parent_id=parent_id,
-                        order_index=idx
-                    )
-                    db.session.add(db_chapter)
-                db.session.commit()
-                
-                # 正常结束响应
-                yield '","parsed":true,"template":{"id":' + str(template.id) + ',"title":"' + template.title + '"},"timestamp":"' + datetime.now().isoformat() + '"}'
+                db.session.rollback()
+                yield 'error', str(e)
+                return
+            finally:
+                outline_stream_timings.record(clock.first_chapter, clock.elapsed(), order_index)
             
-            except Exception as e:
-                logger.error(f"解析或保存章节失败: {str(e)}")
-                # 结束响应，但标记解析失败
-                yield '","parsed":false,"error":"' + str(e) + '"}'
+            logger.info(f"流式大纲生成完成: 章节数={order_index}, 首章节耗时={clock.first_chapter}, 总耗时={clock.elapsed():.2f}s")
+            yield 'done', {
+                'parsed': order_index > 0,
+                'chapters': order_index,
+                'template': template_info,
+                'metrics': {
+                    'time_to_first_chapter_ms': round(clock.first_chapter * 1000, 1) if clock.first_chapter is not None else None,
+                    'total_ms': round(clock.elapsed() * 1000, 1)
+                },
+                'timestamp': datetime.now().isoformat()
+            }
+        
+        def generate_ndjson():
+            """每行一个事件: delta(文本增量)、chapter(已保存的章节)、done、error"""
+            for event, data in outline_events():
+                yield json.dumps({'type': event, 'data': data}, ensure_ascii=False) + '\n'
+        
+        def generate():
+            """流式生成响应内容（原有格式，content中是模型的原始输出）"""
+            # 发送响应头部，告诉前端这是JSON类型
+            yield '{"success":true,"streaming":true,"content":"'
+            for event, data in outline_events():
+                if event == 'delta':
+                    # 对特殊字符进行转义，确保JSON有效
+                    yield data.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+                elif event == 'error':
+                    yield json.dumps(f'\n\n错误: {data}', ensure_ascii=False)[1:] + '}'
+                elif event != 'done':
+                    # 原有格式中章节只在结束后通过接口查询
+                    continue
+                elif data['parsed']:
+                    # 正常结束响应
+                    yield '","parsed":true,"template":' + json.dumps(data['template'], ensure_ascii=False) + ',"timestamp":"' + data['timestamp'] + '"}'
+                else:
+                    # 结束响应，但标记解析失败
+                    yield '","parsed":false,"error":"未能从模型输出中解析出章节"}'
+        
+        def sse_events(publish):
+            """SSE事件: token(文本增量)、chapter(已保存的章节)、progress(已保存的章节数)、done、error"""
+            yield 'progress', {'stage': 'generating', 'chapters': 0}
+            chapter_count = 0
+            for event, data in outline_events():
+                if event == 'delta':
+                    yield 'token', {'text': data}
+                elif event == 'chapter':
+                    chapter_count += 1
+                    yield 'chapter', data
+                    yield 'progress', {'stage': 'generating', 'chapters': chapter_count}
+                elif event == 'error':
+                    yield 'error', {'message': data}
+                else:
+                    yield event, data
         
         # 返回流式响应
+        if response_format == 'sse':
+            streams = get_event_streams()
+            return streams.response(streams.start('outline', sse_events))
+        if response_format == 'ndjson':
+            return Response(stream_with_context(generate_ndjson()), content_type='application/x-ndjson')
         return Response(stream_with_context(generate()), content_type='application/json')
     
     except Exception as e:
@@ -217,6 +239,7 @@ def generate_outline():
     请求体应包含:
     - template_id: 模板ID
     - input_file: (可选) 输入文件
+    - regenerate: (可选) 为true时跳过响应缓存，强制重新调用模型
     """
     try:
         # 检查模板ID
@@ -228,118 +251,29 @@ def generate_outline():
         if not template:
             return not_found(f'未找到ID为{template_id}的模板')
         
-        # 处理上传的输入文件
-        input_file_path = None
-        if 'input_file' in request.files:
-            input_file = request.files['input_file']
-            if input_file.filename:
-                # 保存上传的文件
-                original_filename = input_file.filename
-                logger.info(f"原始文件名: {original_filename}")
-                
-                filename = secure_filename(original_filename)
-                logger.info(f"secure_filename后的文件名: {filename}")
-                
-                # 为避免文件名冲突，添加时间戳
-                file_ext = os.path.splitext(filename)[1]
-                logger.info(f"提取的文件扩展名: '{file_ext}'")
-                
-                # 修正: 如果没有扩展名，尝试从content-type推断
-                if not file_ext:
-                    content_type = input_file.content_type
-                    logger.info(f"文件的Content-Type: {content_type}")
-                    
-                    # 根据MIME类型推断扩展名
-                    if content_type == 'application/msword' or content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                        file_ext = '.docx'
-                        logger.info("从content-type推断出扩展名.docx")
-                    elif content_type == 'text/plain':
-                        file_ext = '.txt'
-                        logger.info("从content-type推断出扩展名.txt")
-                    elif content_type == 'application/pdf':
-                        file_ext = '.pdf'
-                        logger.info("从content-type推断出扩展名.pdf")
-                    else:
-                        logger.warning(f"未知的content-type: {content_type}，使用.docx作为默认扩展名")
-                        file_ext = '.docx'  # 默认使用.docx
-                        
-                unique_filename = f"input_{uuid.uuid4().hex}{file_ext}"
-                logger.info(f"生成的唯一文件名: {unique_filename}")
-                
-                # 确保目录存在
-                upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'inputs')
-                os.makedirs(upload_folder, exist_ok=True)
-                
-                input_file_path = os.path.join(upload_folder, unique_filename)
-                input_file.save(input_file_path)
-                logger.info(f"已保存输入文件: {input_file_path}")
+        # 处理输入文件: 引用已登记的input_file_id，或上传input_file(按内容去重登记)
+        try:
+            input_file_path = InputFileService.resolve_request_input(request.form.get('project_id'))
+        except ValueError as e:
+            return bad_request(str(e))
         
         # 检查是否有自定义提示词
         outline_prompt = request.form.get('outline_prompt')
         print(f"[测试-后端] 接收到的outline_prompt: {outline_prompt}")
         
-        # 调用AI服务生成大纲
+        # 调用AI服务生成大纲，用户点击"重新生成"时跳过响应缓存
+        use_cache = request.form.get('regenerate', 'false').lower() not in ('1', 'true')
         ai_service = get_ai_service()
-        outline_result = ai_service.generate_document_outline(template_id, input_file_path, outline_prompt)
+        outline_result = ai_service.generate_document_outline(template_id, input_file_path, outline_prompt, use_cache=use_cache)
         
         # === 新增：将AI生成的大纲直接存入数据库 ===
-        from app.models.project import Chapter
-        # 先删除该项目下所有章节
         project_id = request.form.get('project_id')
         if not project_id:
             return bad_request('必须提供project_id参数')
-        Chapter.query.filter_by(project_id=project_id).delete()
-        db.session.commit()
-        # === 新逻辑：只处理3/4级章节 ===
-        def is_3_or_4_level(chap_num):
-            return chap_num and str(chap_num).count('.') >= 2
-        chapters = outline_result.get('chapters', [])
-        ai_chapters = chapters  # 不做过滤，全部写入
-        ai_numbers = set((ch.get('chapterNumber') or ch.get('chapter_number') or ch.get('id')) for ch in ai_chapters)
-        # 删除数据库中未被AI返回的章节
-        from sqlalchemy import and_, not_
-        Chapter.query.filter(
-            Chapter.project_id == project_id,
-            not_(Chapter.chapter_number.in_(ai_numbers))
-        ).delete(synchronize_session=False)
-        db.session.commit()
-        # upsert AI返回的所有章节
-        for idx, ch in enumerate(ai_chapters):
-            chapter_number = ch.get('chapterNumber') or ch.get('chapter_number') or ch.get('id')
-            title = ch.get('title') or '未命名章节'
-            content = ch.get('content', '')
-            parent_id = ch.get('parent_id') or ch.get('parentId')
-            db_chapter = Chapter.query.filter(and_(Chapter.project_id==project_id, Chapter.chapter_number==chapter_number)).first()
-            if db_chapter:
-                db_chapter.title = title
-                db_chapter.content = content
-                db_chapter.parent_id = parent_id
-                db_chapter.order_index = idx
-            else:
-                db_chapter = Chapter(
-                    project_id=project_id,
-                    chapter_number=chapter_number,
-                    title=title,
-                    content=content,
-                    parent_id=parent_id,
-                    order_index=idx
-                )
-                db.session.add(db_chapter)
-        db.session.commit()
+        # 按chapter_number一次性对比，批量插入、更新并删除未被AI返回的章节
+        ChapterStore.sync_chapters(project_id, outline_result.get('chapters', []), reset_content=True)
         # 组织返回数据（只返回数据库中的章节）
-        # 读取数据库中的所有章节（再次确认）
-        all_db_chapters = Chapter.query.filter_by(project_id=project_id).order_by(Chapter.order_index).all()
-        db_chapters_full = [
-            {
-                'id': ch.id,
-                'chapter_number': ch.chapter_number,
-                'title': ch.title,
-                'content': ch.content,
-                'parent_id': ch.parent_id,
-                'order_index': ch.order_index
-            }
-            for ch in all_db_chapters
-        ]
+        db_chapters_full = ChapterStore.to_dicts(project_id)
         response = {
             'success': True,
             'data': {'chapters': db_chapters_full},
@@ -412,48 +346,11 @@ def regenerate_outline():
         if not template:
             return not_found(f'未找到ID为{template_id}的模板')
         
-        # 处理上传的输入文件（复用之前的代码）
-        input_file_path = None
-        if 'input_file' in request.files:
-            input_file = request.files['input_file']
-            if input_file.filename:
-                # 保存上传的文件
-                original_filename = input_file.filename
-                logger.info(f"原始文件名: {original_filename}")
-                
-                filename = secure_filename(original_filename)
-                logger.info(f"secure_filename后的文件名: {filename}")
-                
-                # 为避免文件名冲突，添加时间戳
-                file_ext = os.path.splitext(filename)[1]
-                logger.info(f"提取的文件扩展名: '{file_ext}'")
-                
-                # 修正: 如果没有扩展名，尝试从content-type推断
-                if not file_ext:
-                    content_type = input_file.content_type
-                    logger.info(f"文件的Content-Type: {content_type}")
-                    
-                    # 根据MIME类型推断扩展名
-                    if content_type == 'application/msword' or content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                        file_ext = '.docx'
-                    elif content_type == 'text/plain':
-                        file_ext = '.txt'
-                    elif content_type == 'application/pdf':
-                        file_ext = '.pdf'
-                    # 可以根据需要添加更多文件类型
-                
-                # 生成唯一文件名
-                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                unique_filename = f"{os.path.splitext(filename)[0]}_{timestamp}{file_ext}"
-                
-                # 确保上传目录存在
-                upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'inputs')
-                os.makedirs(upload_folder, exist_ok=True)
-                
-                # 保存文件
-                input_file_path = os.path.join(upload_folder, unique_filename)
-                input_file.save(input_file_path)
-                logger.info(f"已保存输入文件: {input_file_path}")
+        # 处理输入文件: 引用已登记的input_file_id，或上传input_file(按内容去重登记)
+        try:
+            input_file_path = InputFileService.resolve_request_input(data.get('project_id') or request.form.get('project_id'))
+        except ValueError as e:
+            return bad_request(str(e))
         
         # 准备重新生成配置
         regenerate_config = {}
@@ -469,9 +366,8 @@ def regenerate_outline():
             regenerate_config
         )
         
-        # === 新逻辑：将AI生成的新章节先写入数据库 ===
+        # === 新逻辑：将AI生成的新章节写入数据库 ===
         from app.models.project import Chapter
-        # 1. 先删除该项目下原有章节（如需保留用户指定章节可做特殊处理）
         project_id = template.project_id if hasattr(template, 'project_id') else None
         if not project_id and 'project_id' in data:
             project_id = data['project_id']
@@ -481,43 +377,23 @@ def regenerate_outline():
         preserved_numbers = set()
         if preserved_chapters:
             preserved_numbers = set([ch.get('chapter_number') or ch.get('chapterNumber') for ch in preserved_chapters])
-        # 删除未保留的章节
-        all_chapters = Chapter.query.filter_by(project_id=project_id).all()
-        for ch in all_chapters:
-            if ch.chapter_number not in preserved_numbers:
-                db.session.delete(ch)
-        db.session.commit()
-        # 2. 插入AI生成的新章节
-        new_chapters = result.get('chapters', [])
-        # 获取当前最大order_index
-        max_order = db.session.query(db.func.max(Chapter.order_index)).filter_by(project_id=project_id).scalar() or 0
-        for idx, ch in enumerate(new_chapters):
-            chapter_number = ch.get('chapterNumber') or ch.get('chapter_number')
-            if chapter_number in preserved_numbers:
-                continue  # 跳过已保留的章节
-            chapter = Chapter(
-                project_id=project_id,
-                chapter_number=chapter_number,
-                title=ch.get('title'),
-                content='',
-                parent_id=None,
-                order_index=max_order + idx + 1
-            )
-            db.session.add(chapter)
-        db.session.commit()
-        # 3. 从数据库读取所有章节，返回给前端
-        all_db_chapters = Chapter.query.filter_by(project_id=project_id).order_by(Chapter.order_index).all()
-        db_chapters_full = [
-            {
-                'id': ch.id,
-                'chapter_number': ch.chapter_number,
-                'title': ch.title,
-                'content': ch.content,
-                'parent_id': ch.parent_id,
-                'order_index': ch.order_index
-            }
-            for ch in all_db_chapters
+        # 保留的章节不参与对比，新章节排在保留章节之后
+        scope = None
+        max_order = 0
+        if preserved_numbers:
+            scope = Chapter.chapter_number.notin_(preserved_numbers)
+            max_order = db.session.query(db.func.max(Chapter.order_index)).filter(
+                Chapter.project_id == project_id,
+                Chapter.chapter_number.in_(preserved_numbers)
+            ).scalar() or 0
+        new_chapters = [
+            {'chapter_number': ch.get('chapterNumber') or ch.get('chapter_number'), 'title': ch.get('title'), 'order_index': max_order + idx + 1}
+            for idx, ch in enumerate(result.get('chapters', []))
+            if (ch.get('chapterNumber') or ch.get('chapter_number')) not in preserved_numbers
         ]
+        ChapterStore.sync_chapters(project_id, new_chapters, scope=scope, reset_content=True)
+        # 从数据库读取所有章节，返回给前端
+        db_chapters_full = ChapterStore.to_dicts(project_id)
         response = {
             'success': True,
             'data': {'chapters': db_chapters_full},
@@ -548,6 +424,9 @@ def generate_subchapters():
     - template_id: 模板ID
     - chapters: 现有章节列表，包含chapterNumber和title
     - input_file: (可选) 输入文件
+    - input_file_id: (可选) 已登记的输入文件ID，代替input_file
+    查询参数:
+    - format: (可选) 为sse时在后台生成，以text/event-stream返回progress、chapter、done、error事件
     """
     try:
         # 检查必要的字段
@@ -575,64 +454,11 @@ def generate_subchapters():
         if not template:
             return not_found(f'未找到ID为{template_id}的模板')
         
-        # 处理上传的输入文件（复用这部分代码）
-        input_file_path = None
-        if 'input_file' in request.files:
-            input_file = request.files['input_file']
-            if input_file.filename:
-                # 保存上传的文件
-                original_filename = input_file.filename
-                logger.info(f"原始文件名: {original_filename}")
-                
-                filename = secure_filename(original_filename)
-                logger.info(f"secure_filename后的文件名: {filename}")
-                
-                # 为避免文件名冲突，添加时间戳
-                file_ext = os.path.splitext(filename)[1]
-                logger.info(f"提取的文件扩展名: '{file_ext}'")
-                
-                # 修正: 如果没有扩展名，尝试从content-type推断
-                if not file_ext:
-                    content_type = input_file.content_type
-                    logger.info(f"文件的Content-Type: {content_type}")
-                    
-                    # 根据MIME类型推断扩展名
-                    if content_type == 'application/msword' or content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                        file_ext = '.docx'
-                        logger.info("从content-type推断出扩展名.docx")
-                    elif content_type == 'text/plain':
-                        file_ext = '.txt'
-                        logger.info("从content-type推断出扩展名.txt")
-                    elif content_type == 'application/pdf':
-                        file_ext = '.pdf'
-                        logger.info("从content-type推断出扩展名.pdf")
-                    else:
-                        logger.warning(f"未知的content-type: {content_type}，使用.docx作为默认扩展名")
-                        file_ext = '.docx'  # 默认使用.docx
-                        
-                unique_filename = f"input_{uuid.uuid4().hex}{file_ext}"
-                logger.info(f"生成的唯一文件名: {unique_filename}")
-                
-                # 确保目录存在
-                upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'inputs')
-                os.makedirs(upload_folder, exist_ok=True)
-                
-                input_file_path = os.path.join(upload_folder, unique_filename)
-                input_file.save(input_file_path)
-                logger.info(f"已保存输入文件: {input_file_path}")
-        
-        # 调用AI服务生成子章节
-        ai_service = get_ai_service()
-        ai_result = ai_service.generate_subchapters(template_id, chapters, input_file_path)
-        # 如果AI结果是字符串，尝试解析为JSON
-        if isinstance(ai_result, str):
-            try:
-                subchapters_result = json.loads(ai_result)
-            except Exception as e:
-                print(f"AI子章节响应不是合法JSON，原始内容: {ai_result}")
-                return internal_error(f"AI子章节响应不是合法JSON: {e}")
-        else:
-            subchapters_result = ai_result
+        # 处理输入文件: 引用已登记的input_file_id，或上传input_file(按内容去重登记)
+        try:
+            input_file_path = InputFileService.resolve_request_input((data or {}).get('project_id') or request.form.get('project_id'))
+        except ValueError as e:
+            return bad_request(str(e))
         
         # 1. 获取project_id（假设前端有传递，或可通过template查找）
         project_id = None
@@ -649,55 +475,56 @@ def generate_subchapters():
         if not project_id:
             return bad_request('无法确定project_id，无法保存章节')
 
-        # 2. 先删除原有3/4级子章节（可选，视业务需求）
-        from app.models.project import Chapter
-        # 这里只是示例，实际可根据chapter_number规则删除
-        # db.session.query(Chapter).filter(Chapter.project_id==project_id, Chapter.chapter_number.like('%.%.%')).delete(synchronize_session=False)
-        # db.session.commit()
+        ai_service = get_ai_service()
+        
+        def generate_and_save():
+            """调用AI服务生成子章节并写入数据库，返回数据库中的全部章节"""
+            ai_result = ai_service.generate_subchapters(template_id, chapters, input_file_path)
+            # 如果AI结果是字符串，尝试解析为JSON
+            if isinstance(ai_result, str):
+                try:
+                    subchapters_result = json.loads(ai_result)
+                except Exception as e:
+                    print(f"AI子章节响应不是合法JSON，原始内容: {ai_result}")
+                    raise ValueError(f"AI子章节响应不是合法JSON: {e}")
+            else:
+                subchapters_result = ai_result
 
-        # 3. 只处理3/4级子章节：先删后插
-        def is_3_or_4_level(chap_num):
-            return chap_num and str(chap_num).count('.') >= 2
-        ai_chapters = [ch for ch in subchapters_result.get('chapters', []) if is_3_or_4_level(ch.get('chapterNumber'))]
-        # 删除所有3/4级
-        Chapter.query.filter(
-            Chapter.project_id == project_id,
-            Chapter.chapter_number.like('%.%.%')
-        ).delete(synchronize_session=False)
-        db.session.commit()
-        # 插入AI返回的3/4级
-        for idx, ch in enumerate(ai_chapters):
-            chapter_number = ch.get('chapterNumber')
-            title = ch.get('title')
-            db_chapter = Chapter(
-                project_id=project_id,
-                chapter_number=chapter_number,
-                title=title,
-                content='',
-                parent_id=None,
-                order_index=idx
-            )
-            db.session.add(db_chapter)
-        db.session.commit()
-        # === 新增：全局order_index重排，保证顺序唯一 ===
-        all_chapters = Chapter.query.filter_by(project_id=project_id).order_by(Chapter.chapter_number.asc()).all()
-        for idx, ch in enumerate(all_chapters):
-            ch.order_index = idx
-        db.session.commit()
+            # 2. 只处理3/4级子章节：与已有3/4级章节对比后批量写入
+            from app.models.project import Chapter
+            def is_3_or_4_level(chap_num):
+                return chap_num and str(chap_num).count('.') >= 2
+            ai_chapters = [
+                {'chapter_number': ch.get('chapterNumber'), 'title': ch.get('title')}
+                for ch in subchapters_result.get('chapters', []) if is_3_or_4_level(ch.get('chapterNumber'))
+            ]
+            ChapterStore.sync_chapters(project_id, ai_chapters, scope=Chapter.chapter_number.like('%.%.%'), reset_content=True, commit=False)
+            # === 新增：全局order_index重排，保证顺序唯一 ===
+            ChapterStore.reorder_by_number(project_id)
 
-        # 4. 从数据库读取所有章节，返回给前端
-        all_db_chapters = Chapter.query.filter_by(project_id=project_id).order_by(Chapter.order_index).all()
-        db_chapters_full = [
-            {
-                'id': ch.id,
-                'chapter_number': ch.chapter_number,
-                'title': ch.title,
-                'content': ch.content,
-                'parent_id': ch.parent_id,
-                'order_index': ch.order_index
-            }
-            for ch in all_db_chapters
-        ]
+            # 3. 从数据库读取所有章节，返回给前端
+            return ChapterStore.to_dicts(project_id)
+        
+        # format=sse时在后台生成，以SSE事件流返回进度、子章节和结果
+        if request.args.get('format') == 'sse':
+            template_info = {'id': template.id, 'title': template.title}
+            
+            def sse_events(publish):
+                yield 'progress', {'stage': 'generating'}
+                db_chapters = generate_and_save()
+                yield 'progress', {'stage': 'saved', 'chapters': len(db_chapters)}
+                for ch in db_chapters:
+                    if str(ch.get('chapter_number', '')).count('.') >= 2:
+                        yield 'chapter', ch
+                yield 'done', {'chapters': db_chapters, 'template': template_info, 'timestamp': datetime.now().isoformat()}
+            
+            streams = get_event_streams()
+            return streams.response(streams.start('subchapters', sse_events))
+        
+        try:
+            db_chapters_full = generate_and_save()
+        except ValueError as e:
+            return internal_error(str(e))
         response = {
             'success': True,
             'data': {'chapters': db_chapters_full},
@@ -1,51 +1,16 @@
-from flask import request, jsonify, current_app
+from flask import request, jsonify
 from app.api import bp
-from app.api.error import bad_request
-from app.models.document import Document
-from app.models.project import Project, Chapter
-from app import db
-import threading
-import json
-from datetime import datetime
-from app.services.ai.document_generation import DocumentGenerator
+from app.api.error import bad_request, not_found
+from app.models.project import Project
+from app.models.job import GenerationJob
+from app.models.input_file import InputFile
+from app.services.ai.job_queue import JobQueue
 
-def async_generate_chapters(template_id, project_id, chapters):
-    from flask import current_app
-    app = current_app._get_current_object()  # 获取真实 app 实例
-    def worker():
-        with app.app_context():
-            for ch in chapters:
-                chapter_number = ch['chapterNumber']
-                title = ch['title']
-                db_chapter = None
-                try:
-                    db_chapter = Chapter.query.filter_by(project_id=project_id, chapter_number=chapter_number).first()
-                    if db_chapter:
-                        db_chapter.status = 'generating'
-                        db.session.commit()
-                    # AI生成内容
-                    outline_structure = json.dumps(chapters, ensure_ascii=False)
-                    result = DocumentGenerator.generate_chapter_content(
-                        app.config['OPENAI_CLIENT'],
-                        app.config['OPENAI_MODEL_NAME'],
-                        template_id,
-                        chapter_number,
-                        title,
-                        outline_structure
-                    )
-                    content = result['content'] if isinstance(result, dict) else result
-                    # 写入内容和状态
-                    if db_chapter:
-                        db_chapter.content = content
-                        db_chapter.status = 'done'
-                        db_chapter.updated_at = datetime.now()
-                        db.session.commit()
-                except Exception as e:
-                    if db_chapter:
-                        db_chapter.status = 'failed'
-                        db_chapter.error_message = str(e)
-                        db.session.commit()
-    threading.Thread(target=worker, daemon=True).start()
+def async_generate_chapters(template_id, project_id, chapters, max_concurrency=None, input_file_id=None, regenerate=False):
+    """把章节生成任务写入持久化任务表，由工作进程异步执行"""
+    # 未单独部署worker.py时，由run.py或gunicorn启动的Web进程内后台线程执行任务
+    return JobQueue.enqueue_chapters(template_id, project_id, chapters, max_concurrency=max_concurrency,
+                                     input_file_id=input_file_id, regenerate=regenerate)
 
 
 @bp.route('/documents/start-generate-content', methods=['POST'])
@@ -56,6 +21,31 @@ def start_generate_content():
     chapters = data.get('chapters', [])
     if not template_id or not project_id or not chapters:
         return bad_request('缺少参数')
-    # 启动异步生成
-    async_generate_chapters(template_id, project_id, chapters)
-    return jsonify({'success': True, 'message': '已启动章节内容生成'})
+    # input_file_id可选，引用项目已登记的输入文件
+    input_file_id = data.get('input_file_id')
+    if input_file_id:
+        try:
+            input_file = InputFile.query.get(int(input_file_id))
+        except (TypeError, ValueError):
+            input_file = None
+        if not input_file or (input_file.project_id and str(input_file.project_id) != str(project_id)):
+            return bad_request(f'输入文件不存在: {input_file_id}')
+        input_file_id = input_file.id
+    # 启动异步生成，concurrency可选，用于覆盖该项目的默认并发数；regenerate为true时跳过响应缓存
+    job_ids = async_generate_chapters(template_id, project_id, chapters, data.get('concurrency'), input_file_id or None,
+                                      regenerate=bool(data.get('regenerate')))
+    return jsonify({'success': True, 'message': '已启动章节内容生成', 'data': {'job_ids': job_ids}})
+
+
+@bp.route('/projects/<int:project_id>/generation-jobs', methods=['GET'])
+def get_generation_jobs(project_id):
+    """获取项目的章节生成任务状态"""
+    project = Project.query.get(project_id)
+    if not project:
+        return not_found('项目不存在')
+    query = GenerationJob.query.filter_by(project_id=project_id)
+    status = request.args.get('status')
+    if status:
+        query = query.filter_by(status=status)
+    jobs = query.order_by(GenerationJob.id).all()
+    return jsonify({'success': True, 'data': [job.to_dict() for job in jobs]})
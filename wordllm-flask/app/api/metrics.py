@@ -0,0 +1,63 @@
+from flask import jsonify
+from app.api import bp
+from app.services.ai.extraction_cache import get_extraction_cache
+from app.services.ai.response_cache import get_response_cache
+from app.services.ai.outline_stream import outline_stream_timings
+from app.services.event_streams import get_event_streams
+from app.services.ai.token_budget import get_token_budget
+from app.services.ai.input_retrieval import get_retrieval_index_store
+from app.services.ai.prompt_prefix import get_prefix_tracker
+from app.services.ai.chapter_batching import get_batch_stats
+from app.services.preview_cache import get_preview_cache
+from app.services.export_cache import get_export_cache
+from app.services.pdf_converter import get_pdf_converter_stats
+from app.services.collaboration import get_collaboration
+
+@bp.route('/metrics/cache', methods=['GET'])
+def get_cache_metrics():
+    """获取各级缓存的命中统计"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'extraction': get_extraction_cache().stats(),
+            'response': get_response_cache().stats(),
+            'preview': get_preview_cache().stats(),
+            'export': get_export_cache().stats(),
+            'pdf': get_pdf_converter_stats()
+        }
+    })
+
+
+@bp.route('/metrics/streaming', methods=['GET'])
+def get_streaming_metrics():
+    """获取流式大纲生成的首章节耗时和总耗时分位数，以及SSE事件流数量"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'outline': outline_stream_timings.stats(),
+            'sse': get_event_streams().stats()
+        }
+    })
+
+
+@bp.route('/metrics/prompt', methods=['GET'])
+def get_prompt_metrics():
+    """获取提示词token预算统计，包括截取前后的token数、节省量和各项目的前缀复用率"""
+    return jsonify({
+        'success': True,
+        'data': {
+            **get_token_budget().stats(),
+            'retrieval': get_retrieval_index_store().stats(),
+            'prefix_cache': get_prefix_tracker().stats(),
+            'batching': get_batch_stats().stats()
+        }
+    })
+
+
+@bp.route('/metrics/collaboration', methods=['GET'])
+def get_collaboration_metrics():
+    """获取协作编辑的会话数、操作数和广播流量"""
+    return jsonify({
+        'success': True,
+        'data': get_collaboration().stats()
+    })
@@ -3,6 +3,7 @@ from .routes import create_project, get_project, get_projects
 from .chapters import get_project_chapters, save_project_chapters, update_chapter, get_chapter
 from .document import generate_document_content, update_document
 from .chat import document_chat
+from .inputs import upload_project_input, get_project_inputs, delete_project_input, collect_input_garbage
 from .export import bp as export_bp
 
 bp = Blueprint('project', __name__)
@@ -18,6 +19,12 @@ bp.add_url_rule('/projects/<int:project_id>/chapters', view_func=save_project_ch
 bp.add_url_rule('/chapters/<int:chapter_id>', view_func=update_chapter, methods=['PUT'])
 bp.add_url_rule('/chapters/<int:chapter_id>', view_func=get_chapter, methods=['GET'])
 
+# 输入文件相关路由
+bp.add_url_rule('/projects/<int:project_id>/inputs', view_func=upload_project_input, methods=['POST'])
+bp.add_url_rule('/projects/<int:project_id>/inputs', view_func=get_project_inputs, methods=['GET'])
+bp.add_url_rule('/projects/<int:project_id>/inputs/<int:input_id>', view_func=delete_project_input, methods=['DELETE'])
+bp.add_url_rule('/inputs/gc', view_func=collect_input_garbage, methods=['POST'])
+
 # 文档生成相关路由
 bp.add_url_rule('/documents/generate-content', view_func=generate_document_content, methods=['POST'])
 bp.add_url_rule('/documents/<int:doc_id>', view_func=update_document, methods=['PATCH'])
@@ -1,18 +1,48 @@
 from flask import request, jsonify
+from sqlalchemy.orm import load_only
 from app.models.project import Project, Chapter
 from app import db
 from app.api.error import bad_request, not_found
+from app.services.chapter_store import ChapterStore
+from app.services.collaboration import notify_chapter_contents
 
 # 章节相关接口
 
+# 章节列表可返回的字段
+CHAPTER_FIELDS = ('id', 'chapter_number', 'title', 'content', 'parent_id', 'order_index', 'status')
+# 默认返回的字段（与原接口一致）
+DEFAULT_FIELDS = ('id', 'chapter_number', 'title', 'content', 'parent_id', 'order_index')
+# fields=outline时只返回目录所需字段，不读取content
+OUTLINE_FIELDS = ('id', 'chapter_number', 'title', 'parent_id', 'order_index', 'status')
+
+
 def get_project_chapters(project_id):
+    """获取项目章节列表
+
+    查询参数:
+    - fields: (可选) outline 或逗号分隔的字段列表；不包含content时只读取所需的列，
+      章节内容通过 GET /chapters/<id> 按需获取
+    """
     project = Project.query.get(project_id)
     if not project:
         return not_found('项目不存在')
-    chapters = Chapter.query.filter_by(project_id=project_id).order_by(Chapter.order_index).all()
-    chapter_dicts = [
-        {'id': c.id, 'chapter_number': c.chapter_number, 'title': c.title, 'content': c.content, 'parent_id': c.parent_id, 'order_index': c.order_index} for c in chapters
-    ]
+    fields = request.args.get('fields')
+    if not fields:
+        selected = DEFAULT_FIELDS
+    elif fields == 'outline':
+        selected = OUTLINE_FIELDS
+    else:
+        requested = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in requested if f not in CHAPTER_FIELDS]
+        if unknown:
+            return bad_request(f"不支持的字段: {', '.join(unknown)}")
+        selected = tuple(dict.fromkeys(['id'] + requested))
+    query = Chapter.query.filter_by(project_id=project_id).order_by(Chapter.order_index)
+    if 'content' not in selected:
+        # 只加载选中的列，content不会被读取
+        query = query.options(load_only(*[getattr(Chapter, f) for f in selected if f != 'id']))
+    chapters = query.all()
+    chapter_dicts = [{f: getattr(c, f) for f in selected} for c in chapters]
     return jsonify({'success': True, 'data': chapter_dicts})
 
 
@@ -21,23 +51,9 @@ def save_project_chapters(project_id):
     chapters = data.get('chapters', [])
     if not isinstance(chapters, list) or not chapters:
         return bad_request('必须提供章节列表')
-    Chapter.query.filter_by(project_id=project_id).delete()
-    db.session.commit()
-    new_ids = []
-    for idx, ch in enumerate(chapters):
-        chapter = Chapter(
-            project_id=project_id,
-            chapter_number=ch.get('chapter_number') or ch.get('chapterNumber') or ch.get('id'),
-            title=ch.get('title') or '未命名章节',
-            content=ch.get('content', ''),
-            parent_id=ch.get('parent_id') or ch.get('parentId'),
-            order_index=ch.get('order_index', idx)
-        )
-        db.session.add(chapter)
-        db.session.flush()
-        new_ids.append(chapter.id)
-    db.session.commit()
-    return jsonify({'success': True, 'data': {'ids': new_ids}})
+    # 按chapter_number对比后批量插入、更新和删除，已有章节保留原ID
+    result = ChapterStore.sync_chapters(project_id, chapters)
+    return jsonify({'success': True, 'data': {'ids': result['ids']}})
 
 
 def update_chapter(chapter_id):
@@ -49,6 +65,9 @@ def update_chapter(chapter_id):
     chapter.content = data.get('content', chapter.content)
     chapter.order_index = data.get('order_index', chapter.order_index)
     db.session.commit()
+    if 'content' in data:
+        # 正在协作编辑的章节，保存的内容作为一个操作同步给编辑者
+        notify_chapter_contents({chapter.id: chapter.content})
     return jsonify({'success': True, 'data': {'id': chapter.id}})
 
 
@@ -1,8 +1,6 @@
-import os
-import uuid
 import json
-from flask import request, jsonify, current_app
-from werkzeug.utils import secure_filename
+import threading
+from flask import request, jsonify
 import logging
 from datetime import datetime
 from app.models.document import Document
@@ -10,6 +8,11 @@ from app import db  # 添加缺失的导入
 from app.api.error import bad_request, not_found, internal_error
 from app.services.ai_service import get_ai_service
 from app.services.ai.document_generation import DocumentGenerator
+from app.services.ai.chapter_batching import last_report as last_batch_report
+from app.services.input_files import InputFileService
+from app.services.chapter_store import ChapterStore
+from app.services.event_streams import get_event_streams
+from app.services.collaboration import notify_chapter_contents
 from flask import Blueprint
 
 bp = Blueprint('project_document', __name__)
@@ -72,7 +75,13 @@ def generate_document_content():
     - chapters: 章节列表，包含chapterNumber和title
     - chapter_number: (可选) 指定要生成内容的章节编号，不提供则生成所有章节
     - input_file: (可选) 输入文件
+    - input_file_id: (可选) 已登记的输入文件ID，代替input_file
     - outline_prompt: (可选) 大纲生成提示词，如有则优先并覆盖数据库
+    - regenerate: (可选) 为true时跳过响应缓存，强制重新调用模型
+    - batch: (可选) 生成所有章节时是否把同级叶子章节合并到一次模型调用中，默认使用GENERATION_BATCH_ENABLED
+    查询参数:
+    - format: (可选) 为sse时在后台生成，以text/event-stream返回token、progress、chapter、done、error事件，
+      token为逐章生成时模型输出的文本增量(带chapter_number，批量生成的章节没有)，每个章节生成后立即推送chapter事件
     """
     try:
         print('[后端调试] generate_document_content 入口')
@@ -124,46 +133,14 @@ def generate_document_content():
                 db.session.commit()
         # ========================================================
             return not_found(f'未找到ID为{template_id}的模板')
-        # 处理上传的输入文件
-        input_file_path = None
-        if 'input_file' in request.files:
-            input_file = request.files['input_file']
-            if input_file.filename:
-                # 保存上传的文件
-                original_filename = input_file.filename
-                logger.info(f"原始文件名: {original_filename}")
-                filename = secure_filename(original_filename)
-                logger.info(f"secure_filename后的文件名: {filename}")
-                # 为避免文件名冲突，添加时间戳
-                file_ext = os.path.splitext(filename)[1]
-                logger.info(f"提取的文件扩展名: '{file_ext}'")
-                # 修正: 如果没有扩展名，尝试从content-type推断
-                if not file_ext:
-                    content_type = input_file.content_type
-                    logger.info(f"文件的Content-Type: {content_type}")
-                    # 根据MIME类型推断扩展名
-                    if content_type == 'application/msword' or content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                        file_ext = '.docx'
-                        logger.info("从content-type推断出扩展名.docx")
-                    elif content_type == 'text/plain':
-                        file_ext = '.txt'
-                        logger.info("从content-type推断出扩展名.txt")
-                    elif content_type == 'application/pdf':
-                        file_ext = '.pdf'
-                        logger.info("从content-type推断出扩展名.pdf")
-                    else:
-                        logger.warning(f"未知的content-type: {content_type}，使用.docx作为默认扩展名")
-                        file_ext = '.docx'  # 默认使用.docx
-                unique_filename = f"input_{uuid.uuid4().hex}{file_ext}"
-                logger.info(f"生成的唯一文件名: {unique_filename}")
-                # 确保目录存在
-                upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'inputs')
-                os.makedirs(upload_folder, exist_ok=True)
-                input_file_path = os.path.join(upload_folder, unique_filename)
-                input_file.save(input_file_path)
-                logger.info(f"已保存输入文件: {input_file_path}")
+        # 处理输入文件: 引用已登记的input_file_id，或上传input_file(按内容去重登记)
+        try:
+            input_file_path = InputFileService.resolve_request_input((data or {}).get('project_id') or request.form.get('project_id'))
+        except ValueError as e:
+            return bad_request(str(e))
         # 获取AI服务
         ai_service = get_ai_service()
+        stream_events = request.args.get('format') == 'sse'
         # 根据是否提供了指定章节，选择生成单个章节还是所有章节
         if chapter_number:
             # 查找指定章节
@@ -175,104 +152,90 @@ def generate_document_content():
             if not project_id:
                 print("[ERROR] 缺少 project_id 参数")
                 return bad_request('必须提供 project_id 参数才能生成章节内容')
-            # 调用DocumentGenerator生成章节内容
-            outline_structure = json.dumps(chapters, ensure_ascii=False)
-            content = DocumentGenerator.generate_chapter_content(
-                ai_service.client,
-                ai_service.model,
-                template_id,
-                chapter['chapterNumber'],
-                chapter['title'],
-                outline_structure,
-                input_file_path
-            )
-            # === 写入数据库 ===
-            from app.models.project import Chapter as ChapterModel
-            # 确保有project_id
-            print(f"[DEBUG] 使用 project_id: {project_id} 更新数据库")
-            db_chapter = ChapterModel.query.filter_by(project_id=project_id, chapter_number=chapter['chapterNumber']).first()
-            if db_chapter:
-                # 确保content是字符串，而不是字典
-                if isinstance(content, dict) and 'content' in content:
-                    print(f"[DEBUG] 内容是字典类型，提取content字段值")
-                    db_chapter.content = content['content']
-                else:
-                    print(f"[DEBUG] 内容是字符串类型，直接保存")
-                    db_chapter.content = str(content)
-                db.session.commit()
-            # === 新增：从数据库读取最新章节内容返回 ===
-            db_chapter = ChapterModel.query.filter_by(project_id=project_id, chapter_number=chapter['chapterNumber']).first()
+            
+            def generate_chapter(on_delta=None):
+                # 调用DocumentGenerator生成章节内容
+                outline_structure = json.dumps(chapters, ensure_ascii=False)
+                content = DocumentGenerator.generate_chapter_content(
+                    ai_service.client,
+                    ai_service.model,
+                    template_id,
+                    chapter['chapterNumber'],
+                    chapter['title'],
+                    outline_structure,
+                    input_file_path,
+                    use_cache=not (data or {}).get('regenerate', False),
+                    project_id=project_id,
+                    on_delta=on_delta
+                )
+                return _save_chapter_content(project_id, chapter, content)
+            
+            if stream_events:
+                def sse_events(publish):
+                    yield 'progress', {'done': 0, 'total': 1}
+                    # 模型输出的文本增量在生成过程中直接发布为token事件
+                    result = generate_chapter(lambda text: publish('token', {'chapter_number': chapter['chapterNumber'], 'text': text}))
+                    yield 'chapter', result['chapter']
+                    yield 'progress', {'done': 1, 'total': 1}
+                    yield 'done', dict(result, timestamp=datetime.now().isoformat())
+                
+                streams = get_event_streams()
+                return streams.response(streams.start('content', sse_events))
+            
             response = {
                 'success': True,
-                'data': {
-                    'chapter': {
-                        'id': db_chapter.id,
-                        'chapter_number': db_chapter.chapter_number,
-                        'title': db_chapter.title,
-                        'content': db_chapter.content,
-                        'parent_id': db_chapter.parent_id,
-                        'order_index': db_chapter.order_index
-                    } if db_chapter else chapter,
-                    'content': db_chapter.content if db_chapter else content
-                },
+                'data': generate_chapter(),
                 'timestamp': datetime.now().isoformat()
             }
         else:
             # 生成所有章节内容
-            contents = DocumentGenerator.generate_document_content(
-                ai_service.client,
-                ai_service.model,
-                template_id,
-                chapters,
-                input_file_path
-            )
-            # === 新增：写入数据库 ===
-            from app.models.project import Chapter as ChapterModel
-            # contents: { chapterNumber: content }
-            # 先批量更新数据库
-            project_id = None
-            for ch in chapters:
-                if 'project_id' in ch:
-                    project_id = ch['project_id']
-                    break
-            if not project_id:
-                # 可选：从其它上下文推断
-                pass
-            if project_id:
-                for ch in chapters:
-                    chapter_number = ch['chapterNumber']
-                    content = contents.get(chapter_number)
-                    db_chapter = ChapterModel.query.filter_by(project_id=project_id, chapter_number=chapter_number).first()
-                    if db_chapter and content:
-                        # 确保content是字符串，而不是字典
-                        if isinstance(content, dict) and 'content' in content:
-                            print(f"[DEBUG] 章节{chapter_number}内容是字典类型，提取content字段值")
-                            db_chapter.content = content['content']
-                        else:
-                            print(f"[DEBUG] 章节{chapter_number}内容是字符串类型，直接保存")
-                            db_chapter.content = str(content)
-                db.session.commit()
-                # 从数据库读取所有章节内容
-                db_chapters = ChapterModel.query.filter_by(project_id=project_id).order_by(ChapterModel.order_index).all()
-                result_chapters = [
-                    {
-                        'id': c.id,
-                        'chapter_number': c.chapter_number,
-                        'title': c.title,
-                        'content': c.content,
-                        'parent_id': c.parent_id,
-                        'order_index': c.order_index
-                    }
-                    for c in db_chapters
-                ]
-            else:
-                result_chapters = chapters
+            def generate_all(on_chapter=None, on_delta=None):
+                contents = DocumentGenerator.generate_document_content(
+                    ai_service.client,
+                    ai_service.model,
+                    template_id,
+                    chapters,
+                    input_file_path,
+                    project_id=data.get('project_id') if data else None,
+                    max_concurrency=data.get('concurrency') if data else None,
+                    batch=data.get('batch') if data else None,
+                    on_chapter=on_chapter,
+                    on_delta=on_delta,
+                    use_cache=not (data or {}).get('regenerate', False)
+                )
+                return {
+                    'chapters': _save_document_contents(chapters, contents),
+                    'generated_chapters': len(contents),
+                    'batching': last_batch_report()
+                }
+            
+            if stream_events:
+                total = sum(1 for ch in chapters if ch['chapterNumber'].count('.') <= 1)
+                
+                def sse_events(publish):
+                    # 章节在生成线程中完成，直接发布事件，保证chapter和progress成对且计数递增
+                    completed = []
+                    lock = threading.Lock()
+                    
+                    def on_chapter(number, content):
+                        with lock:
+                            completed.append(number)
+                            publish('chapter', {'chapter_number': number, 'content': _content_text(content) if content else None})
+                            publish('progress', {'done': len(completed), 'total': total})
+                    
+                    def on_delta(number, text):
+                        publish('token', {'chapter_number': number, 'text': text})
+                    
+                    yield 'progress', {'done': 0, 'total': total}
+                    result = generate_all(on_chapter, on_delta)
+                    yield 'done', dict(result, timestamp=datetime.now().isoformat())
+                
+                streams = get_event_streams()
+                return streams.response(streams.start('content', sse_events))
+            
             response = {
                 'success': True,
-                'data': {
-                    'chapters': result_chapters,
-                    'generated_chapters': len(contents)
-                },
+                'data': generate_all(),
                 'timestamp': datetime.now().isoformat()
             }
         # 打印返回给前端的数据
@@ -284,3 +247,57 @@ def generate_document_content():
     except Exception as e:
         logger.exception('生成文档内容时发生异常')
         return internal_error(str(e))
+
+
+def _content_text(content):
+    """确保content是字符串，而不是字典"""
+    if isinstance(content, dict) and 'content' in content:
+        return content['content']
+    return str(content)
+
+
+def _chapter_dict(c):
+    return {
+        'id': c.id,
+        'chapter_number': c.chapter_number,
+        'title': c.title,
+        'content': c.content,
+        'parent_id': c.parent_id,
+        'order_index': c.order_index
+    }
+
+
+def _save_chapter_content(project_id, chapter, content):
+    """把单个章节的内容写入数据库，返回接口的data部分"""
+    from app.models.project import Chapter as ChapterModel
+    print(f"[DEBUG] 使用 project_id: {project_id} 更新数据库")
+    db_chapter = ChapterModel.query.filter_by(project_id=project_id, chapter_number=chapter['chapterNumber']).first()
+    if db_chapter:
+        db_chapter.content = _content_text(content)
+        db.session.commit()
+        notify_chapter_contents({db_chapter.id: db_chapter.content})
+    # 从数据库读取最新章节内容返回
+    db_chapter = ChapterModel.query.filter_by(project_id=project_id, chapter_number=chapter['chapterNumber']).first()
+    return {
+        'chapter': _chapter_dict(db_chapter) if db_chapter else chapter,
+        'content': db_chapter.content if db_chapter else content
+    }
+
+
+def _save_document_contents(chapters, contents):
+    """把所有章节的内容写入数据库，返回数据库中的章节列表
+
+    contents: { chapterNumber: content }，project_id取自章节列表，没有时不写入并原样返回章节列表
+    """
+    from app.models.project import Chapter as ChapterModel
+    project_id = next((ch['project_id'] for ch in chapters if 'project_id' in ch), None)
+    if not project_id:
+        return chapters
+    # 一次查询匹配所有章节后批量写入内容
+    ChapterStore.update_contents(project_id, {
+        chapter_number: _content_text(content)
+        for chapter_number, content in contents.items() if content
+    })
+    # 从数据库读取所有章节内容
+    db_chapters = ChapterModel.query.filter_by(project_id=project_id).order_by(ChapterModel.order_index).all()
+    return [_chapter_dict(c) for c in db_chapters]
@@ -4,14 +4,48 @@
 """
 import os
 import logging
-from flask import request, send_file, jsonify, Blueprint
+from flask import request, send_file, jsonify, Blueprint, current_app
+from sqlalchemy import func
 from app.api.error import bad_request, not_found, internal_error
 from app.models.project import Project, Chapter
 from app.services.document_export import DocumentExportService
+from app.services.export_cache import ExportCache, get_export_cache, project_revision
+from app.services.export_jobs import CHAPTER_BATCH_SIZE, STATUS_DONE, get_export_jobs
 
 bp = Blueprint('project_export', __name__)
 logger = logging.getLogger(__name__)
 
+# 导出格式 -> (MIME类型, 扩展名)
+EXPORT_FORMATS = {
+    'docx': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx'),
+    'pdf': ('application/pdf', '.pdf'),
+    'txt': ('text/plain', '.txt')
+}
+
+def send_export_file(project, file_path, mime_type, ext):
+    """以附件形式发送导出文件，下载文件名使用项目名称"""
+    file_name = f"{getattr(project, 'project_name', None) or getattr(project, 'name', None) or f'project_{project.id}'}{ext}"
+    return send_file(
+        file_path,
+        as_attachment=True,
+        download_name=file_name,
+        mimetype=mime_type,
+        conditional=True
+    )
+
+@bp.route('/projects/<int:project_id>/exports/<name>', methods=['GET'])
+def download_export(project_id, name):
+    """下载已缓存的导出文件，支持Range和条件请求"""
+    project = Project.query.get(project_id)
+    if not project:
+        return not_found('项目不存在')
+    file_path = get_export_cache().path_for_name(project_id, name)
+    if not file_path:
+        return not_found('导出文件不存在或已过期')
+    ext = os.path.splitext(name)[1]
+    mime_type = next((m for m, e in EXPORT_FORMATS.values() if e == ext), 'application/octet-stream')
+    return send_export_file(project, file_path, mime_type, ext)
+
 @bp.route('/projects/<int:project_id>/export', methods=['POST'])
 def export_document(project_id):
     """
@@ -21,6 +55,11 @@ def export_document(project_id):
     - settings: 格式设置（页边距、字体等）
     - scope: 导出范围，可以是 'all' 或 'current'
     - current_chapter: 如果 scope 是 'current'，则指定当前章节
+    - mode: (可选) 'sync' 同步返回文件，'async' 返回任务ID后台导出，
+      'auto'(默认) 正文总字数超过EXPORT_ASYNC_THRESHOLD时使用异步导出
+    
+    异步导出返回202和任务信息，进度推送到/ws命名空间的 export:<job_id> 主题，
+    完成后通过 GET /export-jobs/<job_id>/download 下载
     """
     try:
         logger.info(f"收到导出文档请求: project_id={project_id}")
@@ -47,57 +86,104 @@ def export_document(project_id):
         # 根据范围获取章节
         if scope == 'current' and current_chapter is not None:
             logger.info(f"仅导出当前章节: {current_chapter}")
-            chapters = Chapter.query.filter_by(
+            chapter_query = Chapter.query.filter_by(
                 project_id=project_id, 
                 chapter_number=current_chapter
-            ).all()
+            )
         else:
             logger.info("导出所有章节")
-            chapters = Chapter.query.filter_by(
-                project_id=project_id
-            ).order_by(Chapter.order_index).all()
+            chapter_query = Chapter.query.filter_by(project_id=project_id)
             
-        if not chapters:
+        chapter_count = chapter_query.count()
+        if not chapter_count:
             logger.error("没有找到章节内容")
             return bad_request('没有找到章节内容')
         
-        logger.info(f"找到 {len(chapters)} 个章节")
+        logger.info(f"找到 {chapter_count} 个章节")
+        # 分批读取章节，导出时逐个写入，不一次性加载全部内容
+        chapters = chapter_query.order_by(Chapter.order_index).yield_per(CHAPTER_BATCH_SIZE)
             
+        if export_format not in EXPORT_FORMATS:
+            logger.error(f"不支持的导出格式: {export_format}")
+            return bad_request('不支持的导出格式')
+        mime_type, ext = EXPORT_FORMATS[export_format]
+        
+        # 项目内容、格式和设置都未变化时直接使用缓存的导出文件
+        cache = get_export_cache()
+        chapter_scope = current_chapter if scope == 'current' and current_chapter is not None else None
+        cache_key = ExportCache.make_key(
+            project_id, project_revision(project_id),
+            export_format, settings, chapter_scope or 'all'
+        )
+        file_path = cache.get(cache_key, ext)
+        cache_status = 'HIT' if file_path else 'MISS'
+        
+        # 大文档在后台导出，避免请求超时
+        mode = data.get('mode', 'auto')
+        if file_path is None and mode == 'auto':
+            content_size = chapter_query.with_entities(
+                func.coalesce(func.sum(func.length(Chapter.content)), 0)
+            ).scalar()
+            mode = 'async' if content_size > current_app.config.get('EXPORT_ASYNC_THRESHOLD', 200000) else 'sync'
+        if file_path is None and mode == 'async':
+            job = get_export_jobs().submit(
+                project_id, export_format, settings, chapter_scope, cache_key, ext, chapter_count
+            )
+            return jsonify({'success': True, 'data': job.to_dict()}), 202
+        
         # 生成文档
-        try:
-            if export_format == 'docx':
-                file_path = DocumentExportService.export_as_docx(project, chapters, settings)
-                mime_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                ext = '.docx'
-            elif export_format == 'pdf':
-                # 先导出为DOCX，然后尝试转换为PDF
-                docx_path = DocumentExportService.export_as_docx(project, chapters, settings)
-                file_path = DocumentExportService.convert_to_pdf(docx_path)
-                mime_type = 'application/pdf'
-                ext = '.pdf'
-            elif export_format == 'txt':
-                file_path = DocumentExportService.export_as_txt(project, chapters, settings)
-                mime_type = 'text/plain'
-                ext = '.txt'
-            else:
-                logger.error(f"不支持的导出格式: {export_format}")
-                return bad_request('不支持的导出格式')
-        except Exception as e:
-            logger.exception(f"导出文档时发生错误: {str(e)}")
-            return internal_error(f"导出文档时发生错误: {str(e)}")
+        if file_path is None:
+            output_path = cache.temp_path(ext)
+            try:
+                file_path = DocumentExportService.export(
+                    project, chapters, export_format, settings, output_path, cache.temp_path('.docx')
+                )
+            except Exception as e:
+                logger.exception(f"导出文档时发生错误: {str(e)}")
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                return internal_error(f"导出文档时发生错误: {str(e)}")
+            if cache.enabled:
+                file_path = cache.put(cache_key, ext, file_path)
             
-        # 构建文件名
-        file_name = f"{getattr(project, 'project_name', None) or getattr(project, 'name', None) or f'project_{project_id}'}{ext}"
-        
         # 发送文件
-        logger.info(f"发送文件: {file_path}, 名称: {file_name}")
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=file_name,
-            mimetype=mime_type
-        )
+        logger.info(f"发送文件: {file_path}, 缓存: {cache_status}")
+        response = send_export_file(project, file_path, mime_type, ext)
+        response.headers['X-Export-Cache'] = cache_status
+        if cache.enabled:
+            # 缓存的文件可通过GET重复下载，支持Range断点续传
+            response.headers['Content-Location'] = f"/api/projects/{project_id}/exports/{os.path.basename(file_path)}"
+        else:
+            # 未启用缓存时发送完成后删除临时文件
+            response.call_on_close(lambda: os.path.exists(file_path) and os.remove(file_path))
+        return response
             
     except Exception as e:
         logger.exception(f"处理导出请求时发生异常: {str(e)}")
         return internal_error(str(e))
+
+
+@bp.route('/export-jobs/<job_id>', methods=['GET'])
+def get_export_job(job_id):
+    """查询异步导出任务的状态和进度"""
+    job = get_export_jobs().get(job_id)
+    if not job:
+        return not_found('导出任务不存在或已过期')
+    return jsonify({'success': True, 'data': job.to_dict()})
+
+
+@bp.route('/export-jobs/<job_id>/download', methods=['GET'])
+def download_export_job(job_id):
+    """下载异步导出任务生成的文件，支持Range和条件请求"""
+    job = get_export_jobs().get(job_id)
+    if not job:
+        return not_found('导出任务不存在或已过期')
+    if job.status != STATUS_DONE:
+        return bad_request(f'导出任务尚未完成: {job.status}')
+    if not os.path.exists(job.file_path):
+        return not_found('导出文件已被清理，请重新导出')
+    project = Project.query.get(job.project_id)
+    if not project:
+        return not_found('项目不存在')
+    mime_type = next((m for m, e in EXPORT_FORMATS.values() if e == job.ext), 'application/octet-stream')
+    return send_export_file(project, job.file_path, mime_type, job.ext)
@@ -0,0 +1,66 @@
+from flask import request, jsonify
+from app.models.project import Project
+from app.models.input_file import InputFile
+from app.api.error import bad_request, not_found, internal_error
+from app.services.input_files import InputFileService
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 项目输入文件路由
+
+def upload_project_input(project_id):
+    """
+    登记项目的输入文件，相同内容的文件只保存和解析一次
+    请求体应包含:
+    - input_file: 输入文件
+    返回的id可在生成大纲和章节内容时作为input_file_id传入，无需再次上传
+    """
+    project = Project.query.get(project_id)
+    if not project:
+        return not_found('项目不存在')
+    upload = request.files.get('input_file')
+    if not upload or not upload.filename:
+        return bad_request('必须提供input_file文件')
+    try:
+        input_file, created = InputFileService.register(upload, project_id)
+    except Exception as e:
+        logger.error(f"登记输入文件失败: {e}", exc_info=True)
+        return internal_error(f'登记输入文件失败: {str(e)}')
+    data = input_file.to_dict()
+    data['deduplicated'] = not created
+    return jsonify({'success': True, 'data': data}), 201 if created else 200
+
+
+def get_project_inputs(project_id):
+    """获取项目已登记的输入文件"""
+    project = Project.query.get(project_id)
+    if not project:
+        return not_found('项目不存在')
+    inputs = InputFile.query.filter_by(project_id=project_id).order_by(InputFile.created_at.desc()).all()
+    return jsonify({'success': True, 'data': [item.to_dict() for item in inputs]})
+
+
+def delete_project_input(project_id, input_id):
+    """删除项目的输入文件"""
+    input_file = InputFile.query.filter_by(id=input_id, project_id=project_id).first()
+    if not input_file:
+        return not_found('输入文件不存在')
+    InputFileService.delete(input_file)
+    return jsonify({'success': True})
+
+
+def collect_input_garbage():
+    """
+    清理没有被引用的输入文件
+    请求体可包含:
+    - grace_seconds: (可选) 保留最近修改过的文件的时间(秒)，默认使用INPUT_GC_GRACE_SECONDS
+    """
+    data = request.get_json(silent=True) or {}
+    grace_seconds = data.get('grace_seconds')
+    if grace_seconds is not None:
+        try:
+            grace_seconds = max(0, int(grace_seconds))
+        except (TypeError, ValueError):
+            return bad_request('grace_seconds必须是整数')
+    return jsonify({'success': True, 'data': InputFileService.collect_garbage(grace_seconds)})
@@ -0,0 +1,27 @@
+from flask import request, jsonify
+from app.api import bp
+from app.api.error import not_found
+from app.services.event_streams import get_event_streams, last_event_id
+
+
+@bp.route('/streams/<stream_id>', methods=['GET'])
+def resume_stream(stream_id):
+    """
+    重新连接生成事件流(text/event-stream)
+    从Last-Event-ID请求头(或last_event_id查询参数)之后的事件开始补发，并继续接收新事件，不会重新调用模型
+    事件缓冲区在创建该流的Web进程内，多进程部署时依赖负载均衡的会话保持
+    """
+    streams = get_event_streams()
+    stream = streams.get(stream_id)
+    if not stream:
+        return not_found('事件流不存在或已过期')
+    return streams.response(stream, last_event_id(request))
+
+
+@bp.route('/streams/<stream_id>/status', methods=['GET'])
+def get_stream_status(stream_id):
+    """获取事件流状态: 是否结束、最后一个事件ID、缓冲的事件数"""
+    stream = get_event_streams().get(stream_id)
+    if not stream:
+        return not_found('事件流不存在或已过期')
+    return jsonify({'success': True, 'data': stream.status()})
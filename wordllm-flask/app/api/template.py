@@ -1,4 +1,4 @@
-from flask import request, jsonify, current_app, send_from_directory, make_response
+from flask import request, jsonify, current_app, send_from_directory, send_file, make_response
 from werkzeug.utils import secure_filename
 import os
 import uuid
@@ -7,9 +7,10 @@ from app.api.error import bad_request, not_found, internal_error
 from app.models.document import Document
 from app import db
 from app.utils.logger import logger
+from app.services.ai.extraction_cache import get_extraction_cache
+from app.services.preview_cache import get_preview_cache, template_asset_base
+from app.services.template_processor import TemplateProcessor
 import datetime
-import mammoth
-import base64
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,6 +20,60 @@ ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx', 'md'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def invalidate_template_cache(template):
+    """模板文件被替换或删除时，清除其提取缓存和预览缓存"""
+    if not template.file_path:
+        return
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    for cache in (get_extraction_cache(), get_preview_cache()):
+        cache.invalidate(os.path.join(upload_folder, 'template', template.file_path))
+        cache.invalidate(os.path.join(upload_folder, template.file_path))
+
+def template_file_path(template):
+    """返回模板文件在上传目录中的路径"""
+    # 构建文件路径 - 使用更可靠的文件路径处理
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    
+    # 检查是否早期存储的文件名（没有目录路径）
+    if not os.path.sep in template.file_path:
+        # 简单文件名，应该在template目录下
+        return os.path.join(upload_folder, 'template', template.file_path)
+    # 已有完整路径
+    if template.file_path.startswith('template/'):
+        # 如果路径已经包含template前缀
+        return os.path.join(upload_folder, template.file_path)
+    # 先检查完整路径
+    direct_path = os.path.join(upload_folder, template.file_path)
+    if os.path.exists(direct_path):
+        return direct_path
+    # 尝试在template目录下查找
+    return os.path.join(upload_folder, 'template', template.file_path)
+
+def preview_html_response(template, file_path):
+    """返回模板的预览HTML，支持If-None-Match条件请求
+
+    ETag由文件内容哈希、样式映射和标题计算，浏览器缓存仍有效时直接返回304，
+    否则从磁盘缓存读取(未命中时才调用mammoth转换)。图片通过assets接口单独加载。
+    """
+    cache = get_preview_cache()
+    asset_base = template_asset_base(template.id)
+    etag = cache.etag(file_path, template.title, asset_base)
+    if request.if_none_match.contains(etag):
+        cache.record_not_modified()
+        response = make_response('', 304)
+    else:
+        etag, html = cache.get_or_render(file_path, template.title, asset_base)
+        response = make_response(html)
+        response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    response.set_etag(etag)
+    
+    # 添加跨域和缓存控制头，每次使用前都需要用ETag向服务器确认
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+    response.headers['Access-Control-Allow-Headers'] = 'Origin, Accept, Content-Type, X-Requested-With'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @bp.route('/templates', methods=['GET'])
 def get_templates():
     """获取所有模板列表，支持分页"""
@@ -53,6 +108,26 @@ def get_templates():
     
     return jsonify(response)
 
+@bp.route('/templates/<int:id>/assets/<asset>', methods=['GET'])
+def get_template_asset(id, asset):
+    """获取模板预览中的图片
+
+    文件名是图片内容的哈希，内容不会变化，允许浏览器长期缓存。
+    只返回该模板预览中引用的图片。
+    """
+    template = Document.query.get(id)
+    if not template or not template.file_path:
+        return not_found('资源不存在')
+    cache = get_preview_cache()
+    file_path = template_file_path(template)
+    path = cache.asset_path(asset)
+    if not path or not os.path.exists(file_path) or not cache.has_asset(file_path, asset):
+        return not_found('资源不存在')
+    response = send_file(path, conditional=True)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @bp.route('/templates/<int:id>', methods=['GET'])
 def get_template(id):
     """获取指定ID的模板"""
@@ -113,6 +188,7 @@ def update_template(id):
         print(f"【更新字段】content_prompt: {template.content_prompt} -> {data['content_prompt']}")
         template.content_prompt = data['content_prompt']
     
+    # 这里只修改元数据和提示词，模板文件不变，提取缓存和预览缓存仍然有效
     template.updated_at = datetime.datetime.now()
     
     # 记录更新后、提交前的模板状态
@@ -150,6 +226,7 @@ def delete_template(id):
     
     # 删除相关文件
     if template.file_path:
+        invalidate_template_cache(template)
         # 先检查文件是否在template目录中
         upload_folder = current_app.config['UPLOAD_FOLDER']
         template_path = os.path.join(upload_folder, 'template', template.file_path)
@@ -235,6 +312,8 @@ def upload_template():
     # 保存文件到template子目录
     file_path = os.path.join(template_folder, unique_filename)
     file.save(file_path)
+    # 同一路径上的文件内容已被替换，旧的提取缓存不再有效
+    get_extraction_cache().invalidate(file_path)
     
     # 文件大小（字节）
     file_size = os.path.getsize(file_path)
@@ -265,10 +344,44 @@ def upload_template():
     
     db.session.add(template)
     db.session.commit()
+    # 文本提取、预览渲染和标题解析在后台完成
+    TemplateProcessor.submit(template)
     
     # 返回模板信息
     return jsonify(template.to_dict()), 201
 
+@bp.route('/templates/<int:id>/structure', methods=['GET'])
+def get_template_structure(id):
+    """获取模板预处理状态、标题层级和token数"""
+    template = Document.query.get(id)
+    if not template:
+        return not_found('模板不存在')
+    return jsonify({
+        'success': True,
+        'data': {
+            'processing_status': template.processing_status,
+            'processing_error': template.processing_error,
+            'processed_at': template.processed_at.isoformat() if template.processed_at else None,
+            'text_length': template.text_length,
+            'token_count': template.token_count,
+            'headings': TemplateProcessor.headings(template)
+        }
+    })
+
+@bp.route('/templates/<int:id>/process', methods=['POST'])
+def process_template(id):
+    """重新执行模板预处理（处理失败或上传早于预处理功能的模板）"""
+    template = Document.query.get(id)
+    if not template:
+        return not_found('模板不存在')
+    if not template.file_path:
+        return bad_request('该模板没有关联的文件')
+    if TemplateProcessor.submit(template) is None:
+        # 未启用后台预处理时同步执行
+        TemplateProcessor.process(template.id)
+        return jsonify({'success': True, 'data': {'processing_status': template.processing_status}})
+    return jsonify({'success': True, 'data': {'processing_status': template.processing_status}}), 202
+
 @bp.route('/templates/<int:id>/download', methods=['GET'])
 def download_template(id):
     """下载模板文件"""
@@ -317,26 +430,7 @@ def preview_template(id):
         else:
             return bad_request('该模板没有关联的文件或内容')
     
-    # 构建文件路径 - 使用更可靠的文件路径处理
-    upload_folder = current_app.config['UPLOAD_FOLDER']
-    
-    # 检查是否早期存储的文件名（没有目录路径）
-    if not os.path.sep in template.file_path:
-        # 简单文件名，应该在template目录下
-        file_path = os.path.join(upload_folder, 'template', template.file_path)
-    else:
-        # 已有完整路径
-        if template.file_path.startswith('template/'):
-            # 如果路径已经包含template前缀
-            file_path = os.path.join(upload_folder, template.file_path)
-        else:
-            # 先检查完整路径
-            direct_path = os.path.join(upload_folder, template.file_path)
-            if os.path.exists(direct_path):
-                file_path = direct_path
-            else:
-                # 尝试在template目录下查找
-                file_path = os.path.join(upload_folder, 'template', template.file_path)
+    file_path = template_file_path(template)
     
     # 打印所有可能的路径用于调试
     logger.info(f"模板 ID: {template.id}, 文件路径: {template.file_path}")
@@ -360,85 +454,7 @@ def preview_template(id):
     # 如果请求HTML格式且是DOCX文件，使用mammoth解析并返回HTML
     if html_format and template.file_type and template.file_type.lower() in ['docx', 'doc']:
         try:
-            logger.info(f"Converting DOCX to HTML: {file_path}")
-            
-            # 自定义样式映射，更好地处理Word文档的样式
-            style_map = """
-                p[style-name='Title'] => h1:fresh
-                p[style-name='Heading 1'] => h1:fresh
-                p[style-name='Heading 2'] => h2:fresh
-                p[style-name='Heading 3'] => h3:fresh
-                p[style-name='Heading 4'] => h4:fresh
-                p[style-name='Heading 5'] => h5:fresh
-                p[style-name='Heading 6'] => h6:fresh
-                r[style-name='Strong'] => strong
-                r[style-name='Emphasis'] => em
-                p[style-name='Quote'] => blockquote
-                p[style-name='Normal'] => p
-            """
-            
-            # 图片处理选项 - 内联base64格式
-            def image_handler(image):
-                with image.open() as image_bytes:
-                    image_data = image_bytes.read()
-                    encoded_image = base64.b64encode(image_data).decode("ascii")
-                    return {"src": f"data:{image.content_type};base64,{encoded_image}"}
-            
-            # 使用mammoth转换DOCX为HTML
-            with open(file_path, 'rb') as docx_file:
-                result = mammoth.convert_to_html(
-                    docx_file, 
-                    style_map=style_map,
-                    convert_image=mammoth.images.img_element(image_handler)
-                )
-            
-            # 获取生成的HTML
-            html_content = result.value
-            
-            # 添加基本样式包装
-            styled_html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <title>{template.title}</title>
-                <style>
-                    body {{ font-family: 'Segoe UI', Arial, sans-serif; line-height: 1.6; color: #333; max-width: 800px; margin: 0 auto; padding: 20px; }}
-                    h1, h2, h3, h4, h5, h6 {{ margin-top: 24px; margin-bottom: 16px; font-weight: 600; line-height: 1.25; }}
-                    h1 {{ font-size: 2em; border-bottom: 1px solid #eaecef; padding-bottom: 0.3em; }}
-                    h2 {{ font-size: 1.5em; border-bottom: 1px solid #eaecef; padding-bottom: 0.3em; }}
-                    p {{ margin-top: 0; margin-bottom: 16px; }}
-                    img {{ max-width: 100%; }}
-                    table {{ border-collapse: collapse; margin: 15px 0; width: 100%; }}
-                    table, th, td {{ border: 1px solid #ddd; padding: 8px; }}
-                    th {{ background-color: #f8f8f8; }}
-                </style>
-            </head>
-            <body>
-                {html_content}
-            </body>
-            </html>
-            """
-            
-            # 记录可能的警告
-            if result.messages:
-                logger.warning(f"Conversion warnings: {result.messages}")
-            
-            # 创建HTML响应
-            response = make_response(styled_html)
-            response.headers['Content-Type'] = 'text/html; charset=utf-8'
-            
-            # 添加跨域和缓存控制头
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Origin, Accept, Content-Type, X-Requested-With'
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            
-            # 返回HTML响应
-            return response
-            
+            return preview_html_response(template, file_path)
         except Exception as e:
             logger.error(f"Error converting DOCX to HTML: {e}")
             return jsonify({
@@ -449,81 +465,7 @@ def preview_template(id):
     # 如果直接访问预览URL但没有指定format=html，尝试自动检测文件类型进行转换
     if template.file_type and template.file_type.lower() in ['docx', 'doc']:
         try:
-            logger.info(f"自动转换DOCX为HTML: {file_path}")
-            
-            # 复用上面的转换逻辑...
-            style_map = """
-                p[style-name='Title'] => h1:fresh
-                p[style-name='Heading 1'] => h1:fresh
-                p[style-name='Heading 2'] => h2:fresh
-                p[style-name='Heading 3'] => h3:fresh
-                p[style-name='Heading 4'] => h4:fresh
-                p[style-name='Heading 5'] => h5:fresh
-                p[style-name='Heading 6'] => h6:fresh
-                r[style-name='Strong'] => strong
-                r[style-name='Emphasis'] => em
-                p[style-name='Quote'] => blockquote
-                p[style-name='Normal'] => p
-            """
-            
-            # 图片处理选项 - 内联base64格式
-            def image_handler(image):
-                with image.open() as image_bytes:
-                    image_data = image_bytes.read()
-                    encoded_image = base64.b64encode(image_data).decode("ascii")
-                    return {"src": f"data:{image.content_type};base64,{encoded_image}"}
-            
-            # 使用mammoth转换DOCX为HTML
-            with open(file_path, 'rb') as docx_file:
-                result = mammoth.convert_to_html(
-                    docx_file, 
-                    style_map=style_map,
-                    convert_image=mammoth.images.img_element(image_handler)
-                )
-            
-            # 获取生成的HTML
-            html_content = result.value
-            
-            # 添加基本样式包装
-            styled_html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <title>{template.title}</title>
-                <style>
-                    body {{ font-family: 'Segoe UI', Arial, sans-serif; line-height: 1.6; color: #333; max-width: 800px; margin: 0 auto; padding: 20px; }}
-                    h1, h2, h3, h4, h5, h6 {{ margin-top: 24px; margin-bottom: 16px; font-weight: 600; line-height: 1.25; }}
-                    h1 {{ font-size: 2em; border-bottom: 1px solid #eaecef; padding-bottom: 0.3em; }}
-                    h2 {{ font-size: 1.5em; border-bottom: 1px solid #eaecef; padding-bottom: 0.3em; }}
-                    p {{ margin-top: 0; margin-bottom: 16px; }}
-                    img {{ max-width: 100%; }}
-                    table {{ border-collapse: collapse; margin: 15px 0; width: 100%; }}
-                    table, th, td {{ border: 1px solid #ddd; padding: 8px; }}
-                    th {{ background-color: #f8f8f8; }}
-                </style>
-            </head>
-            <body>
-                {html_content}
-            </body>
-            </html>
-            """
-            
-            # 创建HTML响应
-            response = make_response(styled_html)
-            response.headers['Content-Type'] = 'text/html; charset=utf-8'
-            
-            # 添加跨域和缓存控制头
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Origin, Accept, Content-Type, X-Requested-With'
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            
-            # 返回HTML响应
-            return response
-            
+            return preview_html_response(template, file_path)
         except Exception as e:
             logger.error(f"自动转换DOCX到HTML失败: {e}")
             # 转换失败，继续使用原始文件返回
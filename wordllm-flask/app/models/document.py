@@ -20,6 +20,14 @@ class Document(db.Model):
     subchapter_prompt = db.Column(db.Text, nullable=True, comment='后续级别目录生成的自定义提示词')
     content_prompt = db.Column(db.Text, nullable=True, comment='文档内容生成的自定义提示词')
     
+    # 上传后后台预处理的结果
+    processing_status = db.Column(db.String(20), nullable=True, comment='预处理状态: pending/processing/ready/failed')
+    processing_error = db.Column(db.Text, nullable=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    heading_outline = db.Column(db.Text, nullable=True, comment='标题层级及各节token数(JSON)')
+    text_length = db.Column(db.Integer, nullable=True)
+    token_count = db.Column(db.Integer, nullable=True)
+    
     # 模板相关字段已移除
     
     def to_dict(self):
@@ -37,7 +45,11 @@ class Document(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'outline_prompt': self.outline_prompt,
             'subchapter_prompt': self.subchapter_prompt,
-            'content_prompt': self.content_prompt
+            'content_prompt': self.content_prompt,
+            'processing_status': self.processing_status,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None,
+            'text_length': self.text_length,
+            'token_count': self.token_count
         }
         
         # 添加预览和下载URL
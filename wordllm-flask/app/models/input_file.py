@@ -0,0 +1,35 @@
+from app import db
+from datetime import datetime
+
+class InputFile(db.Model):
+    """项目的输入文件(需求说明、招标文件等)，按内容哈希去重，只上传和解析一次"""
+    __tablename__ = 'input_files'
+    __table_args__ = (
+        # 同一项目内相同内容的文件只登记一次
+        db.Index('uq_input_files_project_hash', 'project_id', 'content_hash', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=True)
+    original_filename = db.Column(db.String(255), nullable=True)
+    stored_name = db.Column(db.String(100), nullable=False, index=True, comment='UPLOAD_FOLDER/inputs下的文件名: 内容哈希+扩展名')
+    content_hash = db.Column(db.String(64), nullable=False)
+    file_size = db.Column(db.Integer, nullable=True)
+    text_length = db.Column(db.Integer, nullable=True)
+    token_count = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    project = db.relationship('Project', backref=db.backref('input_files', lazy=True))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'original_filename': self.original_filename,
+            'content_hash': self.content_hash,
+            'file_size': self.file_size,
+            'text_length': self.text_length,
+            'token_count': self.token_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_used_at': self.last_used_at.isoformat() if self.last_used_at else None
+        }
@@ -0,0 +1,36 @@
+from app import db
+from datetime import datetime
+
+class GenerationJob(db.Model):
+    """持久化的章节生成任务，通过租约(lease)机制在进程重启后自动重新排队"""
+    __tablename__ = 'generation_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    template_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    chapter_number = db.Column(db.String(50), nullable=False)
+    chapter_title = db.Column(db.String(255), nullable=False)
+    outline_structure = db.Column(db.Text, nullable=True)
+    input_file_id = db.Column(db.Integer, db.ForeignKey('input_files.id'), nullable=True)  # 生成时引用的输入文件
+    regenerate = db.Column(db.Boolean, nullable=False, default=False)  # 重新生成时跳过响应缓存
+    status = db.Column(db.String(20), default='queued', index=True)  # queued/running/done/failed
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    max_concurrency = db.Column(db.Integer, nullable=True)  # 该项目的并发上限，为空时使用全局默认值
+    lease_owner = db.Column(db.String(100), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'chapter_number': self.chapter_number,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
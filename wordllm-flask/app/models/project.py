@@ -7,18 +7,24 @@ class Project(db.Model):
     project_name = db.Column(db.String(255), nullable=False)  # 新增项目名称字段
     template_name = db.Column(db.String(255), nullable=False)  # 原title字段改为template_name
     template_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     chapters = db.relationship('Chapter', backref='project', lazy=True)
 
 class Chapter(db.Model):
     __tablename__ = 'chapters'
+    __table_args__ = (
+        # 同一项目内章节编号唯一，按编号查找章节走该索引
+        db.Index('uq_chapters_project_chapter_number', 'project_id', 'chapter_number', unique=True),
+        # 按项目读取章节列表时的排序
+        db.Index('ix_chapters_project_order_index', 'project_id', 'order_index'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
     chapter_number = db.Column(db.String(50), nullable=False)
     title = db.Column(db.String(255), nullable=False)
     content = db.Column(db.Text, nullable=True)
-    parent_id = db.Column(db.Integer, db.ForeignKey('chapters.id'), nullable=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('chapters.id'), nullable=True, index=True)
     order_index = db.Column(db.Integer, default=0)
     status = db.Column(db.String(20), default='pending')  # pending/generating/done/failed
     error_message = db.Column(db.Text, nullable=True)
@@ -1,27 +1,46 @@
 """
 文档内容生成相关的提示词模板
+
+提示词分为两部分：同一文档所有章节共用的前缀(写作要求、模板、大纲、输入文件全文)在前，
+章节相关的后缀(相关输入片段、章节信息、输出格式)在后。
+前缀在各章节之间逐字节相同，支持前缀缓存的服务端(vLLM、OpenAI等)可以复用已计算的前缀。
+前缀中不能出现任何与具体章节有关的内容。
 """
 
-# 生成文档内容的提示词模板
-DOCUMENT_CONTENT_GENERATION_PROMPT = """
+# 章节内容生成提示词的共用前缀
+DOCUMENT_CONTENT_SHARED_PROMPT = """
 你是一位经验丰富的专业文档写作专家，擅长根据大纲和要求撰写高质量的文档内容。
 
-请根据以下信息为特定章节撰写内容，并严格按照下方格式输出：
+下面先给出整个文档共用的资料(写作要求、模板内容、文档大纲结构和输入文件)，最后给出需要撰写的章节和输出格式。
 
-===章节信息===
-章节编号: {chapter_number}
-章节标题: {chapter_title}
-===章节信息结束===
-
-===文档大纲结构===
-{outline_structure}
-===文档大纲结构结束===
+【内容要求】
+1. 内容必须专业、准确、符合行业标准。
+2. 针对章节标题，生成相关的详细内容。
+3. 结构清晰，逻辑严密，段落合理。
+4. 适当引用行业标准、最佳实践或相关案例。
+5. 文风应保持正式、专业。
+6. 使用Markdown格式，内容总字数控制在1000-1500字左右。
 
 ===模板内容===
 {template_content}
 ===模板内容结束===
 
+===文档大纲结构===
+{outline_structure}
+===文档大纲结构结束===
+
 {input_content_section}
+"""
+
+# 章节内容生成提示词的章节后缀
+DOCUMENT_CONTENT_CHAPTER_PROMPT = """
+{input_excerpt_section}
+===章节信息===
+章节编号: {chapter_number}
+章节标题: {chapter_title}
+===章节信息结束===
+
+请根据以上资料为该章节撰写内容，并严格按照下方格式输出：
 
 【输出要求】
 你必须只输出如下格式的标准JSON对象，且必须符合JSON语法：
@@ -37,18 +56,44 @@ DOCUMENT_CONTENT_GENERATION_PROMPT = """
 - content 字段内如有换行、引号、反斜杠等，必须用 JSON 合法转义。
 - 不要输出任何代码块标记（如```、```json等），不要输出多余的说明。
 
-【内容要求】
-1. 内容必须专业、准确、符合行业标准。
-2. 针对章节标题，生成相关的详细内容。
-3. 结构清晰，逻辑严密，段落合理。
-4. 适当引用行业标准、最佳实践或相关案例。
-5. 文风应保持正式、专业。
-6. 使用Markdown格式，内容总字数控制在1000-1500字左右。
+请严格遵循以上要求，直接输出JSON对象。
+"""
+
+# 批量生成多个章节内容时的章节后缀
+DOCUMENT_BATCH_CHAPTER_PROMPT = """
+{input_excerpt_section}
+===章节列表===
+{chapter_list}
+===章节列表结束===
+
+请根据以上资料为列表中的每个章节分别撰写内容，并严格按照下方格式输出：
+
+【输出要求】
+你必须只输出如下格式的标准JSON对象，且必须符合JSON语法：
+{{
+  "chapters": [
+    {{
+      "chapterNumber": "章节编号",
+      "title": "章节标题",
+      "content": "章节正文内容（Markdown字符串，需转义所有引号和特殊字符）"
+    }}
+  ]
+}}
+- chapters数组必须按列表顺序包含列表中的全部{chapter_count}个章节，chapterNumber与列表中的章节编号一致。
+- 每个章节只写该章节本身的内容，不要包含其他章节的内容。
+- 每个章节的内容控制在{chapter_chars}字左右，此要求优先于上文的字数要求。
+- content 字段内容为对应章节的完整 Markdown 正文（不允许 code block，不允许解释、注释、格式说明、其它多余内容）。
+- 必须保证整个输出是一个合法的JSON对象，不能有多余的文本、注释或格式说明。
+- content 字段内如有换行、引号、反斜杠等，必须用 JSON 合法转义。
+- 不要输出任何代码块标记（如```、```json等），不要输出多余的说明。
 
 请严格遵循以上要求，直接输出JSON对象。
 """
 
-# 输入文件内容部分
+# 章节列表中的一行
+BATCH_CHAPTER_LINE = "章节编号: {chapter_number} | 章节标题: {chapter_title}"
+
+# 输入文件内容部分(全文，放在共用前缀中)
 INPUT_CONTENT_SECTION = """
 ===输入文件内容===
 {input_content}
@@ -57,6 +102,20 @@ INPUT_CONTENT_SECTION = """
 请根据以上输入文件的内容，结合章节要求生成相关内容。
 """
 
+# 输入文件中与章节相关的片段(各章节不同，放在章节后缀中)
+INPUT_EXCERPT_SECTION = """
+===输入文件相关片段===
+{input_content}
+===输入文件相关片段结束===
+
+请根据以上输入文件片段，结合章节要求生成相关内容。
+"""
+
+# 输入文件按章节检索时，共用前缀中的说明
+INPUT_EXCERPT_NOTICE = """
+输入文件中与各章节相关的片段在章节信息之前给出。
+"""
+
 # 无输入文件内容部分
 NO_INPUT_CONTENT_SECTION = """
 未提供输入文件。请根据章节标题和文档结构生成内容。
@@ -0,0 +1,103 @@
+"""
+基于openai.AsyncOpenAI的异步模型调用模块
+"""
+import logging
+
+from app.services.ai.model_caller import ModelCaller, ENHANCED_SYSTEM_PROMPT, DEFAULT_TEMPERATURE
+from app.services.ai.response_cache import get_response_cache, make_cache_key
+from app.services.ai.token_budget import get_token_budget
+from app.services.ai.prompt_prefix import get_prefix_tracker
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncModelCaller:
+    """ModelCaller的异步版本，只能在AsyncRunner的事件循环中使用"""
+
+    @staticmethod
+    def _messages(prompt, system_prompt=None):
+        # 带共用前缀的提示词按PROMPT_PREFIX_MODE拆分消息
+        return get_prefix_tracker().messages(system_prompt or ENHANCED_SYSTEM_PROMPT, prompt)
+
+    @staticmethod
+    async def call_model(client, model, prompt, system_prompt=None, use_cache=True):
+        """异步调用模型，返回结果与ModelCaller.call_model一致
+
+        Args:
+            client: AsyncOpenAI客户端
+            model: 模型名称
+            prompt: 用户提示词
+            system_prompt: 系统提示词，默认使用强化的JSON提示词
+            use_cache: 是否使用响应缓存，与同步调用共享同一缓存
+
+        Returns:
+            ChatCompletion: 经过ModelCaller.process_response处理的响应
+        """
+        cache = get_response_cache()
+        # 输出token上限按模型配置，与提示词预算一致
+        max_tokens = get_token_budget().max_output(model)
+        cache_key = make_cache_key(model, system_prompt or ENHANCED_SYSTEM_PROMPT, prompt, DEFAULT_TEMPERATURE, max_tokens)
+        if use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"命中响应缓存，跳过异步模型调用，长度: {len(cached)}字符")
+                return ModelCaller.process_response(ModelCaller.cached_completion(model, cached))
+        else:
+            cache.record_bypass()
+
+        logger.info(f"异步请求大模型 {model}，提示词长度: {len(prompt)}字符")
+        response = await client.chat.completions.create(
+            model=model,
+            messages=AsyncModelCaller._messages(prompt, system_prompt),
+            temperature=DEFAULT_TEMPERATURE,
+            max_tokens=max_tokens
+        )
+        ModelCaller.store_response(cache, cache_key, response)
+        return ModelCaller.process_response(response)
+
+    @staticmethod
+    async def stream_model(client, model, prompt, system_prompt=None, use_cache=True):
+        """异步流式调用模型，逐段产出文本增量
+
+        Args:
+            client: AsyncOpenAI客户端
+            model: 模型名称
+            prompt: 用户提示词
+            system_prompt: 系统提示词，默认使用强化的JSON提示词
+            use_cache: 是否使用响应缓存，命中时分段回放缓存内容
+
+        Yields:
+            str: 模型返回的文本增量
+        """
+        cache = get_response_cache()
+        # 输出token上限按模型配置，与提示词预算一致
+        max_tokens = get_token_budget().max_output(model)
+        cache_key = make_cache_key(model, system_prompt or ENHANCED_SYSTEM_PROMPT, prompt, DEFAULT_TEMPERATURE, max_tokens)
+        if use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"命中响应缓存，回放异步流式响应，长度: {len(cached)}字符")
+                for piece in ModelCaller.cached_chunks(cached):
+                    yield piece
+                return
+        else:
+            cache.record_bypass()
+
+        logger.info(f"异步流式请求大模型 {model}，提示词长度: {len(prompt)}字符")
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=AsyncModelCaller._messages(prompt, system_prompt),
+            temperature=DEFAULT_TEMPERATURE,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        parts = []
+        finish_reason = None
+        async for chunk in stream:
+            if chunk.choices:
+                if chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+        if finish_reason == 'stop':
+            cache.put(cache_key, ''.join(parts))
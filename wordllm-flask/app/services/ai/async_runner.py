@@ -0,0 +1,107 @@
+"""
+后台asyncio事件循环
+
+所有异步模型调用都运行在同一个后台线程的事件循环中，
+一个进程可以同时处理大量并发的流式生成，而不需要为每个调用占用一个线程。
+"""
+import asyncio
+import logging
+import queue
+import threading
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# 用于标记异步生成器结束的哨兵对象
+_END = object()
+
+
+class AsyncRunner:
+    """在后台线程中运行的事件循环"""
+
+    def __init__(self, max_concurrent=200):
+        """初始化并启动事件循环线程
+
+        Args:
+            max_concurrent: 同时进行的异步模型调用上限
+        """
+        self.loop = asyncio.new_event_loop()
+        self.max_concurrent = max_concurrent
+        self._semaphore = None
+        self._active = 0
+        self._thread = threading.Thread(target=self._run, name='async-model-loop', daemon=True)
+        self._thread.start()
+        logger.info(f"异步模型调用事件循环已启动: max_concurrent={max_concurrent}")
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.loop.run_forever()
+
+    async def _limited(self, coro):
+        async with self._semaphore:
+            self._active += 1
+            try:
+                return await coro
+            finally:
+                self._active -= 1
+
+    def submit(self, coro):
+        """把协程提交到事件循环执行
+
+        Returns:
+            concurrent.futures.Future: 协程结果
+        """
+        return asyncio.run_coroutine_threadsafe(self._limited(coro), self.loop)
+
+    def iterate(self, agen):
+        """把异步生成器转换为同步迭代器，供WSGI流式响应使用
+
+        Args:
+            agen: 异步生成器
+
+        Returns:
+            iterator: 同步迭代器，异步生成器中的异常会在迭代时重新抛出
+        """
+        items = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            except BaseException as e:
+                items.put(e)
+            finally:
+                items.put(_END)
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item = items.get()
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # 客户端提前断开时取消上游请求
+            future.cancel()
+
+    def stats(self):
+        return {'active': self._active, 'max_concurrent': self.max_concurrent}
+
+
+# 实例缓存
+_async_runner_instance = None
+_instance_lock = threading.Lock()
+
+def get_async_runner():
+    """获取共享的异步事件循环"""
+    global _async_runner_instance
+    if _async_runner_instance is None:
+        with _instance_lock:
+            if _async_runner_instance is None:
+                _async_runner_instance = AsyncRunner(
+                    max_concurrent=current_app.config.get('ASYNC_MAX_CONCURRENT_CALLS', 200)
+                )
+    return _async_runner_instance
@@ -0,0 +1,179 @@
+"""
+章节批量生成模块
+
+叶子章节(没有下级章节的章节)的正文通常较短，逐章调用模型时每次都要重新发送模板和大纲。
+批量模式把同一上级章节下的若干叶子章节放进一个提示词，要求模型返回包含多个章节的JSON，
+再按章节编号拆分和校验，解析失败的章节退回逐章生成。
+每批的章节数由模型的输出token上限和每章预计的输出token数决定。
+"""
+import re
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from app.utils.app_config import get_config
+from app.services.ai.token_budget import get_token_budget
+
+logger = logging.getLogger(__name__)
+
+# 批量响应中单个章节对象的开头
+_CHAPTER_OBJECT = re.compile(r'\{\s*"chapterNumber"')
+
+# 最近一次生成文档的批量报告，按线程保存
+_local = threading.local()
+
+
+def parent_number(chapter_number):
+    """上级章节编号，一级章节返回空字符串"""
+    return str(chapter_number).rpartition('.')[0]
+
+
+def batch_size(model=None):
+    """按模型的输出token上限计算每批的章节数，小于2时不批量生成"""
+    config = get_config()
+    chapter_tokens = max(1, config.get('GENERATION_BATCH_CHAPTER_TOKENS', 600))
+    size = get_token_budget().max_output(model) // chapter_tokens
+    return min(size, config.get('GENERATION_BATCH_MAX_CHAPTERS', 6))
+
+
+def chapter_chars():
+    """批量生成时每个章节要求的字数"""
+    return max(100, int(round(get_config().get('GENERATION_BATCH_CHAPTER_TOKENS', 600) * 2 / 3, -1)))
+
+
+def plan_batches(chapters, all_chapters, size):
+    """把章节分为批量生成的批次和逐章生成的章节
+
+    只有叶子章节参与批量生成，同一批的章节属于同一上级章节并保持原顺序。
+
+    Args:
+        chapters: 需要生成内容的章节列表
+        all_chapters: 完整的章节列表，用于判断是否为叶子章节
+        size: 每批最多的章节数
+
+    Returns:
+        tuple: (批次列表, 逐章生成的章节列表)
+    """
+    if size < 2:
+        return [], list(chapters)
+    parents = {parent_number(ch['chapterNumber']) for ch in all_chapters}
+    groups = OrderedDict()
+    singles = []
+    for ch in chapters:
+        if ch['chapterNumber'] in parents:
+            singles.append(ch)
+        else:
+            groups.setdefault(parent_number(ch['chapterNumber']), []).append(ch)
+    batches = []
+    for siblings in groups.values():
+        if len(siblings) < 2:
+            singles.extend(siblings)
+            continue
+        # 平均分成若干批，避免最后一批只剩一个章节
+        count = -(-len(siblings) // size)
+        bounds = [len(siblings) * i // count for i in range(count + 1)]
+        batches.extend(siblings[bounds[i]:bounds[i + 1]] for i in range(count))
+    return batches, singles
+
+
+def parse_batch_response(content, expected_numbers):
+    """从批量响应中拆分各章节的内容
+
+    完整的JSON解析失败时(例如输出被截断)，逐个提取其中完整的章节对象。
+
+    Args:
+        content: 模型返回的文本
+        expected_numbers: 本批的章节编号列表
+
+    Returns:
+        dict: {章节编号: 正文}，只包含解析成功且内容非空的章节
+    """
+    text = (content or '').strip()
+    if text.startswith('```'):
+        text = re.sub(r'^```[a-zA-Z]*', '', text)
+        text = re.sub(r'```$', '', text).strip()
+
+    items = []
+    try:
+        data = json.loads(text)
+        items = data.get('chapters', []) if isinstance(data, dict) else data
+    except ValueError:
+        decoder = json.JSONDecoder()
+        for match in _CHAPTER_OBJECT.finditer(text):
+            try:
+                item, _ = decoder.raw_decode(text, match.start())
+                items.append(item)
+            except ValueError:
+                continue
+
+    expected = {str(number) for number in expected_numbers}
+    contents = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        number = str(item.get('chapterNumber', ''))
+        body = item.get('content')
+        if number in expected and number not in contents and isinstance(body, str) and body.strip():
+            contents[number] = body
+    return contents
+
+
+def last_report():
+    """返回当前线程最近一次生成文档的批量报告，未生成过时返回None"""
+    return getattr(_local, 'report', None)
+
+
+class BatchStats:
+    """累计文档内容生成的模型调用次数，批量生成节省的调用次数和token数，以及整批退回逐章浪费的调用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            'documents': 0,
+            'chapters': 0,
+            'batches': 0,
+            'batched_chapters': 0,
+            'fallback_chapters': 0,
+            'round_trips': 0,
+            'saved_round_trips': 0,
+            'saved_prompt_tokens': 0,
+            'wasted_batch_calls': 0,
+            'wasted_prompt_tokens': 0
+        }
+
+    def record(self, report):
+        """记录一次文档生成的批量报告"""
+        _local.report = report
+        with self._lock:
+            self._stats['documents'] += 1
+            for key in ('chapters', 'batches', 'batched_chapters', 'fallback_chapters',
+                        'round_trips', 'saved_round_trips', 'saved_prompt_tokens',
+                        'wasted_batch_calls', 'wasted_prompt_tokens'):
+                self._stats[key] += report.get(key, 0)
+        logger.info(
+            f"文档{report['document']}内容生成{'(批量)' if report['batch'] else ''}: {report['chapters']}个章节, {report['batches']}批"
+            f"(含{report['batched_chapters']}个章节), 退回逐章{report['fallback_chapters']}个, "
+            f"模型调用{report['round_trips']}次(节省{report['saved_round_trips']}次), "
+            f"约节省{report['saved_prompt_tokens']}个提示词token; "
+            f"整批退回{report['wasted_batch_calls']}次(浪费{report['wasted_prompt_tokens']}个提示词token)"
+        )
+
+    def stats(self):
+        """返回累计统计"""
+        with self._lock:
+            return dict(self._stats)
+
+
+# 实例缓存
+_batch_stats_instance = None
+_instance_lock = threading.Lock()
+
+def get_batch_stats():
+    """获取批量生成统计实例"""
+    global _batch_stats_instance
+    if _batch_stats_instance is None:
+        with _instance_lock:
+            if _batch_stats_instance is None:
+                _batch_stats_instance = BatchStats()
+    return _batch_stats_instance
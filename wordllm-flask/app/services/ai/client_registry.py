@@ -0,0 +1,124 @@
+"""
+进程内共享的OpenAI客户端
+
+按(api_key, base_url)缓存客户端，底层使用带连接池和keep-alive的httpx客户端，
+请求线程、后台生成线程和流式调用共用同一批连接，避免重复的TLS握手和配置文件读取。
+"""
+import logging
+import threading
+import importlib.util
+import httpx
+import openai
+
+from app.utils.app_config import get_config
+
+logger = logging.getLogger(__name__)
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _http2_enabled(config):
+    """只有安装了h2包时才启用HTTP/2"""
+    if not config.get('OPENAI_HTTP2', True):
+        return False
+    return importlib.util.find_spec('h2') is not None
+
+
+def _build_limits(config):
+    return httpx.Limits(
+        max_connections=config.get('OPENAI_MAX_CONNECTIONS', 50),
+        max_keepalive_connections=config.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 20),
+        keepalive_expiry=config.get('OPENAI_KEEPALIVE_EXPIRY', 60)
+    )
+
+
+def get_openai_client(api_key=None, base_url=None):
+    """获取共享的OpenAI客户端
+
+    Args:
+        api_key: API密钥，默认使用配置中的OPENAI_API_KEY
+        base_url: API基础URL，默认使用配置中的OPENAI_API_BASE
+
+    Returns:
+        openai.OpenAI: 线程安全、可复用的客户端
+    """
+    config = get_config()
+    api_key = api_key or config.get('OPENAI_API_KEY')
+    base_url = base_url or config.get('OPENAI_API_BASE')
+    key = ('sync', api_key, base_url)
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http2 = _http2_enabled(config)
+            http_client = httpx.Client(
+                limits=_build_limits(config),
+                timeout=config.get('OPENAI_TIMEOUT', 300),
+                http2=http2
+            )
+            client = openai.OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=http_client,
+                max_retries=config.get('OPENAI_MAX_RETRIES', 2)
+            )
+            _clients[key] = client
+            logger.info(f"已创建共享OpenAI客户端: base_url={base_url}, http2={http2}")
+    return client
+
+
+def get_async_openai_client(api_key=None, base_url=None):
+    """获取共享的AsyncOpenAI客户端
+
+    异步客户端绑定在创建它的事件循环上，只能在AsyncRunner的事件循环中使用。
+
+    Returns:
+        openai.AsyncOpenAI: 可复用的异步客户端
+    """
+    config = get_config()
+    api_key = api_key or config.get('OPENAI_API_KEY')
+    base_url = base_url or config.get('OPENAI_API_BASE')
+    key = ('async', api_key, base_url)
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http2 = _http2_enabled(config)
+            http_client = httpx.AsyncClient(
+                limits=_build_limits(config),
+                timeout=config.get('OPENAI_TIMEOUT', 300),
+                http2=http2
+            )
+            client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=http_client,
+                max_retries=config.get('OPENAI_MAX_RETRIES', 2)
+            )
+            _clients[key] = client
+            logger.info(f"已创建共享AsyncOpenAI客户端: base_url={base_url}, http2={http2}")
+    return client
+
+
+def close_all_clients():
+    """关闭所有共享客户端的连接池（进程退出时调用）"""
+    with _lock:
+        for key, client in _clients.items():
+            if key[0] == 'async':
+                # 异步客户端随事件循环一起关闭
+                continue
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"关闭OpenAI客户端失败: {e}")
+        for key in [key for key in _clients if key[0] == 'sync']:
+            del _clients[key]
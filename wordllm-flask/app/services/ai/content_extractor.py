@@ -6,6 +6,8 @@ import logging
 import mammoth
 from flask import current_app
 
+from app.services.ai.extraction_cache import get_extraction_cache
+
 logger = logging.getLogger(__name__)
 
 class ContentExtractor:
@@ -38,7 +40,7 @@ class ContentExtractor:
     
     @staticmethod
     def extract_file_content(file_path):
-        """根据文件类型提取文件内容
+        """根据文件类型提取文件内容，结果按文件内容哈希缓存
         
         Args:
             file_path: 文件路径
@@ -55,14 +57,25 @@ class ContentExtractor:
         if not os.path.exists(file_path):
             logger.warning(f"文件不存在: {file_path}")
             return ""
+        
+        return get_extraction_cache().get_or_extract(file_path, ContentExtractor._extract_file_content_uncached)
+    
+    @staticmethod
+    def _extract_file_content_uncached(file_path):
+        """实际解析文件并提取内容（不经过缓存）
+        
+        Args:
+            file_path: 文件路径
             
+        Returns:
+            str: 提取的内容
+        """
         file_ext = os.path.splitext(file_path)[1].lower()
         logger.info(f"检测到的文件类型: '{file_ext}'")
         
         try:
             if file_ext in ['.docx', '.doc']:
                 with open(file_path, 'rb') as f:
-                    result = mammoth.convert_to_html(f)
                     content = mammoth.extract_raw_text(f).value
                     logger.info(f"成功提取Word文件内容, 字符数: {len(content)}")
                     return content
@@ -7,8 +7,11 @@ from flask import current_app
 
 from app.models.document import Document
 from app.services.ai.content_extractor import ContentExtractor
+from app.services.ai.input_retrieval import InputRetriever
 from app.services.ai.model_caller import ModelCaller
 from app.services.ai.prompt_handler import PromptHandler
+from app.services.ai.prompt_prefix import get_prefix_tracker
+from app.services.ai.chapter_batching import batch_size, chapter_chars, plan_batches, parse_batch_response, get_batch_stats
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +19,24 @@ class DocumentGenerator:
     """文档内容生成器，处理章节内容的AI生成相关功能"""
     
     @staticmethod
-    def generate_chapter_content(client, model, template_id, chapter_number, chapter_title, outline_structure, input_file_path=None):
+    def _chapter_input(input_file_path, chapter_number, chapter_title, outline_structure):
+        """获取输入文件中与章节相关的内容
+
+        Returns:
+            tuple: (输入内容, 检索片段的token上限)，输入内容是全文时上限为0
+        """
+        if not input_file_path:
+            return "", 0
+        input_content = InputRetriever.relevant_content(
+            input_file_path, chapter_number, chapter_title, outline_structure
+        )
+        # 检索到的片段各章节不同，放在提示词的章节后缀中
+        if InputRetriever.is_excerpt(input_content):
+            return input_content, current_app.config.get('RETRIEVAL_MAX_TOKENS', 3000)
+        return input_content, 0
+    
+    @staticmethod
+    def generate_chapter_content(client, model, template_id, chapter_number, chapter_title, outline_structure, input_file_path=None, use_cache=True, project_id=None, on_delta=None, raise_errors=False):
         """为特定章节生成内容
         
         Args:
@@ -27,6 +47,11 @@ class DocumentGenerator:
             chapter_title: 章节标题
             outline_structure: 整个文档的大纲结构（JSON字符串）
             input_file_path: 输入文件路径（可选）
+            use_cache: 是否使用响应缓存，重新生成时为False
+            project_id: 项目ID（可选），用于统计提示词前缀复用率
+            on_delta: 模型输出文本增量的回调（可选），提供时以流式方式调用模型
+            raise_errors: 出错时是否抛出异常；为False时返回提示错误的内容，使前端能正常显示，
+                后台任务需要为True，按失败处理并重试
             
         Returns:
             str: 生成的章节内容
@@ -40,23 +65,34 @@ class DocumentGenerator:
             # 使用ContentExtractor提取模板内容
             template_content = ContentExtractor.extract_template_content(template)
             
-            # 2. 获取输入文件内容（如果提供）
-            input_content = ""
-            if input_file_path:
-                input_content = ContentExtractor.extract_file_content(input_file_path)
+            # 2. 获取输入文件中与本章节相关的内容（如果提供）
+            input_content, input_excerpt_max_tokens = DocumentGenerator._chapter_input(
+                input_file_path, chapter_number, chapter_title, outline_structure
+            )
             
-            # 3. 使用PromptHandler构建提示词
+            # 3. 使用PromptHandler构建提示词，各章节共用的部分在前
             prompt = PromptHandler.build_document_content_prompt(
                 chapter_number,
                 chapter_title,
                 outline_structure,
                 template_content,
-                input_content
+                input_content,
+                model=model,
+                input_excerpt_max_tokens=input_excerpt_max_tokens
             )
+            get_prefix_tracker().record(project_id if project_id is not None else f"template:{template_id}", prompt)
             logger.info(f"[AI调试] 章节生成Prompt内容如下:\n{prompt}")
             
-            # 4. 使用ModelCaller调用模型
-            response = ModelCaller.call_model(client, model, prompt)
+            # 4. 使用ModelCaller调用模型，需要推送进度时流式调用，结束后按完整响应处理
+            if on_delta:
+                parts = []
+                for chunk in ModelCaller.call_model_streaming(client, model, prompt, use_cache=use_cache):
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        on_delta(chunk.choices[0].delta.content)
+                response = ModelCaller.process_response(ModelCaller.cached_completion(model, ''.join(parts)))
+            else:
+                response = ModelCaller.call_model(client, model, prompt, use_cache=use_cache)
             logger.info(f"[AI调试] 原始模型响应: {response}")
             
             # 5. 处理结果
@@ -112,6 +148,8 @@ class DocumentGenerator:
             except Exception as e:
                 import traceback
                 logger.error(f"处理响应出错: {str(e)}\n堆栈: {traceback.format_exc()}")
+                if raise_errors:
+                    raise
                 # 模拟内容以保证前端能正常显示
                 content = f"## {chapter_title}\n\n本章节内容暂时无法生成。\n\n调用API时出现错误: {str(e)}\n\n请稍后重试或联系系统管理员。"
             
@@ -125,6 +163,8 @@ class DocumentGenerator:
         except Exception as e:
             import traceback
             logger.error(f"生成章节'{chapter_title}'内容失败: {str(e)}\n堆栈: {traceback.format_exc()}")
+            if raise_errors:
+                raise
             # 返回错误信息作为内容，使前端能正常显示
             return {
                 "success": True,  # 返回True以避免前端崩溃
@@ -132,50 +172,187 @@ class DocumentGenerator:
             }
     
     @staticmethod
-    def generate_document_content(client, model, template_id, chapters, input_file_path=None):
+    def generate_batch_content(client, model, template_id, chapters, outline_structure, input_file_path=None, project_id=None, use_cache=True):
+        """在一次模型调用中生成多个同级叶子章节的内容，解析失败的章节退回逐章生成
+        
+        Args:
+            client: OpenAI客户端
+            model: 模型名称
+            template_id: 模板ID
+            chapters: 本批章节列表，包含chapterNumber和title字段
+            outline_structure: 整个文档的大纲结构（JSON字符串）
+            input_file_path: 输入文件路径（可选）
+            project_id: 项目ID（可选），用于统计提示词前缀复用率
+            use_cache: 是否使用响应缓存
+            
+        Returns:
+            tuple: ({章节编号: 生成结果}, {'prompt_tokens': 批量提示词token数, 'prefix_tokens': 共用前缀token数, 'fallback': 退回逐章的章节数})
+        """
+        numbers = [ch['chapterNumber'] for ch in chapters]
+        usage = {'prompt_tokens': 0, 'prefix_tokens': 0, 'fallback': 0}
+        parsed = {}
+        try:
+            template = Document.query.get(template_id)
+            if not template:
+                raise ValueError(f"未找到ID为{template_id}的模板")
+            template_content = ContentExtractor.extract_template_content(template)
+            
+            # 同级章节的上级章节相同，以各章节标题合并检索
+            input_content, input_excerpt_max_tokens = DocumentGenerator._chapter_input(
+                input_file_path, numbers[0], ' '.join(ch['title'] for ch in chapters), outline_structure
+            )
+            prompt = PromptHandler.build_document_batch_prompt(
+                chapters,
+                outline_structure,
+                template_content,
+                input_content,
+                chapter_chars(),
+                model=model,
+                input_excerpt_max_tokens=input_excerpt_max_tokens
+            )
+            get_prefix_tracker().record(project_id if project_id is not None else f"template:{template_id}", prompt)
+            usage['prompt_tokens'] = prompt.tokens
+            usage['prefix_tokens'] = prompt.prefix_tokens
+            
+            response = ModelCaller.call_model(client, model, prompt, use_cache=use_cache)
+            content = response.choices[0].message.content if hasattr(response, 'choices') and response.choices else ''
+            parsed = parse_batch_response(content, numbers)
+            logger.info(f"批量生成章节{numbers}: 解析出{len(parsed)}个章节")
+        except Exception as e:
+            logger.error(f"批量生成章节{numbers}失败: {str(e)}", exc_info=True)
+        
+        results = {number: {"success": True, "content": body} for number, body in parsed.items()}
+        for ch in chapters:
+            if ch['chapterNumber'] in results:
+                continue
+            logger.warning(f"批量生成结果中缺少章节{ch['chapterNumber']}，退回逐章生成")
+            usage['fallback'] += 1
+            results[ch['chapterNumber']] = DocumentGenerator.generate_chapter_content(
+                client,
+                model,
+                template_id,
+                ch['chapterNumber'],
+                ch['title'],
+                outline_structure,
+                input_file_path,
+                use_cache=use_cache,
+                project_id=project_id
+            )
+        return results, usage
+    
+    @staticmethod
+    def generate_document_content(client, model, template_id, chapters, input_file_path=None, project_id=None, max_concurrency=None, batch=None, on_chapter=None, on_delta=None, use_cache=True):
         """为文档的所有章节生成内容
         
+        各章节通过共享的生成线程池并发生成，同一项目的并发数受限于max_concurrency。
+        批量模式下同一上级章节的叶子章节按批在一次模型调用中生成，每批章节数由输出token上限决定。
+        
         Args:
             client: OpenAI客户端
             model: 模型名称
             template_id: 模板ID
             chapters: 章节列表，包含chapterNumber和title字段
             input_file_path: 输入文件路径（可选）
+            project_id: 项目ID（可选），用于线程池按项目调度
+            max_concurrency: 该项目的最大并发数（可选）
+            batch: 是否批量生成叶子章节（可选），默认使用GENERATION_BATCH_ENABLED
+            on_chapter: 章节内容生成后的回调（可选），参数为(章节编号, 内容)，在生成线程中按完成顺序调用
+            on_delta: 模型输出文本增量的回调（可选），参数为(章节编号, 文本)，提供时逐章生成的章节以流式方式调用模型；
+                批量生成的章节不推送增量
+            use_cache: 是否使用响应缓存，重新生成时为False
             
         Returns:
             dict: 包含所有章节内容的字典，键为章节编号
         """
+        from app.services.ai.generation_pool import get_generation_pool
+        
         try:
-            results = {}
             outline_structure = json.dumps(chapters, ensure_ascii=False)
             
-            # 按章节编号排序
+            # 按章节编号排序，只处理一级和二级章节
             sorted_chapters = sorted(chapters, key=lambda ch: ch['chapterNumber'])
+            target_chapters = [ch for ch in sorted_chapters if ch['chapterNumber'].count('.') <= 1]
+            
+            if batch is None:
+                batch = current_app.config.get('GENERATION_BATCH_ENABLED', False)
+            size = batch_size(model) if batch else 0
+            batches, singles = plan_batches(target_chapters, chapters, size)
             
-            for chapter in sorted_chapters:
-                chapter_number = chapter['chapterNumber']
-                chapter_title = chapter['title']
-                
-                # 只处理一级和二级章节
-                if chapter_number.count('.') <= 1:
-                    logger.info(f"开始生成章节'{chapter_title}'的内容...")
-                    
-                    content = DocumentGenerator.generate_chapter_content(
+            def generate(task):
+                if isinstance(task, list):
+                    logger.info(f"开始批量生成{len(task)}个章节的内容: {[ch['chapterNumber'] for ch in task]}")
+                    output = DocumentGenerator.generate_batch_content(
                         client,
                         model,
                         template_id,
-                        chapter_number,
-                        chapter_title,
+                        task,
                         outline_structure,
-                        input_file_path
+                        input_file_path,
+                        project_id=project_id,
+                        use_cache=use_cache
                     )
-                    
-                    # 存储结果
-                    results[chapter_number] = content
-                    
-                    logger.info(f"章节'{chapter_title}'内容生成完成")
+                    if on_chapter:
+                        for ch in task:
+                            on_chapter(ch['chapterNumber'], output[0].get(ch['chapterNumber']))
+                    return output
+                chapter = task
+                logger.info(f"开始生成章节'{chapter['title']}'的内容...")
+                content = DocumentGenerator.generate_chapter_content(
+                    client,
+                    model,
+                    template_id,
+                    chapter['chapterNumber'],
+                    chapter['title'],
+                    outline_structure,
+                    input_file_path,
+                    use_cache=use_cache,
+                    project_id=project_id,
+                    on_delta=(lambda text: on_delta(chapter['chapterNumber'], text)) if on_delta else None
+                )
+                logger.info(f"章节'{chapter['title']}'内容生成完成")
+                if on_chapter:
+                    on_chapter(chapter['chapterNumber'], content)
+                return content
+            
+            project_key = project_id if project_id is not None else f"template:{template_id}"
+            tasks = batches + singles
+            outputs = get_generation_pool().map(project_key, generate, tasks, max_concurrency=max_concurrency)
+            
+            results = {}
+            report = {
+                'document': project_key,
+                'batch': bool(batch),
+                'batch_size': size,
+                'chapters': len(target_chapters),
+                'batches': len(batches),
+                'batched_chapters': sum(len(b) for b in batches),
+                'fallback_chapters': 0,
+                'round_trips': 0,
+                'saved_round_trips': 0,
+                'saved_prompt_tokens': 0,
+                'wasted_batch_calls': 0,
+                'wasted_prompt_tokens': 0
+            }
+            for task, output in zip(tasks, outputs):
+                if isinstance(task, list):
+                    contents, usage = output
+                    results.update(contents)
+                    report['fallback_chapters'] += usage['fallback']
+                    report['round_trips'] += 1 + usage['fallback']
+                    # 每批只发送一次共用前缀，退回逐章的章节各自再发送一次；
+                    # 退回较多时节省量按0计，整批退回的那次调用单独计为浪费，不抵扣其它批次的节省
+                    saved_calls = len(task) - 1 - usage['fallback']
+                    report['saved_round_trips'] += max(0, saved_calls)
+                    report['saved_prompt_tokens'] += usage['prefix_tokens'] * max(0, saved_calls)
+                    if usage['fallback'] >= len(task):
+                        report['wasted_batch_calls'] += 1
+                        report['wasted_prompt_tokens'] += usage['prompt_tokens']
+                else:
+                    results[task['chapterNumber']] = output
+                    report['round_trips'] += 1
+            get_batch_stats().record(report)
             
-            return results
+            return {ch['chapterNumber']: results.get(ch['chapterNumber']) for ch in target_chapters}
             
         except Exception as e:
             logger.error(f"生成文档内容失败: {str(e)}")
@@ -0,0 +1,185 @@
+"""
+文件文本提取缓存模块
+
+以文件内容哈希(加提取器版本号)为键缓存提取出的纯文本，
+分为进程内LRU缓存和STORAGE_FOLDER下的磁盘缓存两级。
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from flask import current_app
+
+from app.utils.file_hash import file_sha256
+
+logger = logging.getLogger(__name__)
+
+# 提取逻辑变化时需要递增，使旧的缓存条目失效
+EXTRACTOR_VERSION = 2
+
+
+class ExtractionCache:
+    """内容寻址的文件提取结果缓存"""
+
+    def __init__(self, cache_dir, max_entries=64):
+        """初始化缓存
+
+        Args:
+            cache_dir: 磁盘缓存目录
+            max_entries: 内存LRU缓存的最大条目数
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        # 文件路径 -> (mtime, size, 内容哈希)，避免每次都重新计算哈希
+        self._path_hashes = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'bytes_hashed': 0,
+            'bytes_served': 0,
+            'bytes_extracted': 0
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _file_hash(self, file_path):
+        """计算文件内容哈希，文件未变化时直接复用上次结果"""
+        stat = os.stat(file_path)
+        with self._lock:
+            cached = self._path_hashes.get(file_path)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+
+        file_hash = file_sha256(file_path)
+
+        with self._lock:
+            self._path_hashes[file_path] = (stat.st_mtime, stat.st_size, file_hash)
+            self._stats['bytes_hashed'] += stat.st_size
+        return file_hash
+
+    def file_hash(self, file_path):
+        """文件内容哈希，供其它按文件内容缓存的模块复用"""
+        return self._file_hash(file_path)
+
+    def _key(self, file_hash):
+        return f"{file_hash}-v{EXTRACTOR_VERSION}"
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def _remember(self, key, content):
+        """写入内存LRU（调用方需持有锁）"""
+        self._memory[key] = content
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_or_extract(self, file_path, extractor):
+        """获取文件的提取结果，未命中时调用extractor并写入缓存
+
+        Args:
+            file_path: 文件路径
+            extractor: 实际执行提取的函数，参数为file_path，返回str
+
+        Returns:
+            str: 提取的内容
+        """
+        try:
+            key = self._key(self._file_hash(file_path))
+        except OSError as e:
+            logger.warning(f"计算文件哈希失败，跳过缓存: {file_path}, {e}")
+            return extractor(file_path)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                content = self._memory[key]
+                self._stats['memory_hits'] += 1
+                self._stats['bytes_served'] += len(content)
+                return content
+
+        disk_path = self._disk_path(key)
+        if os.path.exists(disk_path):
+            try:
+                with open(disk_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                with self._lock:
+                    self._remember(key, content)
+                    self._stats['disk_hits'] += 1
+                    self._stats['bytes_served'] += len(content)
+                return content
+            except OSError as e:
+                logger.warning(f"读取提取缓存失败: {disk_path}, {e}")
+
+        content = extractor(file_path)
+        with self._lock:
+            self._stats['misses'] += 1
+            self._stats['bytes_extracted'] += len(content)
+            # 提取失败(空内容)时不写缓存，下次仍会重试
+            if content:
+                self._remember(key, content)
+
+        if content:
+            try:
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+                tmp_path = f"{disk_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                os.replace(tmp_path, disk_path)
+            except OSError as e:
+                logger.warning(f"写入提取缓存失败: {disk_path}, {e}")
+        return content
+
+    def invalidate(self, file_path):
+        """使某个文件对应的缓存失效（模板文件被替换或删除时调用）
+
+        Args:
+            file_path: 文件路径
+        """
+        with self._lock:
+            cached = self._path_hashes.pop(file_path, None)
+        if not cached:
+            return
+        key = self._key(cached[2])
+        with self._lock:
+            self._memory.pop(key, None)
+            self._stats['invalidations'] += 1
+        disk_path = self._disk_path(key)
+        try:
+            if os.path.exists(disk_path):
+                os.remove(disk_path)
+        except OSError as e:
+            logger.warning(f"删除提取缓存失败: {disk_path}, {e}")
+        logger.info(f"已使提取缓存失效: {file_path}")
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        hits = stats['memory_hits'] + stats['disk_hits']
+        total = hits + stats['misses']
+        stats['hits'] = hits
+        stats['hit_rate'] = round(hits / total, 4) if total else 0.0
+        return stats
+
+
+# 实例缓存
+_extraction_cache_instance = None
+_instance_lock = threading.Lock()
+
+def get_extraction_cache():
+    """获取提取缓存实例，确保在应用上下文中创建"""
+    global _extraction_cache_instance
+    if _extraction_cache_instance is None:
+        with _instance_lock:
+            if _extraction_cache_instance is None:
+                cache_dir = os.path.join(current_app.config['STORAGE_FOLDER'], 'extract_cache')
+                _extraction_cache_instance = ExtractionCache(
+                    cache_dir,
+                    max_entries=current_app.config.get('EXTRACTION_CACHE_MAX_ENTRIES', 64)
+                )
+    return _extraction_cache_instance
@@ -0,0 +1,137 @@
+"""
+章节生成并发执行池
+
+所有章节生成任务共享一个有界线程池，全局同时进行的模型调用数不超过
+GENERATION_MAX_WORKERS；每个项目有独立的待执行队列和并发上限，
+工作线程在各项目之间轮询取任务，避免大项目饿死其它项目。
+"""
+import logging
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import Future
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationPool:
+    """按项目公平调度的有界生成线程池"""
+
+    def __init__(self, app, max_workers=4, project_concurrency=2):
+        """初始化线程池
+
+        Args:
+            app: Flask应用实例，任务在其应用上下文中执行
+            max_workers: 全局最大并发数
+            project_concurrency: 单个项目默认的最大并发数
+        """
+        self.app = app
+        self.max_workers = max(1, int(max_workers))
+        self.project_concurrency = max(1, int(project_concurrency))
+        # 项目key -> 待执行任务队列，OrderedDict的顺序即轮询顺序
+        self._queues = OrderedDict()
+        self._limits = {}
+        self._running = {}
+        self._cond = threading.Condition()
+        self._threads = []
+        for i in range(self.max_workers):
+            thread = threading.Thread(target=self._worker, name=f"generation-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"章节生成线程池已启动: max_workers={self.max_workers}, project_concurrency={self.project_concurrency}")
+
+    def submit(self, project_key, fn, *args, max_concurrency=None, **kwargs):
+        """提交一个生成任务
+
+        Args:
+            project_key: 项目标识，同一项目的任务共享并发上限
+            fn: 任务函数
+            max_concurrency: 该项目的并发上限（可选，不超过全局上限）
+
+        Returns:
+            Future: 任务结果
+        """
+        future = Future()
+        with self._cond:
+            if max_concurrency:
+                self._limits[project_key] = max(1, min(int(max_concurrency), self.max_workers))
+            self._queues.setdefault(project_key, deque()).append((future, fn, args, kwargs))
+            self._cond.notify()
+        return future
+
+    def map(self, project_key, fn, items, max_concurrency=None):
+        """对items中的每一项并发执行fn，按原顺序返回结果
+
+        任务异常会在获取结果时重新抛出。
+        """
+        futures = [self.submit(project_key, fn, item, max_concurrency=max_concurrency) for item in items]
+        return [future.result() for future in futures]
+
+    def _next_task(self):
+        """按轮询顺序选出下一个可执行的任务（调用方需持有锁）"""
+        for project_key in list(self._queues.keys()):
+            queue = self._queues[project_key]
+            limit = self._limits.get(project_key, self.project_concurrency)
+            if self._running.get(project_key, 0) >= limit:
+                continue
+            task = queue.popleft()
+            if queue:
+                # 移到队尾，下次优先服务其它项目
+                self._queues.move_to_end(project_key)
+            else:
+                del self._queues[project_key]
+            self._running[project_key] = self._running.get(project_key, 0) + 1
+            return project_key, task
+        return None, None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                project_key, task = self._next_task()
+                while task is None:
+                    self._cond.wait()
+                    project_key, task = self._next_task()
+
+            future, fn, args, kwargs = task
+            try:
+                if future.set_running_or_notify_cancel():
+                    with self.app.app_context():
+                        future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                logger.exception(f"生成任务执行失败: project={project_key}")
+                future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[project_key] -= 1
+                    if not self._running[project_key] and project_key not in self._queues:
+                        del self._running[project_key]
+                        self._limits.pop(project_key, None)
+                    self._cond.notify_all()
+
+    def stats(self):
+        """返回当前排队和执行中的任务数"""
+        with self._cond:
+            return {
+                'max_workers': self.max_workers,
+                'running': sum(self._running.values()),
+                'queued': sum(len(q) for q in self._queues.values()),
+                'projects': len(set(self._queues) | set(self._running))
+            }
+
+
+# 实例缓存
+_generation_pool_instance = None
+_instance_lock = threading.Lock()
+
+def get_generation_pool():
+    """获取共享的章节生成线程池，确保在应用上下文中创建"""
+    global _generation_pool_instance
+    if _generation_pool_instance is None:
+        with _instance_lock:
+            if _generation_pool_instance is None:
+                _generation_pool_instance = GenerationPool(
+                    current_app._get_current_object(),
+                    max_workers=current_app.config.get('GENERATION_MAX_WORKERS', 4),
+                    project_concurrency=current_app.config.get('GENERATION_PROJECT_CONCURRENCY', 2)
+                )
+    return _generation_pool_instance
@@ -0,0 +1,370 @@
+"""
+输入文件检索模块
+
+输入文件(需求说明、招标文件等)往往有上百页，生成每个章节时都完整放入提示词既浪费token又拖慢生成。
+这里把输入文件的提取文本切分为若干段落块，建立BM25索引(中文按相邻两字切分词项)，
+生成章节时以章节标题及其上级章节标题为查询，只把最相关的若干段落放入提示词。
+索引按文件内容哈希缓存在内存和STORAGE_FOLDER下，上传输入文件时即在后台建立。
+"""
+import os
+import re
+import json
+import math
+import logging
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+from app.services.ai.content_extractor import ContentExtractor
+from app.services.ai.extraction_cache import get_extraction_cache
+from app.utils.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# 索引格式或切分逻辑变化时需要递增，使旧的索引失效
+INDEX_VERSION = 1
+
+# BM25参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# 连续的中文字符或连续的字母数字
+_TERM_PATTERN = re.compile(r'[一-鿿]+|[a-z0-9]+')
+
+# 形如"1.2 "、"第三章"、"一、"、"（二）"的标题行
+_HEADING_PATTERN = re.compile(r'^(\d+(\.\d+)*[\s、.]|第[一二三四五六七八九十百\d]+[章节条部分]|[一二三四五六七八九十]+、|[（(][一二三四五六七八九十\d]+[)）])')
+
+# 检索结果的开头，用于区分检索片段和全文
+EXCERPT_HEADER = '(以下为输入文件中与本章节相关的{count}个片段，按原文顺序排列)'
+
+# 超长段落按句子切分
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;])')
+
+
+def tokenize(text):
+    """把文本切分为检索词项：中文取相邻两字，单个汉字保留原字，字母数字按单词"""
+    terms = []
+    for match in _TERM_PATTERN.finditer(text.lower()):
+        word = match.group()
+        if '一' <= word[0] <= '鿿' and len(word) > 1:
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            terms.append(word)
+    return terms
+
+
+def split_passages(text, chunk_tokens):
+    """按段落把文本切分为约chunk_tokens大小的段落块，记录每块所属的最近标题
+
+    Returns:
+        list: [{'text': 段落块文本, 'heading': 所属标题}]
+    """
+    passages = []
+    current, current_tokens, current_heading = [], 0, ''
+    heading = ''
+
+    def flush():
+        if current:
+            passages.append({'text': '\n'.join(current), 'heading': current_heading})
+
+    for paragraph in (line.strip() for line in text.split('\n')):
+        if not paragraph:
+            continue
+        if len(paragraph) <= 40 and _HEADING_PATTERN.match(paragraph):
+            heading = paragraph
+        tokens = count_tokens(paragraph)
+        units = [paragraph]
+        if tokens > chunk_tokens:
+            units = [s for s in _SENTENCE_END.split(paragraph) if s.strip()]
+        for unit in units:
+            unit_tokens = count_tokens(unit) if len(units) > 1 else tokens
+            if current and current_tokens + unit_tokens > chunk_tokens:
+                flush()
+                current, current_tokens = [], 0
+            if not current:
+                current_heading = heading
+            current.append(unit)
+            current_tokens += unit_tokens
+    flush()
+    return passages
+
+
+class PassageIndex:
+    """一个输入文件的BM25段落索引"""
+
+    def __init__(self, passages):
+        """初始化索引
+
+        Args:
+            passages: [{'text', 'heading', 'tf': {词项: 词频}, 'length', 'tokens'}]
+        """
+        self.passages = passages
+        self.total_tokens = sum(p['tokens'] for p in passages)
+        self.avg_length = (sum(p['length'] for p in passages) / len(passages)) if passages else 0
+        df = Counter()
+        for passage in passages:
+            df.update(passage['tf'].keys())
+        count = len(passages)
+        self.idf = {term: math.log(1 + (count - n + 0.5) / (n + 0.5)) for term, n in df.items()}
+
+    @classmethod
+    def build(cls, text, chunk_tokens=300):
+        """从文本建立索引"""
+        passages = []
+        for passage in split_passages(text, chunk_tokens):
+            terms = tokenize(f"{passage['heading']}\n{passage['text']}")
+            passages.append({
+                'text': passage['text'],
+                'heading': passage['heading'],
+                'tf': dict(Counter(terms)),
+                'length': len(terms),
+                'tokens': count_tokens(passage['text'])
+            })
+        return cls(passages)
+
+    def to_dict(self):
+        return {'version': INDEX_VERSION, 'passages': self.passages}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['passages'])
+
+    def search(self, query, top_k):
+        """返回与查询最相关的段落序号，按相关度降序
+
+        Returns:
+            list: [(得分, 段落序号)]，只包含得分大于0的段落
+        """
+        terms = set(tokenize(query))
+        scores = []
+        for index, passage in enumerate(self.passages):
+            tf = passage['tf']
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * passage['length'] / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+            if score > 0:
+                scores.append((score, index))
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return scores[:top_k]
+
+
+class RetrievalIndexStore:
+    """按文件内容哈希缓存段落索引，分为进程内LRU和磁盘两级"""
+
+    def __init__(self, cache_dir, chunk_tokens=300, max_entries=8):
+        """初始化索引缓存
+
+        Args:
+            cache_dir: 磁盘缓存目录
+            chunk_tokens: 段落块大小(token)
+            max_entries: 内存中缓存的索引数
+        """
+        self.cache_dir = cache_dir
+        self.chunk_tokens = chunk_tokens
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # 同一文件只建立一次索引，并发请求等待正在进行的建立
+        self._build_locks = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='retrieval-index')
+        self._stats = {
+            'builds': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'retrievals': 0,
+            'full_text_used': 0,
+            'input_tokens': 0,
+            'retrieved_tokens': 0
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key, index):
+        """写入内存LRU（调用方需持有锁）"""
+        self._memory[key] = index
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_or_build(self, file_path):
+        """获取文件的段落索引，未建立时提取文本并建立
+
+        Returns:
+            PassageIndex: 索引，文件不存在或没有可提取的文本时返回None
+        """
+        if not file_path or not os.path.exists(file_path):
+            return None
+        key = f"{get_extraction_cache().file_hash(file_path)}-c{self.chunk_tokens}-v{INDEX_VERSION}"
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return self._memory[key]
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                if key in self._memory:
+                    self._stats['memory_hits'] += 1
+                    return self._memory[key]
+            disk_path = self._disk_path(key)
+            index = None
+            if os.path.exists(disk_path):
+                try:
+                    with open(disk_path, 'r', encoding='utf-8') as f:
+                        index = PassageIndex.from_dict(json.load(f))
+                    with self._lock:
+                        self._stats['disk_hits'] += 1
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"读取检索索引失败: {disk_path}, {e}")
+            if index is None:
+                text = ContentExtractor.extract_file_content(file_path)
+                if not text:
+                    with self._lock:
+                        self._build_locks.pop(key, None)
+                    return None
+                index = PassageIndex.build(text, self.chunk_tokens)
+                with self._lock:
+                    self._stats['builds'] += 1
+                logger.info(f"已建立输入文件检索索引: {file_path}, {len(index.passages)}个段落, 约{index.total_tokens}个token")
+                try:
+                    os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+                    tmp_path = f"{disk_path}.{os.getpid()}.tmp"
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        json.dump(index.to_dict(), f, ensure_ascii=False)
+                    os.replace(tmp_path, disk_path)
+                except OSError as e:
+                    logger.warning(f"写入检索索引失败: {disk_path}, {e}")
+            with self._lock:
+                self._remember(key, index)
+                self._build_locks.pop(key, None)
+            return index
+
+    def submit(self, file_path):
+        """在后台建立索引（上传输入文件后调用）"""
+        app = current_app._get_current_object()
+
+        def build():
+            with app.app_context():
+                try:
+                    self.get_or_build(file_path)
+                except Exception as e:
+                    logger.error(f"建立检索索引失败: {file_path}, {e}")
+
+        return self._executor.submit(build)
+
+    def record(self, input_tokens, retrieved_tokens, full_text):
+        with self._lock:
+            self._stats['retrievals'] += 1
+            self._stats['full_text_used'] += 1 if full_text else 0
+            self._stats['input_tokens'] += input_tokens
+            self._stats['retrieved_tokens'] += retrieved_tokens
+
+    def stats(self):
+        """返回索引缓存和检索统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        stats['tokens_saved'] = stats['input_tokens'] - stats['retrieved_tokens']
+        return stats
+
+
+class InputRetriever:
+    """为章节生成选取输入文件中的相关段落"""
+
+    @staticmethod
+    def chapter_query(chapter_number, chapter_title, outline_structure=None):
+        """以章节标题和各级上级章节标题组成查询，章节本身的标题权重加倍"""
+        titles = {}
+        if outline_structure:
+            try:
+                chapters = json.loads(outline_structure) if isinstance(outline_structure, str) else outline_structure
+                titles = {str(ch.get('chapterNumber')): ch.get('title', '') for ch in chapters if isinstance(ch, dict)}
+            except (ValueError, TypeError):
+                titles = {}
+        parts = str(chapter_number).split('.')
+        ancestors = [titles.get('.'.join(parts[:i]), '') for i in range(1, len(parts))]
+        return ' '.join(filter(None, ancestors + [chapter_title, chapter_title]))
+
+    @staticmethod
+    def relevant_content(file_path, chapter_number, chapter_title, outline_structure=None):
+        """返回输入文件中与章节相关的内容
+
+        文件较小或未启用检索时返回全文；否则按相关度选取段落，按原文顺序拼接。
+
+        Args:
+            file_path: 输入文件路径
+            chapter_number: 章节编号
+            chapter_title: 章节标题
+            outline_structure: 完整大纲结构(JSON字符串)，用于获取上级章节标题
+
+        Returns:
+            str: 输入内容
+        """
+        config = current_app.config
+        if not config.get('RETRIEVAL_ENABLED', True):
+            return ContentExtractor.extract_file_content(file_path)
+        store = get_retrieval_index_store()
+        index = store.get_or_build(file_path)
+        if index is None:
+            return ContentExtractor.extract_file_content(file_path)
+        if index.total_tokens <= config.get('RETRIEVAL_MIN_TOKENS', 2000):
+            store.record(index.total_tokens, index.total_tokens, True)
+            return ContentExtractor.extract_file_content(file_path)
+
+        query = InputRetriever.chapter_query(chapter_number, chapter_title, outline_structure)
+        hits = index.search(query, config.get('RETRIEVAL_TOP_K', 8))
+        if not hits:
+            # 没有相关段落时使用文件开头(通常是概述)
+            hits = [(0.0, i) for i in range(min(config.get('RETRIEVAL_TOP_K', 8), len(index.passages)))]
+
+        # 在token上限内按相关度选取，再按原文顺序排列
+        max_tokens = config.get('RETRIEVAL_MAX_TOKENS', 3000)
+        selected, used = [], 0
+        for _, i in hits:
+            tokens = index.passages[i]['tokens']
+            if selected and used + tokens > max_tokens:
+                continue
+            selected.append(i)
+            used += tokens
+        selected.sort()
+
+        blocks = []
+        for i in selected:
+            passage = index.passages[i]
+            header = f"[片段{i + 1}" + (f" | {passage['heading']}" if passage['heading'] else '') + ']'
+            blocks.append(f"{header}\n{passage['text']}")
+        store.record(index.total_tokens, used, False)
+        logger.info(f"章节{chapter_number}'{chapter_title}'检索到{len(selected)}个相关段落, "
+                    f"约{used}个token(全文约{index.total_tokens}个token)")
+        return EXCERPT_HEADER.format(count=len(selected)) + '\n\n' + '\n\n'.join(blocks)
+
+    @staticmethod
+    def is_excerpt(content):
+        """relevant_content返回的是否为检索到的片段(而不是全文)"""
+        return bool(content) and content.startswith(EXCERPT_HEADER.split('{')[0])
+
+
+# 实例缓存
+_retrieval_store_instance = None
+_instance_lock = threading.Lock()
+
+def get_retrieval_index_store():
+    """获取检索索引缓存实例，确保在应用上下文中创建"""
+    global _retrieval_store_instance
+    if _retrieval_store_instance is None:
+        with _instance_lock:
+            if _retrieval_store_instance is None:
+                config = current_app.config
+                _retrieval_store_instance = RetrievalIndexStore(
+                    os.path.join(config['STORAGE_FOLDER'], 'retrieval_index'),
+                    chunk_tokens=config.get('RETRIEVAL_CHUNK_TOKENS', 300),
+                    max_entries=config.get('RETRIEVAL_MAX_INDEXES', 8)
+                )
+    return _retrieval_store_instance
@@ -0,0 +1,360 @@
+"""
+持久化章节生成任务队列
+
+任务保存在generation_jobs表中。工作进程通过带过期时间的租约领取任务，
+执行期间定期心跳续约；进程崩溃或重启后租约过期，任务会被自动重新排队。
+"""
+import os
+import json
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+
+from app import db
+from app.models.job import GenerationJob
+from app.models.input_file import InputFile
+from app.models.project import Chapter
+from app.services.generation_events import ChapterProgressPublisher, publish_chapter_status
+from app.services.collaboration import notify_chapter_contents
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """基于数据库的任务队列操作"""
+
+    @staticmethod
+    def enqueue_chapters(template_id, project_id, chapters, max_concurrency=None, max_attempts=None, input_file_id=None, regenerate=False):
+        """为章节列表创建生成任务
+
+        同一项目同一章节尚未开始执行的旧任务会被新任务取代。
+
+        Args:
+            template_id: 模板ID
+            project_id: 项目ID
+            chapters: 章节列表，包含chapterNumber和title
+            max_concurrency: 该项目的最大并发数（可选）
+            max_attempts: 最大尝试次数（可选）
+            input_file_id: 生成时引用的已登记输入文件ID（可选）
+            regenerate: 是否重新生成，为True时跳过响应缓存
+
+        Returns:
+            list: 新建任务的ID列表
+        """
+        if max_attempts is None:
+            max_attempts = current_app.config.get('GENERATION_JOB_MAX_ATTEMPTS', 3)
+        outline_structure = json.dumps(chapters, ensure_ascii=False)
+        chapter_numbers = [ch['chapterNumber'] for ch in chapters]
+
+        GenerationJob.query.filter(
+            GenerationJob.project_id == project_id,
+            GenerationJob.status == 'queued',
+            GenerationJob.chapter_number.in_(chapter_numbers)
+        ).delete(synchronize_session=False)
+
+        jobs = [
+            GenerationJob(
+                project_id=project_id,
+                template_id=template_id,
+                chapter_number=ch['chapterNumber'],
+                chapter_title=ch['title'],
+                outline_structure=outline_structure,
+                input_file_id=input_file_id,
+                regenerate=bool(regenerate),
+                status='queued',
+                attempts=0,
+                max_attempts=max_attempts,
+                max_concurrency=max_concurrency
+            )
+            for ch in chapters
+        ]
+        db.session.add_all(jobs)
+        db.session.commit()
+        logger.info(f"已为项目{project_id}创建{len(jobs)}个章节生成任务")
+        return [job.id for job in jobs]
+
+    @staticmethod
+    def claim(worker_id, limit, lease_seconds):
+        """领取最多limit个排队中的任务，不同项目的任务交替领取
+
+        通过带条件的UPDATE实现原子领取，多个工作进程并发领取时不会重复。
+
+        Returns:
+            list: 成功领取的任务ID列表
+        """
+        if limit <= 0:
+            return []
+        candidates = GenerationJob.query.with_entities(GenerationJob.id, GenerationJob.project_id).filter(
+            GenerationJob.status == 'queued'
+        ).order_by(GenerationJob.id).limit(limit * 4).all()
+
+        # 按项目轮询排序，避免一个大项目占满本轮领取
+        by_project = {}
+        for job_id, project_id in candidates:
+            by_project.setdefault(project_id, []).append(job_id)
+        ordered = []
+        while by_project and len(ordered) < limit:
+            for project_id in list(by_project.keys()):
+                ordered.append(by_project[project_id].pop(0))
+                if not by_project[project_id]:
+                    del by_project[project_id]
+                if len(ordered) >= limit:
+                    break
+
+        claimed = []
+        now = datetime.utcnow()
+        for job_id in ordered:
+            rows = GenerationJob.query.filter(
+                GenerationJob.id == job_id,
+                GenerationJob.status == 'queued'
+            ).update({
+                'status': 'running',
+                'lease_owner': worker_id,
+                'lease_expires_at': now + timedelta(seconds=lease_seconds),
+                'heartbeat_at': now,
+                'attempts': GenerationJob.attempts + 1
+            }, synchronize_session=False)
+            if rows == 1:
+                claimed.append(job_id)
+        db.session.commit()
+        return claimed
+
+    @staticmethod
+    def heartbeat(worker_id, job_ids, lease_seconds):
+        """为当前工作进程持有的任务续约"""
+        if not job_ids:
+            return 0
+        now = datetime.utcnow()
+        rows = GenerationJob.query.filter(
+            GenerationJob.id.in_(list(job_ids)),
+            GenerationJob.status == 'running',
+            GenerationJob.lease_owner == worker_id
+        ).update({
+            'lease_expires_at': now + timedelta(seconds=lease_seconds),
+            'heartbeat_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+        return rows
+
+    @staticmethod
+    def finish(job_id, worker_id, status, error_message=None, commit=True):
+        """结束任务，只有仍持有租约时才会生效
+
+        Args:
+            commit: 是否立即提交；为False时由调用方与章节写入一起提交
+
+        Returns:
+            bool: 是否更新成功（租约已被收回时返回False）
+        """
+        rows = GenerationJob.query.filter(
+            GenerationJob.id == job_id,
+            GenerationJob.lease_owner == worker_id,
+            GenerationJob.status == 'running'
+        ).update({
+            'status': status,
+            'error_message': error_message,
+            'lease_owner': None,
+            'lease_expires_at': None,
+            'updated_at': datetime.utcnow()
+        }, synchronize_session=False)
+        if commit:
+            db.session.commit()
+        return rows == 1
+
+    @staticmethod
+    def requeue_expired():
+        """把租约已过期的任务重新排队，超过最大尝试次数的标记为失败
+
+        Returns:
+            int: 处理的任务数
+        """
+        now = datetime.utcnow()
+        expired = GenerationJob.query.filter(
+            GenerationJob.status == 'running',
+            GenerationJob.lease_expires_at < now
+        ).all()
+        transitions = []
+        for job in expired:
+            chapter = Chapter.query.filter_by(project_id=job.project_id, chapter_number=job.chapter_number).first()
+            if job.attempts >= (job.max_attempts or 1):
+                job.status = 'failed'
+                job.error_message = '任务租约多次过期，已放弃'
+                if chapter:
+                    chapter.status = 'failed'
+                    chapter.error_message = job.error_message
+            else:
+                job.status = 'queued'
+                if chapter:
+                    chapter.status = 'pending'
+            if chapter:
+                transitions.append((job.project_id, job.chapter_number, chapter.status, job.error_message, job.id))
+            logger.warning(f"任务{job.id}租约已过期(owner={job.lease_owner})，状态改为{job.status}")
+            job.lease_owner = None
+            job.lease_expires_at = None
+        if expired:
+            db.session.commit()
+        # 提交后再推送，客户端收到事件时数据库中已是新状态
+        for project_id, chapter_number, status, error_message, job_id in transitions:
+            publish_chapter_status(project_id, chapter_number, status, error_message if status == 'failed' else None, job_id=job_id)
+        return len(expired)
+
+
+def run_chapter_job(job_id, worker_id):
+    """执行单个章节生成任务，并把结果写入chapters表"""
+    from app.services.ai_service import get_ai_service
+    from app.services.ai.document_generation import DocumentGenerator
+    from app.services.input_files import InputFileService
+
+    job = GenerationJob.query.get(job_id)
+    if not job:
+        return
+    db_chapter = None
+    # 状态变化和正文增量推送到项目的房间，客户端无需轮询章节列表
+    publisher = ChapterProgressPublisher(job.project_id, job.chapter_number, job_id=job.id)
+    try:
+        db_chapter = Chapter.query.filter_by(project_id=job.project_id, chapter_number=job.chapter_number).first()
+        if db_chapter:
+            db_chapter.status = 'generating'
+            db.session.commit()
+        publisher.status('generating')
+        # 引用的输入文件已被删除时不使用输入文件
+        input_file = InputFile.query.get(job.input_file_id) if job.input_file_id else None
+        # AI生成内容
+        ai_service = get_ai_service()
+        result = DocumentGenerator.generate_chapter_content(
+            ai_service.client,
+            ai_service.model,
+            job.template_id,
+            job.chapter_number,
+            job.chapter_title,
+            job.outline_structure,
+            input_file_path=InputFileService.file_path(input_file) if input_file else None,
+            use_cache=not job.regenerate,
+            project_id=job.project_id,
+            on_delta=publisher.delta if publisher.push_deltas else None,
+            # 模型调用失败时抛出异常，任务按失败处理并在重试次数内重新排队
+            raise_errors=True
+        )
+        content = result['content'] if isinstance(result, dict) else result
+        # 写入内容和状态，与任务完成状态在同一事务中提交
+        if db_chapter:
+            db_chapter.content = content
+            db_chapter.status = 'done'
+            db_chapter.updated_at = datetime.utcnow()
+        if not JobQueue.finish(job_id, worker_id, 'done', commit=False):
+            # 租约已被收回（例如心跳超时），结果交给新的执行者写入
+            logger.warning(f"任务{job_id}的租约已失效，丢弃本次结果")
+            db.session.rollback()
+            return
+        db.session.commit()
+        if db_chapter:
+            # 正在协作编辑该章节时同步给编辑者，避免会话写回旧文本
+            notify_chapter_contents({db_chapter.id: content})
+        publisher.status('done', content=content)
+    except Exception as e:
+        logger.exception(f"章节生成任务{job_id}失败")
+        db.session.rollback()
+        # 未超过最大尝试次数时重新排队，与租约过期的处理一致
+        retry = job.attempts < (job.max_attempts or 1)
+        if JobQueue.finish(job_id, worker_id, 'queued' if retry else 'failed', str(e)):
+            if db_chapter:
+                db_chapter.status = 'pending' if retry else 'failed'
+                db_chapter.error_message = None if retry else str(e)
+                db.session.commit()
+            if retry:
+                logger.warning(f"任务{job_id}第{job.attempts}次执行失败，重新排队")
+                publisher.status('pending')
+            else:
+                publisher.status('failed', error_message=str(e))
+
+
+class GenerationWorker:
+    """从任务表领取任务并交给生成线程池执行的工作进程"""
+
+    def __init__(self, app, worker_id=None):
+        self.app = app
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self.lease_seconds = app.config.get('GENERATION_JOB_LEASE_SECONDS', 120)
+        self.poll_interval = app.config.get('GENERATION_JOB_POLL_INTERVAL', 2)
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _run_job(self, job_id):
+        try:
+            run_chapter_job(job_id, self.worker_id)
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _heartbeat_loop(self):
+        interval = max(1, self.lease_seconds // 3)
+        while not self._stop.wait(interval):
+            with self._lock:
+                job_ids = set(self._active)
+            if not job_ids:
+                continue
+            try:
+                with self.app.app_context():
+                    JobQueue.heartbeat(self.worker_id, job_ids, self.lease_seconds)
+                    db.session.remove()
+            except Exception as e:
+                logger.error(f"任务心跳失败: {e}")
+
+    def poll_once(self):
+        """回收过期任务并按线程池空闲容量领取新任务
+
+        Returns:
+            int: 本次领取的任务数
+        """
+        from app.services.ai.generation_pool import get_generation_pool
+
+        with self.app.app_context():
+            try:
+                JobQueue.requeue_expired()
+                pool = get_generation_pool()
+                stats = pool.stats()
+                free = stats['max_workers'] - stats['running'] - stats['queued']
+                job_ids = JobQueue.claim(self.worker_id, free, self.lease_seconds)
+                for job_id in job_ids:
+                    job = GenerationJob.query.get(job_id)
+                    with self._lock:
+                        self._active.add(job_id)
+                    pool.submit(job.project_id, self._run_job, job_id, max_concurrency=job.max_concurrency)
+                return len(job_ids)
+            finally:
+                db.session.remove()
+
+    def run_forever(self):
+        """持续轮询任务表，直到stop()被调用"""
+        logger.info(f"章节生成工作进程已启动: {self.worker_id}")
+        threading.Thread(target=self._heartbeat_loop, name='generation-heartbeat', daemon=True).start()
+        while not self._stop.is_set():
+            try:
+                claimed = self.poll_once()
+            except Exception as e:
+                logger.error(f"轮询任务表失败: {e}")
+                claimed = 0
+            if not claimed:
+                self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+# 内嵌在Web进程中的工作线程
+_embedded_worker = None
+_embedded_lock = threading.Lock()
+
+def start_embedded_worker(app):
+    """在当前进程中以后台线程方式启动工作进程（GENERATION_EMBEDDED_WORKER开启时）"""
+    global _embedded_worker
+    if not app.config.get('GENERATION_EMBEDDED_WORKER', True):
+        return None
+    with _embedded_lock:
+        if _embedded_worker is None:
+            _embedded_worker = GenerationWorker(app)
+            threading.Thread(target=_embedded_worker.run_forever, name='generation-embedded-worker', daemon=True).start()
+    return _embedded_worker
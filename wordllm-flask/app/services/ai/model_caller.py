@@ -4,8 +4,14 @@
 import os
 import logging
 import json
+import time
 import openai
 import re  # 用于正则表达式处理
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from app.services.ai.response_cache import get_response_cache, make_cache_key
+from app.services.ai.token_budget import get_token_budget
+from app.services.ai.prompt_prefix import get_prefix_tracker
 
 # 只在文件顶部初始化一次logger，统一名称为wordllm
 logger = logging.getLogger("wordllm")
@@ -16,6 +22,32 @@ if not logger.hasHandlers():
     logger.addHandler(handler)
     logger.setLevel(logging.INFO)
 
+# 强化系统提示词，确保返回JSON
+ENHANCED_SYSTEM_PROMPT = """你是一个专业的文档结构规划专家，擅长根据模板和输入需求生成合适的标书章节大纲。
+
+你的响应必须是一个有效的JSON对象，包含一个"chapters"数组，每个章节的格式需要遵循以下规则：
+1. 所有章节只包含"chapterNumber"和"title"两个字段
+2. 所有字段名和值必须用双引号包裹
+3. 章节编号使用字符串格式，如"1"，"2"，而不是数字格式
+4. 一级章节编号用数字，如"1"，"2"；二级章节编号用"父章节.序号"格式，如"1.1"，"1.2"等
+5. 严格确保JSON格式正确，所有括号和引号都要匹配
+
+不要在JSON外添加任何注释或解释。
+
+示例格式:
+{"chapters": [
+  {"chapterNumber": "1", "title": "项目概述"},
+  {"chapterNumber": "1.1", "title": "项目背景"},
+  {"chapterNumber": "2", "title": "技术方案"}
+]}
+"""
+
+# 模型调用参数，同时参与响应缓存键的计算
+DEFAULT_TEMPERATURE = 0.7
+
+# 回放缓存的流式响应时每个片段的字符数
+REPLAY_CHUNK_SIZE = 32
+
 class ModelCaller:
     """负责调用AI模型的工具类"""
     
@@ -23,7 +55,7 @@ class ModelCaller:
     _last_raw_response = None
     
     @staticmethod
-    def call_model_streaming(client, model, prompt, system_prompt=None):
+    def call_model_streaming(client, model, prompt, system_prompt=None, use_cache=True):
         """使用流式响应调用OpenAI模型生成文本
         
         Args:
@@ -31,94 +63,58 @@ class ModelCaller:
             model: 模型名称
             prompt: 用户提示词
             system_prompt: 系统提示词，默认为None
+            use_cache: 是否使用响应缓存，重新生成时传False强制调用模型
             
         Returns:
-            iterator: 生成器对象，用于流式返回内容
+            iterator: 生成器对象，用于流式返回内容（命中缓存时分段回放缓存内容）
         """
         logger.info(f"【DEBUG】即将流式请求大模型 {model}，prompt内容如下：\n{prompt}\n【END PROMPT】")
 
         if not system_prompt:
             system_prompt = "你是一个专业的文档结构规划专家，擅长根据模板和输入需求生成合适的标书章节大纲。请用JSON格式返回结果。"
-
-        # 强化系统提示词，确保返回JSON
-        enhanced_system_prompt = """你是一个专业的文档结构规划专家，擅长根据模板和输入需求生成合适的标书章节大纲。
-
-你的响应必须是一个有效的JSON对象，包含一个"chapters"数组，每个章节的格式需要遵循以下规则：
-1. 所有章节只包含"chapterNumber"和"title"两个字段
-2. 所有字段名和值必须用双引号包裹
-3. 章节编号使用字符串格式，如"1"，"2"，而不是数字格式
-4. 一级章节编号用数字，如"1"，"2"；二级章节编号用"父章节.序号"格式，如"1.1"，"1.2"等
-5. 严格确保JSON格式正确，所有括号和引号都要匹配
-
-不要在JSON外添加任何注释或解释。
-
-示例格式:
-{"chapters": [
-  {"chapterNumber": "1", "title": "项目概述"},
-  {"chapterNumber": "1.1", "title": "项目背景"},
-  {"chapterNumber": "2", "title": "技术方案"}
-]}
-"""
         
         # 打印将要发送的提示词摘要（日志中）
-        logger.info(f"系统提示词: {enhanced_system_prompt[:100]}...")
+        logger.info(f"系统提示词: {ENHANCED_SYSTEM_PROMPT[:100]}...")
         logger.info(f"用户提示词(前100字符): {prompt[:100]}...")
         
+        cache = get_response_cache()
+        # 输出token上限按模型配置，与提示词预算一致
+        max_tokens = get_token_budget().max_output(model)
+        cache_key = make_cache_key(model, ENHANCED_SYSTEM_PROMPT, prompt, DEFAULT_TEMPERATURE, max_tokens)
+        if use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"命中响应缓存，回放流式响应，长度: {len(cached)}字符")
+                return ModelCaller._replay_stream(model, cached)
+        else:
+            cache.record_bypass()
+        
         try:
-            # 检查并初始化 OpenAI 客户端对象
+            # 未传入客户端时使用进程内共享的客户端
             if client is None:
-                from openai import OpenAI
-                import json
-                import os
-                
-                # 使用项目根目录的绝对路径找到配置文件
-                # 当前脚本在 app/services/ai/model_caller.py
-                # 需要上码3级目录才能到项目根目录
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.abspath(os.path.join(current_dir, '..', '..', '..'))
-                config_path = os.path.join(root_dir, 'config.json')
-                
-                logger.info(f"尝试从 {config_path} 读取配置")
-                
-                # 读取配置文件
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                
-                client = OpenAI(
-                    api_key=config['openai']['OPENAI_API_KEY'],
-                    base_url=config['openai']['OPENAI_API_BASE']
-                )
-                
-                logger.info(f"OpenAI 客户端初始化成功，使用 API 基础 URL: {config['openai']['OPENAI_API_BASE']}")
-                
-                # 全局配置OpenAI，为了兼容性
-                import openai
-                openai.api_key = config['openai']['OPENAI_API_KEY']
-                openai.api_base = config['openai']['OPENAI_API_BASE']
+                from app.services.ai.client_registry import get_openai_client
+                client = get_openai_client()
             
             # 新版 OpenAI SDK (1.0.0+) 流式调用方式
             response = client.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": enhanced_system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=2000,
+                messages=get_prefix_tracker().messages(ENHANCED_SYSTEM_PROMPT, prompt),
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=max_tokens,
                 stream=True  # 启用流式响应
             )
             
             logger.info("流式模型调用已启动")
             
-            # 返回响应流
-            return response
+            # 返回响应流，完整读取后写入缓存
+            return ModelCaller._caching_stream(response, cache, cache_key)
         except Exception as e:
             logger.error(f"流式调用错误: {str(e)}")
             logger.exception(e)  # 输出完整堆栈跟踪
             raise
     
     @staticmethod
-    def call_model(client, model, prompt, system_prompt=None):
+    def call_model(client, model, prompt, system_prompt=None, use_cache=True):
         """调用OpenAI模型生成文本
         
         Args:
@@ -126,6 +122,7 @@ class ModelCaller:
             model: 模型名称
             prompt: 用户提示词
             system_prompt: 系统提示词，默认为None
+            use_cache: 是否使用响应缓存，重新生成时传False强制调用模型
             
         Returns:
             dict: 模型返回的结果
@@ -154,41 +151,108 @@ class ModelCaller:
         # 使用强化的系统提示词，确保返回JSON
         logger.info("使用强化系统提示词调用API")
         
-        # 强化系统提示词，确保返回JSON
-        enhanced_system_prompt = """你是一个专业的文档结构规划专家，擅长根据模板和输入需求生成合适的标书章节大纲。
-
-你的响应必须是一个有效的JSON对象，包含一个"chapters"数组，每个章节的格式需要遵循以下规则：
-1. 所有章节只包含"chapterNumber"和"title"两个字段
-2. 所有字段名和值必须用双引号包裹
-3. 章节编号使用字符串格式，如"1"，"2"，而不是数字格式
-4. 一级章节编号用数字，如"1"，"2"；二级章节编号用"父章节.序号"格式，如"1.1"，"1.2"等
-5. 严格确保JSON格式正确，所有括号和引号都要匹配
-
-不要在JSON外添加任何注释或解释。
-
-示例格式:
-{"chapters": [
-  {"chapterNumber": "1", "title": "项目概述"},
-  {"chapterNumber": "1.1", "title": "项目背景"},
-  {"chapterNumber": "2", "title": "技术方案"}
-]}
-"""
         # 打印将要发送的提示词摘要（日志中）
-        logger.info(f"系统提示词: {enhanced_system_prompt[:100]}...")
+        logger.info(f"系统提示词: {ENHANCED_SYSTEM_PROMPT[:100]}...")
         logger.info(f"用户提示词(前100字符): {prompt[:100]}...")
         
+        # 相同的模型和提示词直接返回缓存的响应
+        cache = get_response_cache()
+        # 输出token上限按模型配置，与提示词预算一致
+        max_tokens = get_token_budget().max_output(model)
+        cache_key = make_cache_key(model, ENHANCED_SYSTEM_PROMPT, prompt, DEFAULT_TEMPERATURE, max_tokens)
+        if use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"命中响应缓存，跳过模型调用，长度: {len(cached)}字符")
+                return ModelCaller.process_response(ModelCaller.cached_completion(model, cached))
+        else:
+            cache.record_bypass()
+        
+        # 未传入客户端时使用进程内共享的客户端
+        if client is None:
+            from app.services.ai.client_registry import get_openai_client
+            client = get_openai_client()
+        
         # 调用API
         response = client.chat.completions.create(
             model=model,
-            messages=[
-                {"role": "system", "content": enhanced_system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2000
+            # 带共用前缀的提示词按PROMPT_PREFIX_MODE拆分消息
+            messages=get_prefix_tracker().messages(ENHANCED_SYSTEM_PROMPT, prompt),
+            temperature=DEFAULT_TEMPERATURE,
+            max_tokens=max_tokens
         )
         logger.info("模型调用成功")
         
+        ModelCaller.store_response(cache, cache_key, response)
+        return ModelCaller.process_response(response)
+    
+    @staticmethod
+    def store_response(cache, cache_key, response):
+        """正常结束(finish_reason为stop)的响应写入缓存，被截断的响应不缓存"""
+        if not (hasattr(response, 'choices') and response.choices):
+            return
+        choice = response.choices[0]
+        if choice.finish_reason == 'stop' and choice.message.content:
+            cache.put(cache_key, choice.message.content)
+    
+    @staticmethod
+    def cached_completion(model, content):
+        """用缓存内容构造与模型返回格式一致的ChatCompletion对象"""
+        return ChatCompletion.model_validate({
+            'id': 'cached',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content}
+            }]
+        })
+    
+    @staticmethod
+    def cached_chunks(content, chunk_size=REPLAY_CHUNK_SIZE):
+        """把缓存内容切分为流式片段"""
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+    
+    @staticmethod
+    def _replay_stream(model, content):
+        """以ChatCompletionChunk的形式分段回放缓存内容，调用方无需区分是否命中缓存"""
+        created = int(time.time())
+        for piece in ModelCaller.cached_chunks(content):
+            yield ChatCompletionChunk.model_validate({
+                'id': 'cached',
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]
+            })
+    
+    @staticmethod
+    def _caching_stream(stream, cache, cache_key):
+        """透传模型的流式响应，流正常结束后把完整内容写入缓存"""
+        parts = []
+        finish_reason = None
+        for chunk in stream:
+            if chunk.choices:
+                if chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+            yield chunk
+        if finish_reason == 'stop':
+            cache.put(cache_key, ''.join(parts))
+    
+    @staticmethod
+    def process_response(response):
+        """清理模型响应内容，能解析为JSON时附加到message.json_content
+        
+        Args:
+            response: ChatCompletion响应对象
+            
+        Returns:
+            ChatCompletion: 处理后的响应对象
+        """
         # 打印响应详情以便调试
         logger.info(f"响应对象类型: {type(response)}")
         
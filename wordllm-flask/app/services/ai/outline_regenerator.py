@@ -64,11 +64,12 @@ class OutlineRegenerator:
             prompt = PromptHandler.build_outline_regenerate_prompt(
                 template_content,
                 input_content,
-                special_instructions
+                special_instructions,
+                model=model
             )
             
-            # 5. 使用ModelCaller调用模型
-            response = ModelCaller.call_model(client, model, prompt)
+            # 5. 使用ModelCaller调用模型，重新生成总是跳过响应缓存
+            response = ModelCaller.call_model(client, model, prompt, use_cache=False)
             
             # 6. 处理结果
             from app.services.ai.result_processor import ResultProcessor
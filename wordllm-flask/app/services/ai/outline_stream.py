@@ -0,0 +1,156 @@
+"""
+大纲流式解析模块
+
+模型以流的形式返回大纲JSON，OutlineStreamParser在文本增量到达时逐字符扫描，
+每当一个章节对象({"chapterNumber": ..., "title": ...})闭合就立即解析并返回，
+只保留当前未闭合的章节对象文本，不需要等待完整响应。
+"""
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_chapter(obj):
+    """把模型返回的章节对象整理为统一字段，不是章节对象时返回None"""
+    if not isinstance(obj, dict):
+        return None
+    chapter_number = obj.get('chapterNumber') or obj.get('chapter_number') or obj.get('id')
+    title = obj.get('title')
+    if not chapter_number and not title:
+        return None
+    return {
+        'chapterNumber': str(chapter_number) if chapter_number is not None else None,
+        'title': title or '未命名章节',
+        'content': obj.get('content', ''),
+        'parent_id': obj.get('parent_id') or obj.get('parentId')
+    }
+
+
+class OutlineStreamParser:
+    """增量式大纲解析器
+
+    使用方法:
+        parser = OutlineStreamParser()
+        for delta in text_stream:
+            for chapter in parser.feed(delta):
+                ...
+    """
+
+    def __init__(self):
+        self._in_string = False
+        self._escape = False
+        # 当前最内层未闭合对象的文本，None表示不在对象中
+        self._current = None
+        self.count = 0
+
+    def feed(self, text):
+        """输入一段文本增量
+
+        Args:
+            text: 模型返回的文本增量
+
+        Returns:
+            list: 本段文本中闭合的章节对象（已整理字段）
+        """
+        chapters = []
+        current = self._current
+        for ch in text:
+            if current is not None:
+                current.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                # 新对象开始，只跟踪最内层对象，外层的{"chapters": [...]}不缓存
+                current = ['{']
+            elif ch == '}' and current is not None:
+                chapter = self._parse(''.join(current))
+                if chapter:
+                    chapters.append(chapter)
+                current = None
+        self._current = current
+        self.count += len(chapters)
+        return chapters
+
+    @staticmethod
+    def _parse(text):
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError:
+            logger.warning(f"无法解析的大纲对象片段: {text[:100]}")
+            return None
+        return normalize_chapter(obj)
+
+
+class StreamTimings:
+    """记录最近若干次流式大纲生成的首章节耗时和总耗时"""
+
+    def __init__(self, max_samples=200):
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, time_to_first_chapter, total_time, chapters):
+        """记录一次生成
+
+        Args:
+            time_to_first_chapter: 从开始调用模型到第一个章节落库的秒数，没有章节时为None
+            total_time: 整个流式响应的秒数
+            chapters: 生成的章节数
+        """
+        with self._lock:
+            self._samples.append((time_to_first_chapter, total_time, chapters))
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return None
+        values = sorted(values)
+        index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+        return round(values[index] * 1000, 1)
+
+    def stats(self):
+        """返回首章节耗时和总耗时的分位数(毫秒)"""
+        with self._lock:
+            samples = list(self._samples)
+        first = [s[0] for s in samples if s[0] is not None]
+        total = [s[1] for s in samples]
+        return {
+            'samples': len(samples),
+            'time_to_first_chapter_ms': {
+                'p50': self._percentile(first, 50),
+                'p95': self._percentile(first, 95)
+            },
+            'total_ms': {
+                'p50': self._percentile(total, 50),
+                'p95': self._percentile(total, 95)
+            }
+        }
+
+
+outline_stream_timings = StreamTimings()
+
+
+class StreamClock:
+    """单次流式生成的计时器"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_chapter = None
+
+    def mark_chapter(self):
+        if self.first_chapter is None:
+            self.first_chapter = time.monotonic() - self.started
+
+    def elapsed(self):
+        return time.monotonic() - self.started
@@ -3,71 +3,78 @@
 """
 import logging
 
+from app.services.ai.token_budget import get_token_budget
+
 logger = logging.getLogger(__name__)
 
 class PromptHandler:
     """处理提示词构建的工具类"""
     
     @staticmethod
-    def build_outline_prompt(template_content, input_content, custom_outline_prompt=None):
+    def build_outline_prompt(template_content, input_content, custom_outline_prompt=None, model=None):
         """构建生成大纲的提示词，使用外部提示词模板
         
+        模板内容和输入文件内容超出模型的token预算时会被截取。
+        
         Args:
             template_content: 模板内容
             input_content: 输入文件内容
+            custom_outline_prompt: 自定义补充说明（可选）
+            model: 模型名称（可选），决定token预算
             
         Returns:
             str: 构建的提示词
         """
-        from app.prompts.outline_generation import (
-            OUTLINE_GENERATION_PROMPT, 
-            INPUT_CONTENT_SECTION,
-            NO_INPUT_CONTENT_SECTION
-        )
-        
-        # 构建主提示词结构
         from app.prompts.outline_generation import (
             OUTLINE_GENERATION_PROMPT,
             INPUT_CONTENT_SECTION,
             NO_INPUT_CONTENT_SECTION
         )
-        # 根据是否提供了输入文件决定使用哪个内容部分
-        if input_content:
-            input_section = INPUT_CONTENT_SECTION.format(input_content=input_content)
-        else:
-            input_section = NO_INPUT_CONTENT_SECTION
         
-        # 使用提示词模板并填充内容
-        prompt = OUTLINE_GENERATION_PROMPT.format(
-            template_content=template_content,
-            input_content_section=input_section
-        )
+        def render(sections):
+            # 根据是否提供了输入文件决定使用哪个内容部分
+            if input_content:
+                input_section = INPUT_CONTENT_SECTION.format(input_content=sections['input_content'])
+            else:
+                input_section = NO_INPUT_CONTENT_SECTION
+            
+            # 使用提示词模板并填充内容
+            prompt = OUTLINE_GENERATION_PROMPT.format(
+                template_content=sections['template_content'],
+                input_content_section=input_section
+            )
+            
+            # 如果有自定义outline_prompt，作为补充说明拼接到末尾
+            if custom_outline_prompt:
+                prompt = f"{prompt}\n\n补充说明：\n{custom_outline_prompt}"
+            return prompt
         
-        # 如果有自定义outline_prompt，作为补充说明拼接到末尾
         if custom_outline_prompt:
             logger.info(f"附加自定义outline_prompt到主提示词末尾")
-            prompt = f"{prompt}\n\n补充说明：\n{custom_outline_prompt}"
+        prompt = get_token_budget().fit('outline', render, {
+            'template_content': template_content or '',
+            'input_content': input_content or ''
+        }, model)
         
         # 日志打印完整prompt
         print("================================================================================")
         print("最终发送给模型的完整Prompt:")
         print(prompt)
         print("================================================================================")
-            
-
         
         logger.info(f"构建了大纲生成提示词，长度: {len(prompt)}字符")
         
         return prompt
         
     @staticmethod
-    def build_subchapter_prompt(template_content, existing_chapters, input_content):
+    def build_subchapter_prompt(template_content, existing_chapters, input_content, model=None):
         """构建生成子章节（第3级和第4级）的提示词
         
         Args:
             template_content: 模板内容
             existing_chapters: 现有章节JSON字符串
             input_content: 输入文件内容
+            model: 模型名称（可选），决定token预算
             
         Returns:
             str: 构建的提示词
@@ -78,31 +85,38 @@ class PromptHandler:
             NO_INPUT_CONTENT_SECTION
         )
         
-        # 根据是否提供了输入文件决定使用哪个内容部分
-        if input_content:
-            input_section = INPUT_CONTENT_SECTION.format(input_content=input_content)
-        else:
-            input_section = NO_INPUT_CONTENT_SECTION
+        def render(sections):
+            # 根据是否提供了输入文件决定使用哪个内容部分
+            if input_content:
+                input_section = INPUT_CONTENT_SECTION.format(input_content=sections['input_content'])
+            else:
+                input_section = NO_INPUT_CONTENT_SECTION
+            
+            # 使用提示词模板并填充内容，现有章节是生成的依据，不参与截取
+            return SUBCHAPTER_GENERATION_PROMPT.format(
+                template_content=sections['template_content'],
+                existing_chapters=existing_chapters,
+                input_content_section=input_section
+            )
         
-        # 使用提示词模板并填充内容
-        prompt = SUBCHAPTER_GENERATION_PROMPT.format(
-            template_content=template_content,
-            existing_chapters=existing_chapters,
-            input_content_section=input_section
-        )
+        prompt = get_token_budget().fit('subchapter', render, {
+            'template_content': template_content or '',
+            'input_content': input_content or ''
+        }, model)
         
         logger.info(f"构建了子章节生成提示词，长度: {len(prompt)}字符")
         
         return prompt
         
     @staticmethod
-    def build_outline_regenerate_prompt(template_content, input_content, special_instructions=""):
+    def build_outline_regenerate_prompt(template_content, input_content, special_instructions="", model=None):
         """构建重新生成大纲的提示词
         
         Args:
             template_content: 模板内容
             input_content: 输入文件内容
             special_instructions: 特殊指令和要求（可选）
+            model: 模型名称（可选），决定token预算
             
         Returns:
             str: 构建的提示词
@@ -113,58 +127,157 @@ class PromptHandler:
             NO_INPUT_CONTENT_SECTION
         )
         
-        # 根据是否提供了输入文件决定使用哪个内容部分
-        if input_content:
-            input_section = INPUT_CONTENT_SECTION.format(input_content=input_content)
-        else:
-            input_section = NO_INPUT_CONTENT_SECTION
+        def render(sections):
+            # 根据是否提供了输入文件决定使用哪个内容部分
+            if input_content:
+                input_section = INPUT_CONTENT_SECTION.format(input_content=sections['input_content'])
+            else:
+                input_section = NO_INPUT_CONTENT_SECTION
+            
+            # 使用提示词模板并填充内容
+            return OUTLINE_REGENERATION_PROMPT.format(
+                template_content=sections['template_content'],
+                input_content_section=input_section,
+                special_instructions=special_instructions
+            )
         
-        # 使用提示词模板并填充内容
-        prompt = OUTLINE_REGENERATION_PROMPT.format(
-            template_content=template_content,
-            input_content_section=input_section,
-            special_instructions=special_instructions
-        )
+        prompt = get_token_budget().fit('outline_regenerate', render, {
+            'template_content': template_content or '',
+            'input_content': input_content or ''
+        }, model)
         
         logger.info(f"构建了大纲重新生成提示词，长度: {len(prompt)}字符")
         
         return prompt
         
     @staticmethod
-    def build_document_content_prompt(chapter_number, chapter_title, outline_structure, template_content, input_content):
+    def _fit_document_prompt(label, outline_structure, template_content, input_content, model,
+                             input_excerpt_max_tokens, render_chapter):
+        """按预算构建章节内容提示词，共用前缀在前，render_chapter生成的章节后缀在后
+        
+        Args:
+            render_chapter: 接收输入片段部分(字符串)并返回章节后缀的函数
+            
+        Returns:
+            SplitPrompt: 构建的提示词
+        """
+        from app.prompts.document_generation import (
+            DOCUMENT_CONTENT_SHARED_PROMPT,
+            INPUT_CONTENT_SECTION,
+            INPUT_EXCERPT_SECTION,
+            INPUT_EXCERPT_NOTICE,
+            NO_INPUT_CONTENT_SECTION
+        )
+        
+        excerpt = bool(input_content) and input_excerpt_max_tokens > 0
+        shared = {
+            'template_content': template_content or '',
+            'outline_structure': outline_structure or ''
+        }
+        sections = {}
+        if excerpt:
+            sections['input_content'] = input_content
+        else:
+            shared['input_content'] = input_content or ''
+        
+        def render_prefix(parts):
+            # 根据是否提供了输入文件以及是否按章节检索决定使用哪个内容部分
+            if excerpt:
+                input_section = INPUT_EXCERPT_NOTICE
+            elif input_content:
+                input_section = INPUT_CONTENT_SECTION.format(input_content=parts['input_content'])
+            else:
+                input_section = NO_INPUT_CONTENT_SECTION
+            return DOCUMENT_CONTENT_SHARED_PROMPT.format(
+                template_content=parts['template_content'],
+                outline_structure=parts['outline_structure'],
+                input_content_section=input_section
+            )
+        
+        def render_suffix(parts):
+            return render_chapter(INPUT_EXCERPT_SECTION.format(input_content=parts['input_content']) if excerpt else '')
+        
+        # 前缀的预算只取决于常量，批量和逐章生成的提示词前缀相同
+        budget = get_token_budget()
+        suffix_reserve = budget.suffix_reserve_tokens + (input_excerpt_max_tokens if excerpt else 0)
+        return budget.fit_split(label, render_prefix, shared, render_suffix, sections, suffix_reserve, model)
+    
+    @staticmethod
+    def build_document_content_prompt(chapter_number, chapter_title, outline_structure, template_content, input_content,
+                                      model=None, input_excerpt_max_tokens=0):
         """构建生成文档章节内容的提示词
         
+        提示词分为各章节共用的前缀(写作要求、模板内容、大纲结构、输入文件全文)和章节后缀(输入文件相关片段、章节信息、输出格式)。
+        前缀在固定预算内截取，同一文档的各章节前缀逐字节相同，可以命中服务端的前缀缓存。
+        
         Args:
             chapter_number: 章节编号
             chapter_title: 章节标题
             outline_structure: 完整文档大纲结构（JSON字符串）
             template_content: 模板内容
             input_content: 输入文件内容
+            model: 模型名称（可选），决定token预算
+            input_excerpt_max_tokens: 输入内容是按章节检索的片段时为片段的token上限，片段放在后缀中；
+                为0时输入内容是各章节相同的全文，放在前缀中
             
         Returns:
-            str: 构建的提示词
+            SplitPrompt: 构建的提示词
         """
-        from app.prompts.document_generation import (
-            DOCUMENT_CONTENT_GENERATION_PROMPT,
-            INPUT_CONTENT_SECTION,
-            NO_INPUT_CONTENT_SECTION
+        from app.prompts.document_generation import DOCUMENT_CONTENT_CHAPTER_PROMPT
+        
+        def render_chapter(excerpt_section):
+            return DOCUMENT_CONTENT_CHAPTER_PROMPT.format(
+                input_excerpt_section=excerpt_section,
+                chapter_number=chapter_number,
+                chapter_title=chapter_title
+            )
+        
+        prompt = PromptHandler._fit_document_prompt(
+            'document_content', outline_structure, template_content, input_content,
+            model, input_excerpt_max_tokens, render_chapter
         )
         
-        # 根据是否提供了输入文件决定使用哪个内容部分
-        if input_content:
-            input_section = INPUT_CONTENT_SECTION.format(input_content=input_content)
-        else:
-            input_section = NO_INPUT_CONTENT_SECTION
-        
-        # 使用提示词模板并填充内容
-        prompt = DOCUMENT_CONTENT_GENERATION_PROMPT.format(
-            chapter_number=chapter_number,
-            chapter_title=chapter_title,
-            outline_structure=outline_structure,
-            template_content=template_content,
-            input_content_section=input_section
+        logger.info(f"构建了章节'{chapter_title}'内容生成提示词，长度: {len(prompt)}字符，共用前缀{len(prompt.prefix)}字符")
+        
+        return prompt
+    
+    @staticmethod
+    def build_document_batch_prompt(chapters, outline_structure, template_content, input_content, chapter_chars,
+                                    model=None, input_excerpt_max_tokens=0):
+        """构建一次生成多个章节内容的提示词，共用前缀与build_document_content_prompt相同
+        
+        Args:
+            chapters: 本批章节列表，包含chapterNumber和title字段
+            outline_structure: 完整文档大纲结构（JSON字符串）
+            template_content: 模板内容
+            input_content: 输入文件内容
+            chapter_chars: 每个章节要求的字数
+            model: 模型名称（可选），决定token预算
+            input_excerpt_max_tokens: 同build_document_content_prompt
+            
+        Returns:
+            SplitPrompt: 构建的提示词
+        """
+        from app.prompts.document_generation import DOCUMENT_BATCH_CHAPTER_PROMPT, BATCH_CHAPTER_LINE
+        
+        chapter_list = '\n'.join(
+            BATCH_CHAPTER_LINE.format(chapter_number=ch['chapterNumber'], chapter_title=ch['title'])
+            for ch in chapters
+        )
+        
+        def render_chapter(excerpt_section):
+            return DOCUMENT_BATCH_CHAPTER_PROMPT.format(
+                input_excerpt_section=excerpt_section,
+                chapter_list=chapter_list,
+                chapter_count=len(chapters),
+                chapter_chars=chapter_chars
+            )
+        
+        prompt = PromptHandler._fit_document_prompt(
+            'document_batch', outline_structure, template_content, input_content,
+            model, input_excerpt_max_tokens, render_chapter
         )
         
-        logger.info(f"构建了章节'{chapter_title}'内容生成提示词，长度: {len(prompt)}字符")
+        logger.info(f"构建了{len(chapters)}个章节的批量内容生成提示词，长度: {len(prompt)}字符")
         
         return prompt
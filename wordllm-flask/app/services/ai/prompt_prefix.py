@@ -0,0 +1,173 @@
+"""
+提示词前缀复用模块
+
+章节内容提示词由各章节共用的前缀和章节相关的后缀组成(见PromptHandler.build_document_content_prompt)。
+支持前缀缓存的服务端(vLLM的automatic prefix caching、OpenAI的prompt caching等)在前缀相同时
+跳过已计算的部分，缩短首token时间、降低费用。
+
+发送方式由PROMPT_PREFIX_MODE决定：
+- inline: 前缀和后缀拼接为一条用户消息(默认，适用于按token前缀自动缓存的服务端)
+- system: 前缀拼接到系统提示词之后，后缀作为用户消息
+- cache_control: 前缀和后缀作为用户消息的两个内容块，前缀块带cache_control标记，
+  适用于需要显式标记缓存位置的服务端
+同时按项目统计前缀复用率：前缀与该项目之前的请求相同时，其token计为复用。
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from app.utils.app_config import get_config
+
+logger = logging.getLogger(__name__)
+
+PREFIX_MODES = ('inline', 'system', 'cache_control')
+
+
+class SplitPrompt(str):
+    """由共用前缀和后缀组成的提示词，字符串值为两者拼接，可以当作普通提示词使用"""
+
+    def __new__(cls, prefix, suffix):
+        prompt = super().__new__(cls, prefix + suffix)
+        prompt.prefix = prefix
+        prompt.suffix = suffix
+        prompt.prefix_tokens = 0
+        prompt.tokens = 0
+        return prompt
+
+
+class PrefixTracker:
+    """构建带前缀的消息并按项目统计前缀复用率"""
+
+    def __init__(self, mode='inline', max_projects=256, max_prefixes=16):
+        """初始化
+
+        Args:
+            mode: 发送方式，inline、system或cache_control
+            max_projects: 最多保留统计的项目数，超出时淘汰最久未使用的项目
+            max_prefixes: 每个项目最多记住的不同前缀数
+        """
+        if mode not in PREFIX_MODES:
+            logger.warning(f"未知的PROMPT_PREFIX_MODE: {mode}，使用inline")
+            mode = 'inline'
+        self.mode = mode
+        self.max_projects = max_projects
+        self.max_prefixes = max_prefixes
+        self._lock = threading.Lock()
+        self._projects = OrderedDict()
+
+    def messages(self, system_prompt, prompt):
+        """构建chat.completions的messages
+
+        Args:
+            system_prompt: 系统提示词
+            prompt: 用户提示词，SplitPrompt时按发送方式拆分
+
+        Returns:
+            list: 消息列表
+        """
+        if not isinstance(prompt, SplitPrompt) or self.mode == 'inline':
+            return [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": str(prompt)}
+            ]
+        if self.mode == 'system':
+            return [
+                {"role": "system", "content": f"{system_prompt}\n\n{prompt.prefix}"},
+                {"role": "user", "content": prompt.suffix}
+            ]
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": [
+                {"type": "text", "text": prompt.prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": prompt.suffix}
+            ]}
+        ]
+
+    def record(self, project_key, prompt):
+        """记录一次请求的前缀
+
+        Args:
+            project_key: 项目标识
+            prompt: 构建的提示词，不是SplitPrompt时不计复用
+
+        Returns:
+            bool: 前缀是否与该项目之前的请求相同
+        """
+        prefix_tokens = getattr(prompt, 'prefix_tokens', 0)
+        tokens = getattr(prompt, 'tokens', 0)
+        digest = hashlib.sha256(prompt.prefix.encode('utf-8')).hexdigest() if isinstance(prompt, SplitPrompt) else None
+        with self._lock:
+            entry = self._projects.pop(project_key, None) or {
+                'prefixes': OrderedDict(),
+                'prompts': 0,
+                'prompt_tokens': 0,
+                'reused_tokens': 0
+            }
+            self._projects[project_key] = entry
+            while len(self._projects) > self.max_projects:
+                self._projects.popitem(last=False)
+            reused = digest is not None and digest in entry['prefixes']
+            if digest is not None:
+                entry['prefixes'][digest] = prefix_tokens
+                entry['prefixes'].move_to_end(digest)
+                while len(entry['prefixes']) > self.max_prefixes:
+                    entry['prefixes'].popitem(last=False)
+            entry['prompts'] += 1
+            entry['prompt_tokens'] += tokens
+            entry['reused_tokens'] += prefix_tokens if reused else 0
+        logger.info(f"项目{project_key}提示词前缀{prefix_tokens}/{tokens}个token, "
+                    f"{'与之前的请求相同' if reused else '首次出现'}")
+        return reused
+
+    @staticmethod
+    def _summary(entry):
+        return {
+            'prompts': entry['prompts'],
+            'prompt_tokens': entry['prompt_tokens'],
+            'reused_prefix_tokens': entry['reused_tokens'],
+            'distinct_prefixes': len(entry['prefixes']),
+            'reuse_ratio': round(entry['reused_tokens'] / entry['prompt_tokens'], 4) if entry['prompt_tokens'] else 0.0
+        }
+
+    def project_stats(self, project_key):
+        """返回项目的前缀复用统计，没有记录时返回None"""
+        with self._lock:
+            entry = self._projects.get(project_key)
+            return self._summary(entry) if entry else None
+
+    def stats(self):
+        """返回前缀复用统计，包括各项目的复用率"""
+        with self._lock:
+            projects = {str(key): self._summary(entry) for key, entry in self._projects.items()}
+        prompt_tokens = sum(p['prompt_tokens'] for p in projects.values())
+        reused = sum(p['reused_prefix_tokens'] for p in projects.values())
+        return {
+            'mode': self.mode,
+            'prompts': sum(p['prompts'] for p in projects.values()),
+            'prompt_tokens': prompt_tokens,
+            'reused_prefix_tokens': reused,
+            'reuse_ratio': round(reused / prompt_tokens, 4) if prompt_tokens else 0.0,
+            'projects': projects
+        }
+
+
+# 实例缓存
+_prefix_tracker_instance = None
+_instance_lock = threading.Lock()
+
+def get_prefix_tracker():
+    """获取前缀跟踪实例
+
+    异步调用在事件循环线程中执行，没有应用上下文，此时使用create_app记录的应用配置。
+    """
+    global _prefix_tracker_instance
+    if _prefix_tracker_instance is None:
+        with _instance_lock:
+            if _prefix_tracker_instance is None:
+                config = get_config()
+                _prefix_tracker_instance = PrefixTracker(
+                    mode=config.get('PROMPT_PREFIX_MODE', 'inline'),
+                    max_projects=config.get('PROMPT_PREFIX_MAX_PROJECTS', 256)
+                )
+    return _prefix_tracker_instance
@@ -0,0 +1,157 @@
+"""
+模型响应缓存模块
+
+以(模型, 系统提示词, 用户提示词, temperature, max_tokens)规范化后的哈希为键，
+在进程内缓存模型返回的完整文本。条目带过期时间，并按条目数和总字节数做LRU淘汰。
+相同模板、输入文件和提示词重复生成大纲时直接返回缓存结果，不再调用模型。
+"""
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from app.utils.app_config import get_config
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_text(text):
+    """统一换行符并去掉行尾空白，避免无意义的差异导致缓存未命中"""
+    if not text:
+        return ''
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def make_cache_key(model, system_prompt, prompt, temperature, max_tokens):
+    """计算模型调用的缓存键
+
+    Returns:
+        str: sha256十六进制摘要
+    """
+    payload = json.dumps({
+        'model': model,
+        'system': _normalize_text(system_prompt),
+        'prompt': _normalize_text(prompt),
+        'temperature': round(float(temperature), 4) if temperature is not None else None,
+        'max_tokens': max_tokens
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """带TTL和容量上限的模型响应LRU缓存"""
+
+    def __init__(self, ttl=3600, max_entries=256, max_bytes=32 * 1024 * 1024, enabled=True):
+        """初始化缓存
+
+        Args:
+            ttl: 条目有效期(秒)
+            max_entries: 最大条目数
+            max_bytes: 缓存内容的最大总字节数
+            enabled: 是否启用缓存，关闭时get总是未命中、put不生效
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        # key -> (过期时间, 内容, 字节数)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'bypasses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+    def _drop(self, key):
+        """删除条目（调用方需持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= entry[2]
+
+    def get(self, key):
+        """读取缓存内容，未命中或已过期时返回None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] < time.time():
+                self._drop(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def put(self, key, content):
+        """写入缓存，空内容或超过总容量的内容不缓存"""
+        if not self.enabled or not content:
+            return
+        size = len(content.encode('utf-8'))
+        if size > self.max_bytes:
+            logger.info(f"响应内容过大({size}字节)，不写入响应缓存")
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.time() + self.ttl, content, size)
+            self._bytes += size
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats['evictions'] += 1
+
+    def record_bypass(self):
+        """记录一次显式跳过缓存（重新生成）的调用"""
+        with self._lock:
+            self._stats['bypasses'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        total = stats['hits'] + stats['misses']
+        stats['enabled'] = self.enabled
+        stats['hit_rate'] = round(stats['hits'] / total, 4) if total else 0.0
+        return stats
+
+
+# 实例缓存
+_response_cache_instance = None
+_instance_lock = threading.Lock()
+
+def get_response_cache():
+    """获取响应缓存实例
+
+    异步调用在事件循环线程中执行，没有应用上下文，此时使用create_app记录的应用配置。
+    """
+    global _response_cache_instance
+    if _response_cache_instance is None:
+        with _instance_lock:
+            if _response_cache_instance is None:
+                config = get_config()
+                _response_cache_instance = ResponseCache(
+                    ttl=config.get('RESPONSE_CACHE_TTL', 3600),
+                    max_entries=config.get('RESPONSE_CACHE_MAX_ENTRIES', 256),
+                    max_bytes=config.get('RESPONSE_CACHE_MAX_BYTES', 32) * 1024 * 1024,
+                    enabled=config.get('RESPONSE_CACHE_ENABLED', True)
+                )
+    return _response_cache_instance
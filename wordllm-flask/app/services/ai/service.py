@@ -3,10 +3,10 @@ AI服务主模块
 """
 import json
 import logging
-import openai
 from flask import current_app
 
 from app.models.document import Document
+from app.services.ai.client_registry import get_openai_client
 from app.services.ai.content_extractor import ContentExtractor
 from app.services.ai.model_caller import ModelCaller
 from app.services.ai.prompt_handler import PromptHandler
@@ -24,11 +24,8 @@ class AIService:
             api_key = current_app.config.get('OPENAI_API_KEY')
             base_url = current_app.config.get('OPENAI_API_BASE')
             
-            # 初始化OpenAI客户端
-            self.client = openai.OpenAI(
-                api_key=api_key,
-                base_url=base_url
-            )
+            # 使用进程内共享的OpenAI客户端（带连接池）
+            self.client = get_openai_client(api_key, base_url)
             
             # 设置模型名称
             self.model = current_app.config.get('OPENAI_MODEL_NAME', "gpt-3.5-turbo")
@@ -39,12 +36,13 @@ class AIService:
             logger.error(f"初始化OpenAI客户端失败: {str(e)}")
             raise
     
-    def generate_document_outline(self, template_id, input_file_path=None, custom_outline_prompt=None):
+    def generate_document_outline(self, template_id, input_file_path=None, custom_outline_prompt=None, use_cache=True):
         """基于模板和输入文件生成文档大纲
         
         Args:
             template_id: 模板ID
             input_file_path: 输入文件路径 (可选)
+            use_cache: 是否使用响应缓存，重新生成时为False
             
         Returns:
             dict: 包含生成的章节大纲
@@ -64,7 +62,7 @@ class AIService:
                 input_content = ContentExtractor.extract_file_content(input_file_path)
             
             # 3. 使用PromptHandler构建提示词
-            prompt = PromptHandler.build_outline_prompt(template_content, input_content, custom_outline_prompt)
+            prompt = PromptHandler.build_outline_prompt(template_content, input_content, custom_outline_prompt, model=self.model)
             print(f"[测试-后端] 使用的提示词类型: {'自定义' if custom_outline_prompt else '默认'}")
             if custom_outline_prompt:
                 print(f"[测试-后端] 自定义提示词: {custom_outline_prompt}")
@@ -76,7 +74,7 @@ class AIService:
             print("================================================================================")
             
             # 4. 使用ModelCaller调用模型
-            response = ModelCaller.call_model(self.client, self.model, prompt)
+            response = ModelCaller.call_model(self.client, self.model, prompt, use_cache=use_cache)
             
             # 5. 使用ResultProcessor处理结果
             generated_outline = ResultProcessor.process_outline_result(response)
@@ -153,7 +151,7 @@ class AIService:
             existing_chapters_json = json.dumps(existing_chapters, ensure_ascii=False, indent=2)
             
             # 4. 使用PromptHandler构建提示词
-            prompt = PromptHandler.build_subchapter_prompt(template_content, existing_chapters_json, input_content)
+            prompt = PromptHandler.build_subchapter_prompt(template_content, existing_chapters_json, input_content, model=self.model)
             
             # 5. 使用ModelCaller调用模型
             response = ModelCaller.call_model(self.client, self.model, prompt)
@@ -0,0 +1,327 @@
+"""
+提示词token预算模块
+
+提示词由固定部分(指令、格式要求、章节信息)和可伸缩部分(模板内容、输入文件内容、大纲结构等)组成。
+构建提示词时先计算固定部分的token数，剩余预算在可伸缩部分之间按"注水"方式分配：
+不超过平均份额的部分保留原文，超出的部分平分剩下的预算并截取首尾、省略中间。
+每次构建都会记录各部分截取前后的token数和节省量。
+分为共用前缀和后缀的提示词(fit_split)先在固定预算内截取前缀，保证前缀不随后缀变化。
+"""
+import re
+import logging
+import threading
+
+from app.utils.app_config import get_config
+from app.utils.token_counter import count_tokens, tokenizer_name
+from app.services.ai.prompt_prefix import SplitPrompt
+
+logger = logging.getLogger(__name__)
+
+# 截取时保留在开头的比例，其余保留在结尾
+HEAD_RATIO = 0.7
+
+# 被省略的中间部分替换为该标记
+OMIT_MARKER = '……(此处省略约{tokens}个token)……'
+
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+# 最近一次构建的预算报告，按线程保存
+_local = threading.local()
+
+
+def _cut_line(line, budget, from_end):
+    """按字符截取单行，使其token数不超过budget"""
+    low, high = 0, len(line)
+    while low < high:
+        mid = (low + high + 1) // 2
+        piece = line[-mid:] if from_end else line[:mid]
+        if count_tokens(piece) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    if not low:
+        return ''
+    return line[-low:] if from_end else line[:low]
+
+
+def _take_lines(lines, budget, from_end=False):
+    """从开头(或结尾)按行取文本，token数不超过budget，超出的那一行按字符截取
+
+    Returns:
+        list: 取到的行，保持原顺序
+    """
+    taken = []
+    used = 0
+    for line in (reversed(lines) if from_end else lines):
+        tokens = count_tokens(line) + 1
+        if used + tokens > budget:
+            piece = _cut_line(line, budget - used - 1, from_end)
+            if piece:
+                taken.append(piece)
+            break
+        taken.append(line)
+        used += tokens
+    return list(reversed(taken)) if from_end else taken
+
+
+def trim_text(text, max_tokens):
+    """把文本压缩到max_tokens以内
+
+    先去掉行尾空白和多余空行；仍超出时保留开头和结尾，中间替换为省略标记。
+
+    Args:
+        text: 原文
+        max_tokens: token上限
+
+    Returns:
+        str: 截取后的文本
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    compact = _BLANK_LINES.sub('\n\n', '\n'.join(line.rstrip() for line in text.splitlines())).strip()
+    total = count_tokens(compact)
+    if total <= max_tokens:
+        return compact
+    body_budget = max_tokens - count_tokens(OMIT_MARKER.format(tokens=total)) - 2
+    if body_budget <= 0:
+        return ''
+    head_text = '\n'.join(_take_lines(compact.split('\n'), int(body_budget * HEAD_RATIO)))
+    # 开头截取的是原文的前缀，结尾从剩余部分(含被截断那一行的剩余内容)中选取
+    rest = compact[len(head_text):]
+    tail_text = '\n'.join(_take_lines(rest.split('\n'), body_budget - count_tokens(head_text), from_end=True))
+    omitted = max(0, total - count_tokens(head_text) - count_tokens(tail_text))
+    return '\n'.join(part for part in (head_text, OMIT_MARKER.format(tokens=omitted), tail_text) if part)
+
+
+def allocate(sizes, available):
+    """在各部分之间分配token预算
+
+    小于平均份额的部分按实际大小分配，其余部分平分剩余预算。
+
+    Args:
+        sizes: {部分名称: 原始token数}
+        available: 可分配的token数
+
+    Returns:
+        dict: {部分名称: 分配的token数}
+    """
+    allocation = {}
+    remaining = dict(sizes)
+    available = max(0, available)
+    while remaining:
+        share = available // len(remaining)
+        small = {name: size for name, size in remaining.items() if size <= share}
+        if not small:
+            for name in remaining:
+                allocation[name] = share
+            break
+        for name, size in small.items():
+            allocation[name] = size
+            available -= size
+            del remaining[name]
+    return allocation
+
+
+def last_report():
+    """返回当前线程最近一次构建提示词的预算报告，未构建过时返回None"""
+    return getattr(_local, 'report', None)
+
+
+class TokenBudget:
+    """按模型上下文窗口分配提示词token预算"""
+
+    def __init__(self, default_model=None, context_window=32768, model_windows=None,
+                 max_output_tokens=2000, reserve_tokens=512, max_prompt_tokens=0, suffix_reserve_tokens=512):
+        """初始化预算
+
+        Args:
+            default_model: 未指定模型时使用的模型名称
+            context_window: 默认上下文窗口大小(token)
+            model_windows: {模型名称: 上下文窗口大小}，覆盖默认值
+            max_output_tokens: 模型输出的最大token数(max_tokens参数)
+            reserve_tokens: 预留的余量，抵消token估算误差
+            max_prompt_tokens: 提示词token数上限，0表示只受上下文窗口限制
+            suffix_reserve_tokens: 分为前缀和后缀的提示词中为后缀固定部分预留的token数
+        """
+        self.default_model = default_model
+        self.context_window = context_window
+        self.model_windows = model_windows or {}
+        self.max_output_tokens = max_output_tokens
+        self.reserve_tokens = reserve_tokens
+        self.max_prompt_tokens = max_prompt_tokens
+        self.suffix_reserve_tokens = suffix_reserve_tokens
+        self._lock = threading.Lock()
+        self._stats = {
+            'prompts': 0,
+            'trimmed_prompts': 0,
+            'tokens_before': 0,
+            'tokens_after': 0
+        }
+
+    def window(self, model=None):
+        """模型的上下文窗口大小"""
+        return self.model_windows.get(model or self.default_model, self.context_window)
+
+    def max_output(self, model=None):
+        """模型调用使用的max_tokens，不超过上下文窗口的一半"""
+        return min(self.max_output_tokens, self.window(model) // 2)
+
+    def prompt_budget(self, model=None):
+        """提示词可使用的token数"""
+        budget = self.window(model) - self.max_output(model) - self.reserve_tokens
+        if self.max_prompt_tokens:
+            budget = min(budget, self.max_prompt_tokens)
+        return max(0, budget)
+
+    def _fit_sections(self, sections, available):
+        """把各部分截取到available个token以内
+
+        Returns:
+            tuple: (截取后的{部分名称: 文本}, 截取前token数, 截取后token数)
+        """
+        before = {name: count_tokens(text) for name, text in sections.items()}
+        fitted = dict(sections)
+        if sum(before.values()) > available:
+            allocation = allocate(before, available)
+            for name, text in sections.items():
+                if before[name] > allocation[name]:
+                    fitted[name] = trim_text(text, allocation[name])
+        after = {name: count_tokens(text) for name, text in fitted.items()}
+        return fitted, before, after
+
+    def _record(self, report, fixed, before, after):
+        """保存预算报告并累计统计"""
+        _local.report = report
+        with self._lock:
+            self._stats['prompts'] += 1
+            self._stats['trimmed_prompts'] += 1 if report['saved_tokens'] else 0
+            self._stats['tokens_before'] += fixed + sum(before.values())
+            self._stats['tokens_after'] += fixed + sum(after.values())
+        breakdown = ', '.join(f"{name} {before[name]}->{after[name]}" for name in before)
+        logger.info(
+            f"提示词token预算[{report['label']}]: 模型{report['model']}, 预算{report['budget']}, "
+            f"固定部分{fixed}, {breakdown}, 合计{report['prompt_tokens']}, 节省{report['saved_tokens']}"
+        )
+
+    def fit(self, label, render, sections, model=None):
+        """按预算构建提示词
+
+        Args:
+            label: 提示词类型，用于日志
+            render: 接收{部分名称: 文本}并返回完整提示词的函数
+            sections: {部分名称: 文本}，可被截取的部分
+            model: 模型名称，默认使用default_model
+
+        Returns:
+            str: 构建的提示词
+        """
+        model = model or self.default_model
+        budget = self.prompt_budget(model)
+        fixed = count_tokens(render({name: '' for name in sections}))
+        available = budget - fixed
+        fitted, before, after = self._fit_sections(sections, available)
+        if available <= 0:
+            logger.warning(f"提示词[{label}]固定部分{fixed}个token已超出预算{budget}")
+        prompt = render(fitted)
+
+        self._record({
+            'label': label,
+            'model': model,
+            'budget': budget,
+            'fixed_tokens': fixed,
+            'sections': {name: {'before': before[name], 'after': after[name]} for name in sections},
+            'prompt_tokens': count_tokens(prompt),
+            'max_output_tokens': self.max_output(model),
+            'saved_tokens': sum(before.values()) - sum(after.values())
+        }, fixed, before, after)
+        return prompt
+
+    def fit_split(self, label, render_prefix, shared, render_suffix, sections, suffix_reserve, model=None):
+        """按预算构建由共用前缀和后缀组成的提示词
+
+        前缀各部分的预算只取决于前缀本身和suffix_reserve，与后缀内容无关，
+        因此前缀相同的请求截取后的前缀也逐字节相同，可以命中服务端的前缀缓存。
+        后缀各部分使用前缀之外的剩余预算。
+
+        Args:
+            label: 提示词类型，用于日志
+            render_prefix: 接收{部分名称: 文本}并返回前缀的函数
+            shared: {部分名称: 文本}，前缀中可被截取的部分
+            render_suffix: 接收{部分名称: 文本}并返回后缀的函数
+            sections: {部分名称: 文本}，后缀中可被截取的部分
+            suffix_reserve: 为后缀预留的token数，应为常量
+            model: 模型名称，默认使用default_model
+
+        Returns:
+            SplitPrompt: 构建的提示词
+        """
+        model = model or self.default_model
+        budget = self.prompt_budget(model)
+        prefix_fixed = count_tokens(render_prefix({name: '' for name in shared}))
+        prefix_available = budget - suffix_reserve - prefix_fixed
+        fitted_shared, before_shared, after_shared = self._fit_sections(shared, prefix_available)
+        prefix = render_prefix(fitted_shared)
+        prefix_tokens = count_tokens(prefix)
+
+        suffix_fixed = count_tokens(render_suffix({name: '' for name in sections}))
+        suffix_available = budget - prefix_tokens - suffix_fixed
+        fitted, before_suffix, after_suffix = self._fit_sections(sections, suffix_available)
+        if prefix_available <= 0 or suffix_available < 0:
+            logger.warning(f"提示词[{label}]固定部分{prefix_fixed + suffix_fixed}个token已超出预算{budget}")
+        suffix = render_suffix(fitted)
+
+        prompt = SplitPrompt(prefix, suffix)
+        prompt.prefix_tokens = prefix_tokens
+        prompt.tokens = count_tokens(prompt)
+        before = dict(before_shared, **before_suffix)
+        after = dict(after_shared, **after_suffix)
+        fixed = prefix_fixed + suffix_fixed
+        self._record({
+            'label': label,
+            'model': model,
+            'budget': budget,
+            'fixed_tokens': fixed,
+            'sections': {name: {'before': before[name], 'after': after[name]} for name in before},
+            'prompt_tokens': prompt.tokens,
+            'prefix_tokens': prefix_tokens,
+            'max_output_tokens': self.max_output(model),
+            'saved_tokens': sum(before.values()) - sum(after.values())
+        }, fixed, before, after)
+        return prompt
+
+    def stats(self):
+        """返回预算统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['tokens_saved'] = stats['tokens_before'] - stats['tokens_after']
+        stats['tokenizer'] = tokenizer_name()
+        stats['context_window'] = self.window()
+        stats['max_output_tokens'] = self.max_output()
+        stats['prompt_budget'] = self.prompt_budget()
+        return stats
+
+
+# 实例缓存
+_token_budget_instance = None
+_instance_lock = threading.Lock()
+
+def get_token_budget():
+    """获取token预算实例
+
+    异步调用在事件循环线程中执行，没有应用上下文，此时使用create_app记录的应用配置。
+    """
+    global _token_budget_instance
+    if _token_budget_instance is None:
+        with _instance_lock:
+            if _token_budget_instance is None:
+                config = get_config()
+                _token_budget_instance = TokenBudget(
+                    default_model=config.get('OPENAI_MODEL_NAME'),
+                    context_window=config.get('MODEL_CONTEXT_WINDOW', 32768),
+                    model_windows=config.get('MODEL_CONTEXT_WINDOWS', {}),
+                    max_output_tokens=config.get('MODEL_MAX_OUTPUT_TOKENS', 2000),
+                    reserve_tokens=config.get('PROMPT_RESERVE_TOKENS', 512),
+                    max_prompt_tokens=config.get('PROMPT_MAX_TOKENS', 16000),
+                    suffix_reserve_tokens=config.get('PROMPT_SUFFIX_RESERVE_TOKENS', 512)
+                )
+    return _token_budget_instance
@@ -0,0 +1,217 @@
+"""
+章节批量写入服务模块
+
+保存大纲时一次性读取项目已有章节，按chapter_number与新大纲对比，
+再用批量语句执行插入、更新和删除，避免逐个章节查询和flush。
+"""
+import logging
+from collections import deque
+from datetime import datetime
+
+from app import db
+from app.models.project import Chapter
+from app.services.collaboration import notify_chapter_contents
+
+logger = logging.getLogger(__name__)
+
+# IN子句中每批的最大参数数，SQLite默认上限为999
+BATCH_SIZE = 500
+
+# 大纲同步时比较和更新的字段
+SYNC_FIELDS = ('title', 'content', 'parent_id', 'order_index')
+
+
+def _batches(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class ChapterStore:
+    """章节的批量读写操作"""
+
+    @staticmethod
+    def normalize(ch, order_index):
+        """把前端或模型返回的章节整理为chapters表的字段
+
+        Args:
+            ch: 章节字典，支持chapterNumber/chapter_number/id等写法
+            order_index: 未指定order_index时使用的排序值
+
+        Returns:
+            dict: 章节字段，未提供content时content为None
+        """
+        return {
+            'chapter_number': ch.get('chapter_number') or ch.get('chapterNumber') or ch.get('id'),
+            'title': ch.get('title') or '未命名章节',
+            'content': ch.get('content'),
+            'parent_id': ch.get('parent_id') or ch.get('parentId'),
+            'order_index': ch.get('order_index', order_index)
+        }
+
+    @staticmethod
+    def sync_chapters(project_id, chapters, scope=None, order_start=0, delete_missing=True, reset_content=False, commit=True):
+        """把项目的章节同步为给定的大纲
+
+        已存在的章节(按chapter_number匹配)只在字段有变化时更新，保留原有ID；
+        大纲中没有的章节被删除，新增章节批量插入。
+
+        Args:
+            project_id: 项目ID
+            chapters: 新大纲的章节列表
+            scope: 额外的过滤条件，只有满足条件的已有章节参与对比和删除（可选）
+            order_start: 未指定order_index时的起始排序值
+            delete_missing: 是否删除大纲中不存在的章节
+            reset_content: 章节未提供content时是否清空已有内容；为False时保留已有内容
+                （前端只加载目录时保存大纲不会覆盖正文）
+            commit: 是否立即提交
+
+        Returns:
+            dict: inserted/updated/deleted数量和按输入顺序排列的章节ID列表ids
+        """
+        query = db.session.query(
+            Chapter.id, Chapter.chapter_number, Chapter.title, Chapter.content,
+            Chapter.parent_id, Chapter.order_index
+        ).filter(Chapter.project_id == project_id)
+        if scope is not None:
+            query = query.filter(scope)
+        existing = {}
+        for row in query.order_by(Chapter.order_index, Chapter.id):
+            # 旧数据中可能存在重复编号，按顺序依次匹配
+            existing.setdefault(row.chapter_number, deque()).append(row)
+
+        now = datetime.utcnow()
+        ids = [None] * len(chapters)
+        inserts = []
+        updates = []
+        # 内容有变化的已有章节: {章节ID: 内容}
+        changed_contents = {}
+        # 输入中重复的章节编号只保留第一个，(project_id, chapter_number)有唯一索引
+        first_seen = {}
+        duplicates = []
+        for idx, ch in enumerate(chapters):
+            mapping = ChapterStore.normalize(ch, order_start + idx)
+            if mapping['chapter_number'] in first_seen:
+                duplicates.append((idx, first_seen[mapping['chapter_number']]))
+                continue
+            first_seen[mapping['chapter_number']] = idx
+            if mapping['content'] is None:
+                if reset_content:
+                    mapping['content'] = ''
+                else:
+                    del mapping['content']
+            rows = existing.get(mapping['chapter_number'])
+            if rows:
+                row = rows.popleft()
+                ids[idx] = row.id
+                if any(getattr(row, field) != mapping[field] for field in SYNC_FIELDS if field in mapping):
+                    update = dict(mapping, id=row.id, updated_at=now)
+                    if 'content' in mapping and row.content != mapping['content']:
+                        # 内容被大纲覆盖后需要重新生成
+                        update.update(status='pending', error_message=None)
+                        changed_contents[row.id] = mapping['content']
+                    updates.append(update)
+            else:
+                mapping.setdefault('content', '')
+                mapping['project_id'] = project_id
+                inserts.append((idx, mapping))
+
+        delete_ids = [row.id for rows in existing.values() for row in rows] if delete_missing else []
+        for batch in _batches(delete_ids):
+            # 先解除其它章节对被删除章节的parent_id引用
+            Chapter.query.filter(
+                Chapter.project_id == project_id,
+                Chapter.parent_id.in_(batch)
+            ).update({'parent_id': None}, synchronize_session=False)
+            Chapter.query.filter(Chapter.id.in_(batch)).delete(synchronize_session=False)
+        if updates:
+            db.session.bulk_update_mappings(Chapter, updates)
+        if inserts:
+            db.session.bulk_insert_mappings(Chapter, [mapping for _, mapping in inserts])
+            # executemany不返回主键，按章节编号查回新行的ID。(project_id, chapter_number)有唯一索引，
+            # 其它请求同时写入本项目的章节也不会对错
+            positions = {mapping['chapter_number']: idx for idx, mapping in inserts}
+            for batch in _batches(list(positions)):
+                rows = db.session.query(Chapter.id, Chapter.chapter_number).filter(
+                    Chapter.project_id == project_id,
+                    Chapter.chapter_number.in_(batch)
+                )
+                for row in rows:
+                    ids[positions[row.chapter_number]] = row.id
+        for idx, first_idx in duplicates:
+            ids[idx] = ids[first_idx]
+
+        if commit:
+            db.session.commit()
+            # 未提交时由协作会话写回前的内容比对发现变化
+            notify_chapter_contents(changed_contents)
+        logger.info(f"项目{project_id}章节同步完成: 新增{len(inserts)}, 更新{len(updates)}, 删除{len(delete_ids)}")
+        return {
+            'inserted': len(inserts),
+            'updated': len(updates),
+            'deleted': len(delete_ids),
+            'ids': ids
+        }
+
+    @staticmethod
+    def reorder_by_number(project_id, commit=True):
+        """按chapter_number重新编排项目所有章节的order_index，只更新有变化的章节"""
+        rows = db.session.query(Chapter.id, Chapter.order_index).filter(
+            Chapter.project_id == project_id
+        ).order_by(Chapter.chapter_number.asc()).all()
+        updates = [
+            {'id': row.id, 'order_index': idx}
+            for idx, row in enumerate(rows) if row.order_index != idx
+        ]
+        if updates:
+            db.session.bulk_update_mappings(Chapter, updates)
+        if commit:
+            db.session.commit()
+        return len(updates)
+
+    @staticmethod
+    def update_contents(project_id, contents, commit=True):
+        """批量写入章节内容
+
+        Args:
+            project_id: 项目ID
+            contents: {chapter_number: content}
+
+        Returns:
+            int: 更新的章节数
+        """
+        if not contents:
+            return 0
+        now = datetime.utcnow()
+        updates = []
+        numbers = list(contents.keys())
+        for batch in _batches(numbers):
+            rows = db.session.query(Chapter.id, Chapter.chapter_number).filter(
+                Chapter.project_id == project_id,
+                Chapter.chapter_number.in_(batch)
+            )
+            updates.extend(
+                {'id': row.id, 'content': contents[row.chapter_number], 'updated_at': now}
+                for row in rows
+            )
+        if updates:
+            db.session.bulk_update_mappings(Chapter, updates)
+        if commit:
+            db.session.commit()
+            notify_chapter_contents({update['id']: update['content'] for update in updates})
+        return len(updates)
+
+    @staticmethod
+    def to_dicts(project_id):
+        """按order_index读取项目的所有章节，返回接口使用的字典列表"""
+        chapters = Chapter.query.filter_by(project_id=project_id).order_by(Chapter.order_index).all()
+        return [
+            {
+                'id': ch.id,
+                'chapter_number': ch.chapter_number,
+                'title': ch.title,
+                'content': ch.content,
+                'parent_id': ch.parent_id,
+                'order_index': ch.order_index
+            }
+            for ch in chapters
+        ]
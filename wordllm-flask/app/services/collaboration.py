@@ -0,0 +1,334 @@
+"""
+章节协作编辑模块
+
+/ws/document命名空间的协作编辑使用由服务端排序的操作变换(OT)协议:
+客户端只发送编辑操作(格式见app/utils/text_ops.py)和它基于的修订版本号，
+服务端把操作与之后已排序的操作逐个变换后应用，并分配新的修订版本号。
+已排序的操作每隔COLLAB_BROADCAST_INTERVAL合并为一条chapter_ops消息，广播给房间内的所有客户端，
+发送者也会收到，并据clientOpId确认自己的操作。消息大小与编辑量成正比，与章节长度无关。
+
+会话文本在累计COLLAB_SNAPSHOT_OPS个操作或经过COLLAB_SNAPSHOT_INTERVAL秒后写回chapters表，
+最后一个编辑者离开时也会写回。内存中只保留最近COLLAB_HISTORY_OPS个操作，基于更早修订版本的操作需要客户端重新同步。
+其它途径(保存接口、章节生成)写入章节内容后调用notify_chapter_contents，新内容作为一个操作同步给编辑者；
+写回时只在数据库中的内容仍是会话上次加载或写入的内容时才覆盖，否则(例如单独运行的worker.py生成了新内容)
+以数据库内容重新同步会话，不会用旧文本覆盖新内容。
+会话状态保存在进程内，同一章节的编辑者需要连接到同一个Web进程。
+"""
+import json
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from flask import current_app
+
+from app import db, socketio
+from app.models.project import Chapter
+from app.utils import text_ops
+
+logger = logging.getLogger(__name__)
+
+# 协作编辑使用的命名空间
+DOCUMENT_NAMESPACE = '/ws/document'
+
+
+def collab_room(chapter_id):
+    """章节协作编辑的房间，客户端通过/ws/document的open事件加入"""
+    return f"chapter_{chapter_id}"
+
+
+class CollabSession:
+    """一个章节的协作编辑状态"""
+
+    def __init__(self, chapter_id, content, history_size=500):
+        self.chapter_id = chapter_id
+        self.text = content or ''
+        # 数据库中的章节内容(会话上次加载、写回或得知的值)，写回时据此判断是否被其它途径修改
+        self.saved_content = content
+        self.revision = 0
+        # 最近已排序的操作: (修订版本号, 操作)
+        self.history = deque(maxlen=history_size)
+        self.members = set()
+        # 等待合并广播的操作
+        self.pending = []
+        self.unsaved_ops = 0
+        self.saved_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def state(self):
+        with self.lock:
+            return {'chapterId': self.chapter_id, 'revision': self.revision, 'content': self.text}
+
+    def submit(self, revision, ops, meta):
+        """排序一个基于revision的操作
+
+        Args:
+            revision: 客户端生成操作时的修订版本号
+            ops: 操作
+            meta: 随操作广播的附加字段(clientId、clientOpId、userId、timestamp)
+
+        Returns:
+            int: 分配的修订版本号
+
+        Raises:
+            ValueError: 操作无效，或基于的修订版本已不在历史中，需要重新同步
+        """
+        ops = text_ops.normalize(ops)
+        with self.lock:
+            if not isinstance(revision, int) or revision < 0 or revision > self.revision:
+                raise ValueError(f'无效的修订版本号: {revision}')
+            oldest = self.history[0][0] - 1 if self.history else self.revision
+            if revision < oldest:
+                raise ValueError(f'修订版本{revision}已不在历史中，需要重新同步')
+            # 与客户端尚未看到的操作逐个变换，同一位置的插入以先到服务端的为后
+            for _, applied in islice(self.history, revision - oldest, None):
+                ops, _ = text_ops.transform(ops, applied)
+            self.text = text_ops.apply(self.text, ops)
+            self.revision += 1
+            self.history.append((self.revision, ops))
+            self.pending.append(dict(meta, revision=self.revision, ops=ops))
+            self.unsaved_ops += 1
+            return self.revision
+
+
+class CollaborationManager:
+    """管理各章节的协作会话，合并广播操作并定期把文本写回数据库"""
+
+    def __init__(self, app, broadcast_interval=0.05, history_size=500, snapshot_ops=200, snapshot_interval=10):
+        """初始化
+
+        Args:
+            app: Flask应用实例，写回数据库时使用其应用上下文
+            broadcast_interval: 合并广播的间隔(秒)
+            history_size: 每个会话保留的已排序操作数
+            snapshot_ops: 累计多少个操作后写回数据库
+            snapshot_interval: 有未保存的操作时写回数据库的最长间隔(秒)
+        """
+        self.app = app
+        self.broadcast_interval = broadcast_interval
+        self.history_size = history_size
+        self.snapshot_ops = snapshot_ops
+        self.snapshot_interval = snapshot_interval
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            'ops': 0,
+            'rejected_ops': 0,
+            'broadcasts': 0,
+            'broadcast_ops': 0,
+            'broadcast_bytes': 0,
+            'snapshots': 0,
+            'resyncs': 0
+        }
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='collab-broadcast', daemon=True)
+            self._thread.start()
+
+    def join(self, chapter_id, client_id):
+        """客户端打开章节，会话不存在时从数据库加载
+
+        Returns:
+            CollabSession: 章节的会话，章节不存在时返回None
+        """
+        with self._lock:
+            session = self._sessions.get(chapter_id)
+            if session is None:
+                chapter = Chapter.query.get(chapter_id)
+                if not chapter:
+                    return None
+                session = CollabSession(chapter_id, chapter.content, self.history_size)
+                self._sessions[chapter_id] = session
+                logger.info(f"已加载章节{chapter_id}的协作会话，长度{len(session.text)}字符")
+            session.members.add(client_id)
+            self._ensure_thread()
+        return session
+
+    def leave(self, chapter_id, client_id):
+        with self._lock:
+            session = self._sessions.get(chapter_id)
+            if session:
+                session.members.discard(client_id)
+
+    def leave_all(self, client_id):
+        """客户端断开时退出所有会话"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.members.discard(client_id)
+
+    def submit(self, chapter_id, client_id, revision, ops, client_op_id=None, user_id=None, timestamp=None):
+        """排序客户端提交的操作，返回分配的修订版本号
+
+        Raises:
+            ValueError: 客户端未打开该章节、操作无效或需要重新同步
+        """
+        with self._lock:
+            session = self._sessions.get(chapter_id)
+        if session is None or client_id not in session.members:
+            raise ValueError(f'未打开章节{chapter_id}')
+        try:
+            revision = session.submit(revision, ops, {
+                'clientId': client_id,
+                'clientOpId': client_op_id,
+                'userId': user_id,
+                'timestamp': timestamp
+            })
+        except ValueError:
+            with self._lock:
+                self._stats['rejected_ops'] += 1
+            raise
+        with self._lock:
+            self._stats['ops'] += 1
+        return revision
+
+    def replace(self, chapter_id, content):
+        """章节内容已被其它途径整体写入数据库时，作为一个操作排序，使编辑者与数据库一致"""
+        with self._lock:
+            session = self._sessions.get(chapter_id)
+        if session is None:
+            return
+        with session.lock:
+            revision = session.revision
+            ops = [-len(session.text), content or '']
+        session.submit(revision, ops, {'clientId': None, 'clientOpId': None, 'userId': 'system', 'timestamp': None})
+        with session.lock:
+            session.saved_content = content
+            if session.text == (content or ''):
+                # 没有并发的编辑，会话文本与数据库一致
+                session.unsaved_ops = 0
+                session.saved_at = time.monotonic()
+
+    def get(self, chapter_id):
+        with self._lock:
+            return self._sessions.get(chapter_id)
+
+    def _run(self):
+        while True:
+            time.sleep(self.broadcast_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"协作操作广播失败: {e}")
+
+    def flush(self):
+        """广播各会话等待中的操作，按需写回数据库并移除无人编辑的会话"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        now = time.monotonic()
+        for session in sessions:
+            with session.lock:
+                pending, session.pending = session.pending, []
+                unsaved = session.unsaved_ops
+                idle = not session.members
+            if pending:
+                self._broadcast(session.chapter_id, pending)
+            if unsaved and (idle or unsaved >= self.snapshot_ops or now - session.saved_at >= self.snapshot_interval):
+                self._persist(session)
+            if idle:
+                with self._lock, session.lock:
+                    if not session.members and not session.pending and not session.unsaved_ops:
+                        del self._sessions[session.chapter_id]
+                        logger.info(f"章节{session.chapter_id}已无人编辑，关闭协作会话")
+
+    def _broadcast(self, chapter_id, entries):
+        payload = {'chapterId': chapter_id, 'ops': entries}
+        socketio.emit('chapter_ops', payload, namespace=DOCUMENT_NAMESPACE, to=collab_room(chapter_id))
+        size = len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        with self._lock:
+            self._stats['broadcasts'] += 1
+            self._stats['broadcast_ops'] += len(entries)
+            self._stats['broadcast_bytes'] += size
+
+    def _persist(self, session):
+        """把会话文本写回chapters表
+
+        只在数据库中的内容仍是会话记录的saved_content时覆盖(比较并写入)，
+        内容已被其它进程修改时以数据库内容重新同步会话，章节已删除时丢弃未保存的操作。
+        """
+        with session.lock:
+            text = session.text
+            saved_ops = session.unsaved_ops
+            expected = session.saved_content
+        current = None
+        with self.app.app_context():
+            try:
+                query = Chapter.query.filter(Chapter.id == session.chapter_id)
+                if expected is None:
+                    query = query.filter(Chapter.content.is_(None))
+                else:
+                    query = query.filter(Chapter.content == expected)
+                written = query.update({'content': text, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+                if not written:
+                    current = Chapter.query.get(session.chapter_id)
+                    current = (current.content or '',) if current else None
+            finally:
+                db.session.remove()
+        if written:
+            with session.lock:
+                session.unsaved_ops -= saved_ops
+                session.saved_at = time.monotonic()
+                session.saved_content = text
+            with self._lock:
+                self._stats['snapshots'] += 1
+            logger.info(f"章节{session.chapter_id}协作内容已保存，修订版本{session.revision}")
+        elif current is None:
+            with session.lock:
+                session.unsaved_ops = 0
+            logger.warning(f"章节{session.chapter_id}已被删除，丢弃未保存的协作编辑")
+        else:
+            self.replace(session.chapter_id, current[0])
+            with self._lock:
+                self._stats['resyncs'] += 1
+            logger.warning(f"章节{session.chapter_id}的内容已被其它途径修改，协作会话以数据库内容重新同步")
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            stats = dict(self._stats)
+        stats['sessions'] = len(sessions)
+        stats['editors'] = sum(len(s.members) for s in sessions)
+        return stats
+
+
+# 实例缓存
+_collaboration_manager = None
+_manager_lock = threading.Lock()
+
+def get_collaboration():
+    """获取协作编辑管理器实例，确保在应用上下文中创建"""
+    global _collaboration_manager
+    if _collaboration_manager is None:
+        with _manager_lock:
+            if _collaboration_manager is None:
+                app = current_app._get_current_object()
+                _collaboration_manager = CollaborationManager(
+                    app,
+                    broadcast_interval=app.config.get('COLLAB_BROADCAST_INTERVAL', 0.05),
+                    history_size=app.config.get('COLLAB_HISTORY_OPS', 500),
+                    snapshot_ops=app.config.get('COLLAB_SNAPSHOT_OPS', 200),
+                    snapshot_interval=app.config.get('COLLAB_SNAPSHOT_INTERVAL', 10)
+                )
+    return _collaboration_manager
+
+
+def notify_chapter_contents(contents):
+    """章节内容被协作编辑以外的途径写入数据库并提交后调用
+
+    正在协作编辑的章节把新内容作为一个操作排序并广播给编辑者，之后写回时不会用旧文本覆盖。
+
+    Args:
+        contents: {章节ID: 内容}
+    """
+    # 本进程没有创建过管理器时不存在协作会话
+    manager = _collaboration_manager
+    if manager is None:
+        return
+    for chapter_id, content in contents.items():
+        try:
+            manager.replace(chapter_id, content)
+        except ValueError as e:
+            logger.warning(f"同步章节{chapter_id}的协作会话失败: {e}")
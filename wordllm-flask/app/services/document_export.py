@@ -6,12 +6,35 @@ import os
 import tempfile
 from docx import Document as DocxDocument
 from docx.shared import Cm, Pt, RGBColor
+from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn
 import logging
 
+from app.services.docx_writer import StreamingDocxWriter
+from app.services.pdf_converter import get_pdf_converter
+
 logger = logging.getLogger(__name__)
 
+# 中文字号到磅值的映射
+FONT_SIZE_MAPPING = {
+    '小三': 15,
+    '三号': 16,
+    '小四': 12,
+    '四号': 14,
+    '小五': 9,
+    '五号': 10.5
+}
+
+ALIGNMENT_MAPPING = {
+    '左对齐': WD_ALIGN_PARAGRAPH.LEFT,
+    '居中': WD_ALIGN_PARAGRAPH.CENTER,
+    '右对齐': WD_ALIGN_PARAGRAPH.RIGHT
+}
+
+# 导出正文使用的段落样式名称
+BODY_STYLE_NAME = 'Export Body'
+
 class DocumentExportService:
     """文档导出服务类，负责将文档内容转换为各种格式"""
     
@@ -36,17 +59,33 @@ class DocumentExportService:
             return f"{chapter_number} "
     
     @staticmethod
-    def export_as_docx(project, chapters, settings):
-        """
-        将项目章节导出为DOCX格式
+    def heading_level(chapter):
+        """根据章节编号中的点数确定标题级别，最多支持三级标题"""
+        return min(str(chapter.chapter_number).count('.') + 1, 3)
+    
+    @staticmethod
+    def _set_style_font(style, font_name, size, bold):
+        """设置样式字体，同时覆盖中文字体并去掉主题字体(主题字体优先级高于指定字体)"""
+        style.font.name = font_name
+        style.font.size = Pt(size)
+        style.font.bold = bold
+        rfonts = style.element.get_or_add_rPr().get_or_add_rFonts()
+        rfonts.set(qn('w:eastAsia'), font_name)
+        for attr in ('w:asciiTheme', 'w:hAnsiTheme', 'w:eastAsiaTheme', 'w:cstheme'):
+            rfonts.attrib.pop(qn(attr), None)
+    
+    @staticmethod
+    def build_base_document(settings):
+        """按格式设置创建只包含样式和页面设置的空文档
+        
+        标题和正文格式都预先定义为命名样式，段落只引用样式ID，
+        无需逐段设置字体、字号和对齐方式。
         
         Args:
-            project: 项目模型实例
-            chapters: 章节模型实例列表
             settings: 格式设置字典
         
         Returns:
-            str: 临时文件路径
+            tuple: (文档对象, {标题级别: 样式ID}, 正文样式ID)
         """
         doc = DocxDocument()
         
@@ -58,104 +97,82 @@ class DocumentExportService:
         section.left_margin = Cm(float(margins.get('left', 3.18)))
         section.right_margin = Cm(float(margins.get('right', 3.18)))
         
-        # 获取样式设置
-        section_number_style = settings.get('section_number_style', {})
-        title_styles = {
-            1: settings.get('level1_style', {}),
-            2: settings.get('level2_style', {}),
-            3: settings.get('level3_style', {})
-        }
-        text_style = settings.get('text_style', {})
-        
-        # 添加标题和内容
-        for chapter in chapters:
-            # 确定标题级别
-            level = 1
-            if '.' in str(chapter.chapter_number):
-                dot_count = str(chapter.chapter_number).count('.')
-                level = dot_count + 1
-                level = min(level, 3)  # 最多支持三级标题
-            
-            # 获取标题样式设置
-            title_style = title_styles.get(level, {})
-            
-            # 添加编号和标题
-            number_prefix = DocumentExportService.get_number_style(chapter, section_number_style)
-            heading = doc.add_heading(level=level)
-            heading_text = heading.add_run(f"{number_prefix}{chapter.title}")
-            
-            # 应用字体设置
+        # 标题样式
+        heading_style_ids = {}
+        for level in (1, 2, 3):
+            title_style = settings.get(f'level{level}_style', {})
             font_name = title_style.get('fontFamily', '仅宋体')
             if font_name == '仅宋体':
                 font_name = '宋体'  # python-docx使用的名称
-            heading_text.font.name = font_name
-            
-            # 应用字号设置
-            font_size_mapping = {
-                '小三': 15,
-                '三号': 16,
-                '小四': 12,
-                '四号': 14,
-                '小五': 9,
-                '五号': 10.5
-            }
-            font_size = title_style.get('fontSize', '四号')
-            heading_text.font.size = Pt(font_size_mapping.get(font_size, 14))
-            
-            # 应用加粗设置
-            if title_style.get('bold', True):
-                heading_text.font.bold = True
-            
-            # 应用对齐设置
-            alignment_mapping = {
-                '左对齐': WD_ALIGN_PARAGRAPH.LEFT,
-                '居中': WD_ALIGN_PARAGRAPH.CENTER,
-                '右对齐': WD_ALIGN_PARAGRAPH.RIGHT
-            }
-            alignment = title_style.get('alignment', '左对齐')
-            heading.alignment = alignment_mapping.get(alignment, WD_ALIGN_PARAGRAPH.LEFT)
-            
-            # 添加内容
-            if chapter.content:
-                paragraphs = chapter.content.split('\n\n')
-                for para_text in paragraphs:
-                    if para_text.strip():
-                        para = doc.add_paragraph()
-                        
-                        # 应用首行缩进
-                        first_line_indent = text_style.get('firstLineIndent', 2)
-                        para.paragraph_format.first_line_indent = Pt(first_line_indent * 10)
-                        
-                        # 应用对齐方式
-                        text_alignment = text_style.get('alignment', '左对齐')
-                        para.alignment = alignment_mapping.get(text_alignment, WD_ALIGN_PARAGRAPH.LEFT)
-                        
-                        # 添加文本
-                        run = para.add_run(para_text)
-                        
-                        # 强制设置正文为宋体
-                        run.font.name = '宋体'
-                        # 兼容中英文
-                        run._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
-                        
-                        # 应用字号
-                        text_font_size = text_style.get('fontSize', '小四')
-                        run.font.size = Pt(font_size_mapping.get(text_font_size, 12))
-                        
-                        # 应用加粗
-                        if text_style.get('bold', False):
-                            run.font.bold = True
-        
-        # 保存到临时文件
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
-        doc.save(temp_file.name)
-        temp_file.close()
+            style = doc.styles[f'Heading {level}']
+            DocumentExportService._set_style_font(
+                style, font_name,
+                FONT_SIZE_MAPPING.get(title_style.get('fontSize', '四号'), 14),
+                bool(title_style.get('bold', True))
+            )
+            style.paragraph_format.alignment = ALIGNMENT_MAPPING.get(
+                title_style.get('alignment', '左对齐'), WD_ALIGN_PARAGRAPH.LEFT
+            )
+            heading_style_ids[level] = style.style_id
         
-        logger.info(f"文档已导出为DOCX格式: {temp_file.name}")
-        return temp_file.name
+        # 正文样式，正文固定使用宋体
+        text_style = settings.get('text_style', {})
+        body_style = doc.styles.add_style(BODY_STYLE_NAME, WD_STYLE_TYPE.PARAGRAPH)
+        body_style.base_style = doc.styles['Normal']
+        DocumentExportService._set_style_font(
+            body_style, '宋体',
+            FONT_SIZE_MAPPING.get(text_style.get('fontSize', '小四'), 12),
+            bool(text_style.get('bold', False))
+        )
+        body_style.paragraph_format.first_line_indent = Pt(text_style.get('firstLineIndent', 2) * 10)
+        body_style.paragraph_format.alignment = ALIGNMENT_MAPPING.get(
+            text_style.get('alignment', '左对齐'), WD_ALIGN_PARAGRAPH.LEFT
+        )
+        return doc, heading_style_ids, body_style.style_id
+    
+    @staticmethod
+    def export_as_docx(project, chapters, settings, output_path=None):
+        """
+        将项目章节导出为DOCX格式
+        
+        章节逐个写入，chapters可以是查询的迭代器(如yield_per)，内存占用不随文档长度增长。
+        
+        Args:
+            project: 项目模型实例
+            chapters: 章节模型实例列表或可迭代对象
+            settings: 格式设置字典
+            output_path: 输出文件路径（可选，默认创建临时文件）
+        
+        Returns:
+            str: 输出文件路径
+        """
+        doc, heading_style_ids, body_style_id = DocumentExportService.build_base_document(settings)
+        section_number_style = settings.get('section_number_style', {})
+        
+        if output_path is None:
+            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
+            temp_file.close()
+            output_path = temp_file.name
+        with StreamingDocxWriter(output_path, doc) as writer:
+            for chapter in chapters:
+                # 添加编号和标题
+                number_prefix = DocumentExportService.get_number_style(chapter, section_number_style)
+                writer.add_paragraph(
+                    f"{number_prefix}{chapter.title}",
+                    heading_style_ids[DocumentExportService.heading_level(chapter)]
+                )
+                
+                # 添加内容
+                if chapter.content:
+                    for para_text in chapter.content.split('\n\n'):
+                        if para_text.strip():
+                            writer.add_paragraph(para_text, body_style_id)
+        
+        logger.info(f"文档已导出为DOCX格式: {output_path}, 段落数: {writer.paragraphs}")
+        return output_path
     
     @staticmethod
-    def export_as_txt(project, chapters, settings):
+    def export_as_txt(project, chapters, settings, output_path=None):
         """
         将项目章节导出为TXT格式
         
@@ -163,15 +180,19 @@ class DocumentExportService:
             project: 项目模型实例
             chapters: 章节模型实例列表
             settings: 格式设置字典
+            output_path: 输出文件路径（可选，默认创建临时文件）
         
         Returns:
-            str: 临时文件路径
+            str: 输出文件路径
         """
         # 获取章节编号样式
         section_number_style = settings.get('section_number_style', {})
         
         # 创建临时文件
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.txt', mode='w', encoding='utf-8')
+        if output_path is None:
+            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.txt', mode='w', encoding='utf-8')
+        else:
+            temp_file = open(output_path, 'w', encoding='utf-8')
         
         # 写入内容
         for chapter in chapters:
@@ -188,29 +209,58 @@ class DocumentExportService:
         return temp_file.name
     
     @staticmethod
-    def convert_to_pdf(docx_path):
+    def export(project, chapters, export_format, settings, output_path, pdf_source_path=None):
         """
-        将DOCX转换为PDF (这需要额外的依赖项如libreoffice或者其他PDF转换库)
-        此处为简化实现，实际项目中可能需要更复杂的转换逻辑
+        按格式导出项目章节
         
         Args:
-            docx_path: DOCX文件路径
+            project: 项目模型实例
+            chapters: 章节模型实例列表或可迭代对象
+            export_format: 'docx'、'pdf'或'txt'
+            settings: 格式设置字典
+            output_path: 输出文件路径
+            pdf_source_path: 导出PDF时中间DOCX文件的路径
         
         Returns:
-            str: PDF临时文件路径
+            str: 实际生成的文件路径
         """
-        # 注意：这里仅作为示例，实际项目中需要实现具体的转换逻辑
-        # 你可以使用如下方法：
-        # 1. 使用libreoffice命令行工具
-        # 2. 使用docx2pdf库
-        # 3. 使用python-docx-replace和ReportLab结合的方式
+        if export_format == 'docx':
+            return DocumentExportService.export_as_docx(project, chapters, settings, output_path)
+        if export_format == 'pdf':
+            # 先导出为DOCX，再由LibreOffice转换为PDF
+            docx_path = DocumentExportService.export_as_docx(project, chapters, settings, pdf_source_path)
+            return DocumentExportService.convert_to_pdf(docx_path, output_path)
+        if export_format == 'txt':
+            return DocumentExportService.export_as_txt(project, chapters, settings, output_path)
+        raise ValueError(f"不支持的导出格式: {export_format}")
+    
+    @staticmethod
+    def convert_to_pdf(docx_path, output_path=None):
+        """
+        使用LibreOffice转换池将DOCX转换为PDF，转换完成后删除中间DOCX文件
         
-        # 创建具有相同文件名但扩展名为.pdf的临时文件
-        pdf_path = docx_path.replace('.docx', '.pdf')
+        Args:
+            docx_path: DOCX文件路径
+            output_path: PDF输出路径（可选，默认创建临时文件）
         
-        # 这里应该有实际的转换代码
-        logger.warning("PDF转换功能尚未完全实现，需要额外依赖")
+        Returns:
+            str: PDF文件路径
         
-        # 由于没有实际转换，我们返回原始DOCX路径
-        # 在实际项目中，这里应该返回转换后的PDF路径
-        return docx_path
+        Raises:
+            PdfConversionError: 未安装LibreOffice或转换失败
+        """
+        if output_path is None:
+            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+            temp_file.close()
+            output_path = temp_file.name
+        try:
+            get_pdf_converter().convert(docx_path, output_path)
+        except Exception:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        finally:
+            if os.path.exists(docx_path):
+                os.remove(docx_path)
+        logger.info(f"文档已导出为PDF格式: {output_path}")
+        return output_path
@@ -0,0 +1,127 @@
+"""
+流式DOCX写入模块
+
+python-docx需要先在内存中构建完整的文档对象树再保存，文档越大占用内存越多。
+这里用python-docx生成只含样式和页面设置的空文档作为骨架，复制除正文外的所有部件，
+再把word/document.xml按段落直接写入zip流，内存占用与文档长度基本无关。
+"""
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+DOCUMENT_PART = 'word/document.xml'
+
+# XML 1.0不允许的控制字符(保留制表符和换行)
+_INVALID_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# 段落缓冲达到该大小时写入zip流
+FLUSH_SIZE = 64 * 1024
+
+# zip条目使用固定时间戳，相同内容生成的文件字节一致(PDF转换按文件哈希缓存)
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def _run_xml(text):
+    """把文本转换为w:r元素，换行转为w:br，制表符转为w:tab"""
+    text = _INVALID_XML_CHARS.sub('', text)
+    parts = []
+    for line_index, line in enumerate(text.split('\n')):
+        if line_index:
+            parts.append('<w:br/>')
+        for tab_index, segment in enumerate(line.split('\t')):
+            if tab_index:
+                parts.append('<w:tab/>')
+            if segment:
+                parts.append(f'<w:t xml:space="preserve">{escape(segment)}</w:t>')
+    return f"<w:r>{''.join(parts)}</w:r>"
+
+
+class StreamingDocxWriter:
+    """以段落为单位流式写出DOCX文件
+
+    用法:
+        with StreamingDocxWriter(path, base_doc) as writer:
+            writer.add_paragraph('标题', 'Heading1')
+    """
+
+    def __init__(self, path, base_doc):
+        """初始化写入器
+
+        Args:
+            path: 输出文件路径
+            base_doc: 已设置好样式和页面的python-docx文档对象，正文应为空
+        """
+        self.path = path
+        self.base_doc = base_doc
+        self.paragraphs = 0
+        self._zip = None
+        self._stream = None
+        self._buffer = []
+        self._buffered = 0
+        self._suffix = b''
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        """复制骨架文档中除正文外的部件，并写入正文开头"""
+        skeleton = io.BytesIO()
+        self.base_doc.save(skeleton)
+        skeleton.seek(0)
+        self._zip = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED)
+        with zipfile.ZipFile(skeleton) as source:
+            for item in source.infolist():
+                if item.filename == DOCUMENT_PART:
+                    document_xml = source.read(item)
+                else:
+                    self._zip.writestr(self._zip_info(item.filename), source.read(item))
+        # 正文段落插入到节属性(sectPr)之前
+        split_at = document_xml.rindex(b'<w:sectPr')
+        self._suffix = document_xml[split_at:]
+        self._stream = self._zip.open(self._zip_info(DOCUMENT_PART), 'w')
+        self._stream.write(document_xml[:split_at])
+
+    @staticmethod
+    def _zip_info(name):
+        info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        return info
+
+    def add_paragraph(self, text, style_id):
+        """追加一个段落
+
+        Args:
+            text: 段落文本
+            style_id: 段落样式ID(如Heading1)
+        """
+        xml = f'<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>{_run_xml(text)}</w:p>'
+        self._buffer.append(xml)
+        self._buffered += len(xml)
+        self.paragraphs += 1
+        if self._buffered >= FLUSH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._stream.write(''.join(self._buffer).encode('utf-8'))
+            self._buffer = []
+            self._buffered = 0
+
+    def close(self):
+        """写入正文结尾并关闭文件"""
+        if self._zip is None:
+            return
+        try:
+            if self._stream is not None:
+                self._flush()
+                self._stream.write(self._suffix)
+                self._stream.close()
+        finally:
+            self._zip.close()
+            self._zip = None
+            self._stream = None
@@ -0,0 +1,225 @@
+"""
+SSE事件流模块
+
+大纲、子章节和章节内容的生成在后台线程中执行，产生的事件写入按流ID保存的缓冲区，
+HTTP响应只是缓冲区的读取者，以text/event-stream格式输出。
+事件类型: token(模型输出的文本增量)、chapter(已保存的章节)、progress(进度)、done(结束)、error(失败)。
+每个事件带递增的ID，客户端断线后通过GET /api/streams/<流ID>并携带Last-Event-ID重连，
+从缓冲区补发之后的事件并继续接收，不会重新调用模型。
+没有新事件时定期发送心跳注释，防止代理关闭空闲连接。
+
+事件缓冲区保存在进程内存中: 部署多个Web进程(例如多个gunicorn worker)时，续传请求必须回到
+创建该流的进程，需要在负载均衡上开启会话保持(按客户端IP或cookie)，否则续传会返回404。
+"""
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from flask import Response, current_app
+
+logger = logging.getLogger(__name__)
+
+# 事件类型
+EVENT_TOKEN = 'token'
+EVENT_CHAPTER = 'chapter'
+EVENT_PROGRESS = 'progress'
+EVENT_DONE = 'done'
+EVENT_ERROR = 'error'
+
+# 收到后流即结束的事件
+TERMINAL_EVENTS = (EVENT_DONE, EVENT_ERROR)
+
+
+def format_event(event_id, event, data):
+    """按SSE格式编码一个事件"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class EventStream:
+    """一次生成的事件缓冲区"""
+
+    def __init__(self, kind, max_events=10000):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.finished = False
+        self.created_at = time.time()
+        self.finished_at = None
+        self._events = deque(maxlen=max_events)
+        self._last_id = 0
+        self._cond = threading.Condition()
+
+    def publish(self, event, data):
+        """追加事件，done或error事件之后流结束"""
+        with self._cond:
+            if self.finished:
+                return
+            self._last_id += 1
+            self._events.append((self._last_id, event, data))
+            if event in TERMINAL_EVENTS:
+                self.finished = True
+                self.finished_at = time.time()
+            self._cond.notify_all()
+
+    def events_after(self, last_id, timeout):
+        """返回ID大于last_id的事件，没有时最多等待timeout秒
+
+        Returns:
+            tuple: (事件列表, 流是否已结束)
+        """
+        with self._cond:
+            if self._last_id <= last_id and not self.finished:
+                self._cond.wait(timeout)
+            if not self._events:
+                return [], self.finished
+            first_id = self._events[0][0]
+            if last_id + 1 < first_id:
+                logger.warning(f"事件流{self.id}的事件{last_id + 1}-{first_id - 1}已不在缓冲区中")
+            start = max(0, last_id + 1 - first_id)
+            return list(islice(self._events, start, None)), self.finished
+
+    def status(self):
+        with self._cond:
+            return {
+                'stream_id': self.id,
+                'kind': self.kind,
+                'finished': self.finished,
+                'last_event_id': self._last_id,
+                'buffered_events': len(self._events)
+            }
+
+
+class EventStreamManager:
+    """在线程池中执行生成任务，保存事件缓冲区供读取和断点续传"""
+
+    def __init__(self, app, max_workers=8, retention=600, max_events=10000, heartbeat=15, retry_ms=3000):
+        """初始化
+
+        Args:
+            app: Flask应用实例，生成任务在其应用上下文中执行
+            max_workers: 同时执行的生成任务数
+            retention: 结束后的事件流保留时间(秒)
+            max_events: 每个事件流缓冲的最大事件数
+            heartbeat: 心跳注释间隔(秒)
+            retry_ms: 建议客户端的重连等待时间(毫秒)
+        """
+        self.app = app
+        self.retention = retention
+        self.max_events = max_events
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix='event-stream')
+
+    def start(self, kind, producer):
+        """在后台执行producer，把它产出的(事件类型, 数据)写入新的事件流
+
+        producer结束时没有产出done或error事件的，自动补发done；抛出异常时发送error。
+        producer的参数是publish(事件类型, 数据)，用于在其他线程(例如生成线程池)中直接发布事件。
+
+        Args:
+            kind: 流的类型(outline、subchapters、content)，用于日志
+            producer: 生成器函数，参数为publish
+
+        Returns:
+            EventStream: 新建的事件流
+        """
+        stream = EventStream(kind, self.max_events)
+        with self._lock:
+            self._prune()
+            self._streams[stream.id] = stream
+        self._executor.submit(self._run, stream, producer)
+        logger.info(f"已启动{kind}事件流: {stream.id}")
+        return stream
+
+    def get(self, stream_id):
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def _prune(self):
+        """移除超过保留时间的已结束事件流（调用方需持有锁）"""
+        cutoff = time.time() - self.retention
+        for stream_id in [s.id for s in self._streams.values() if s.finished_at and s.finished_at < cutoff]:
+            del self._streams[stream_id]
+
+    def _run(self, stream, producer):
+        with self.app.app_context():
+            started = time.perf_counter()
+            try:
+                for event, data in producer(stream.publish):
+                    stream.publish(event, data)
+                stream.publish(EVENT_DONE, {})
+            except Exception as e:
+                logger.exception(f"{stream.kind}事件流{stream.id}生成失败: {e}")
+                stream.publish(EVENT_ERROR, {'message': str(e)})
+            logger.info(f"{stream.kind}事件流{stream.id}结束, 耗时{time.perf_counter() - started:.2f}s")
+
+    def response(self, stream, last_event_id=0):
+        """以text/event-stream格式返回事件流，从last_event_id之后的事件开始
+
+        客户端断开不影响后台生成，之后可以凭Last-Event-ID重连。
+        """
+        def generate():
+            last_id = last_event_id
+            yield f"retry: {self.retry_ms}\n\n"
+            while True:
+                events, finished = stream.events_after(last_id, self.heartbeat)
+                if not events:
+                    if finished:
+                        return
+                    yield ": heartbeat\n\n"
+                    continue
+                for event_id, event, data in events:
+                    yield format_event(event_id, event, data)
+                    last_id = event_id
+                if events[-1][1] in TERMINAL_EVENTS:
+                    return
+
+        return Response(generate(), content_type='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'X-Stream-Id': stream.id
+        })
+
+    def stats(self):
+        with self._lock:
+            streams = list(self._streams.values())
+        return {
+            'streams': len(streams),
+            'running': sum(1 for s in streams if not s.finished)
+        }
+
+
+def last_event_id(request):
+    """从Last-Event-ID请求头或last_event_id查询参数取得客户端收到的最后一个事件ID"""
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+# 实例缓存
+_event_stream_manager = None
+_manager_lock = threading.Lock()
+
+def get_event_streams():
+    """获取事件流管理器实例，确保在应用上下文中创建"""
+    global _event_stream_manager
+    if _event_stream_manager is None:
+        with _manager_lock:
+            if _event_stream_manager is None:
+                app = current_app._get_current_object()
+                _event_stream_manager = EventStreamManager(
+                    app,
+                    max_workers=app.config.get('SSE_MAX_WORKERS', 8),
+                    retention=app.config.get('SSE_STREAM_RETENTION', 600),
+                    max_events=app.config.get('SSE_REPLAY_MAX_EVENTS', 10000),
+                    heartbeat=app.config.get('SSE_HEARTBEAT_INTERVAL', 15),
+                    retry_ms=app.config.get('SSE_RETRY_MS', 3000)
+                )
+    return _event_stream_manager
@@ -0,0 +1,215 @@
+"""
+导出文件缓存模块
+
+导出结果按(项目内容版本, 导出格式, 规范化后的格式设置, 导出范围)缓存在STORAGE_FOLDER下，
+内容未变化时重复下载直接返回已有文件。缓存总大小有上限，超出时按最近使用时间淘汰；
+同一项目内容变化后，旧版本的导出文件在写入新版本时一并删除。
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import re
+import uuid
+from flask import current_app
+
+from app import db
+from app.models.project import Chapter
+
+logger = logging.getLogger(__name__)
+
+# 导出逻辑变化时需要递增，使旧的缓存文件失效
+EXPORT_VERSION = 1
+
+# 临时目录中超过该时间(秒)的文件视为中断导出的残留
+STALE_TEMP_SECONDS = 3600
+
+# 缓存文件名: 项目ID_版本号_变体.扩展名
+CACHE_NAME_PATTERN = re.compile(r'^(\d+)_[0-9a-f]{24}_[0-9a-f]{24}\.[a-z]+$')
+
+
+def project_revision(project_id):
+    """计算项目章节内容的版本号
+
+    只读取章节的id、编号、标题、排序和更新时间，不读取正文；
+    章节增删、改标题、改内容(会更新updated_at)或调整顺序都会改变版本号。
+    单章节导出也使用整个项目的版本号，项目内容变化后同一项目的所有旧导出一并失效。
+
+    Args:
+        project_id: 项目ID
+
+    Returns:
+        str: 版本号
+    """
+    query = db.session.query(
+        Chapter.id, Chapter.chapter_number, Chapter.title, Chapter.order_index, Chapter.updated_at
+    ).filter(Chapter.project_id == project_id)
+    digest = hashlib.sha256()
+    for row in query.order_by(Chapter.order_index, Chapter.id):
+        digest.update(repr(tuple(row)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def settings_hash(settings):
+    """规范化格式设置(键排序)后计算哈希"""
+    normalized = json.dumps(settings or {}, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class ExportCache:
+    """有容量上限的导出文件磁盘缓存"""
+
+    def __init__(self, cache_dir, max_bytes, enabled=True):
+        """初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存文件总大小上限(字节)
+            enabled: 是否启用缓存
+        """
+        self.cache_dir = cache_dir
+        self.tmp_dir = os.path.join(cache_dir, 'tmp')
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'stale_removed': 0,
+            'temp_reclaimed': 0
+        }
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._reclaim_temp_files()
+
+    def _reclaim_temp_files(self):
+        """删除中断的导出留下的临时文件"""
+        cutoff = time.time() - STALE_TEMP_SECONDS
+        for entry in os.scandir(self.tmp_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    self._stats['temp_reclaimed'] += 1
+            except OSError:
+                pass
+
+    def _entries(self):
+        """列出缓存文件 [(路径, 大小, 最近使用时间)]"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file():
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    @staticmethod
+    def make_key(project_id, revision, export_format, settings, scope):
+        """生成缓存文件名(不含扩展名)，以项目ID和版本号开头便于清理旧版本"""
+        variant = hashlib.sha256(
+            f"{export_format}|{settings_hash(settings)}|{scope}|v{EXPORT_VERSION}".encode('utf-8')
+        ).hexdigest()
+        return f"{project_id}_{revision[:24]}_{variant[:24]}"
+
+    def temp_path(self, ext):
+        """返回一个新的临时文件路径，导出完成后通过put移入缓存"""
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}{ext}")
+
+    def path_for_name(self, project_id, name):
+        """按缓存文件名查找项目的导出文件，不存在或不属于该项目时返回None"""
+        match = CACHE_NAME_PATTERN.match(name)
+        if not match or int(match.group(1)) != project_id:
+            return None
+        path = os.path.join(self.cache_dir, name)
+        return path if os.path.exists(path) else None
+
+    def get(self, key, ext):
+        """查找缓存文件，命中时更新最近使用时间
+
+        Returns:
+            str: 文件路径，未命中时返回None
+        """
+        if not self.enabled:
+            return None
+        path = os.path.join(self.cache_dir, f"{key}{ext}")
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        with self._lock:
+            self._stats['hits'] += 1
+        return path
+
+    def put(self, key, ext, file_path):
+        """把导出完成的文件移入缓存，并清理同一项目的旧版本和超出容量的文件
+
+        Returns:
+            str: 缓存中的文件路径
+        """
+        path = os.path.join(self.cache_dir, f"{key}{ext}")
+        shutil.move(file_path, path)
+        project_prefix, revision = key.split('_')[:2]
+        with self._lock:
+            entries = self._entries()
+            # 同一项目其它版本的导出文件已过期
+            for entry_path, _, _ in list(entries):
+                parts = os.path.basename(entry_path).split('_')
+                if len(parts) >= 3 and parts[0] == project_prefix and parts[1] != revision:
+                    self._remove(entry_path)
+                    self._stats['stale_removed'] += 1
+                    entries = [e for e in entries if e[0] != entry_path]
+            total = sum(size for _, size, _ in entries)
+            for entry_path, size, _ in sorted(entries, key=lambda e: e[2]):
+                if total <= self.max_bytes:
+                    break
+                if entry_path == path:
+                    continue
+                self._remove(entry_path)
+                total -= size
+                self._stats['evictions'] += 1
+        return path
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"删除导出缓存文件失败: {path}, {e}")
+
+    def stats(self):
+        """返回缓存命中统计和当前占用"""
+        with self._lock:
+            stats = dict(self._stats)
+            entries = self._entries()
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / total, 4) if total else 0.0
+        stats['entries'] = len(entries)
+        stats['bytes'] = sum(size for _, size, _ in entries)
+        stats['max_bytes'] = self.max_bytes
+        stats['enabled'] = self.enabled
+        return stats
+
+
+# 实例缓存
+_export_cache_instance = None
+_instance_lock = threading.Lock()
+
+def get_export_cache():
+    """获取导出缓存实例，确保在应用上下文中创建"""
+    global _export_cache_instance
+    if _export_cache_instance is None:
+        with _instance_lock:
+            if _export_cache_instance is None:
+                config = current_app.config
+                _export_cache_instance = ExportCache(
+                    os.path.join(config['STORAGE_FOLDER'], 'export_cache'),
+                    max_bytes=config.get('EXPORT_CACHE_MAX_BYTES', 512) * 1024 * 1024,
+                    enabled=config.get('EXPORT_CACHE_ENABLED', True)
+                )
+    return _export_cache_instance
@@ -0,0 +1,182 @@
+"""
+异步导出任务模块
+
+大文档的导出在线程池中执行，请求立即返回任务ID。
+执行进度通过Socket.IO的/ws命名空间推送到主题 export:<任务ID>，
+完成的文件进入导出缓存，通过下载接口获取。
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+from app import socketio
+from app.models.project import Project, Chapter
+from app.services.document_export import DocumentExportService
+from app.services.export_cache import get_export_cache
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# 导出时每批读取的章节数
+CHAPTER_BATCH_SIZE = 100
+
+# 进度事件的最小推送间隔(秒)
+PROGRESS_INTERVAL = 0.5
+
+
+def export_topic(job_id):
+    """任务进度推送使用的主题，客户端通过/ws的subscribe事件订阅"""
+    return f"export:{job_id}"
+
+
+class ExportJob:
+    """一个导出任务的状态"""
+
+    def __init__(self, project_id, export_format, settings, chapter_scope, cache_key, ext, total):
+        self.id = uuid.uuid4().hex
+        self.project_id = project_id
+        self.format = export_format
+        self.settings = settings
+        self.chapter_scope = chapter_scope
+        self.cache_key = cache_key
+        self.ext = ext
+        self.total = total
+        self.processed = 0
+        self.status = STATUS_QUEUED
+        self.error = None
+        self.file_path = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'project_id': self.project_id,
+            'format': self.format,
+            'status': self.status,
+            'processed': self.processed,
+            'total': self.total,
+            'progress': round(self.processed / self.total, 4) if self.total else 0.0,
+            'error': self.error,
+            'topic': export_topic(self.id),
+            'status_url': f"/api/export-jobs/{self.id}",
+            'download_url': f"/api/export-jobs/{self.id}/download" if self.status == STATUS_DONE else None
+        }
+
+
+class ExportJobManager:
+    """在线程池中执行导出任务，并保留最近完成的任务供查询和下载"""
+
+    def __init__(self, app, max_workers=2, retention=3600):
+        """初始化任务管理器
+
+        Args:
+            app: Flask应用实例，任务在其应用上下文中执行
+            max_workers: 同时执行的导出任务数
+            retention: 完成的任务保留时间(秒)
+        """
+        self.app = app
+        self.retention = retention
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix='export-job')
+
+    def submit(self, project_id, export_format, settings, chapter_scope, cache_key, ext, total):
+        """提交导出任务
+
+        Returns:
+            ExportJob: 新建的任务
+        """
+        job = ExportJob(project_id, export_format, settings, chapter_scope, cache_key, ext, total)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        logger.info(f"已提交导出任务: {job.id}, 项目{project_id}, 格式{export_format}, 章节数{total}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        """移除超过保留时间的已完成任务（调用方需持有锁）
+
+        未启用导出缓存时，任务生成的文件不在缓存中，随任务一起删除。
+        """
+        cutoff = time.time() - self.retention
+        cache_enabled = get_export_cache().enabled
+        for job in [j for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job.id]
+            if job.file_path and not cache_enabled and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+
+    def _emit(self, job):
+        socketio.emit('export_progress', job.to_dict(), namespace='/ws', to=export_topic(job.id))
+
+    def _chapters(self, job, chapters):
+        """逐个返回章节并按间隔推送进度"""
+        last_emit = 0
+        for chapter in chapters:
+            yield chapter
+            job.processed += 1
+            now = time.monotonic()
+            if now - last_emit >= PROGRESS_INTERVAL:
+                last_emit = now
+                self._emit(job)
+
+    def _run(self, job):
+        with self.app.app_context():
+            cache = get_export_cache()
+            output_path = cache.temp_path(job.ext)
+            job.status = STATUS_RUNNING
+            self._emit(job)
+            started = time.perf_counter()
+            try:
+                project = Project.query.get(job.project_id)
+                query = Chapter.query.filter_by(project_id=job.project_id)
+                if job.chapter_scope is not None:
+                    query = query.filter_by(chapter_number=job.chapter_scope)
+                chapters = query.order_by(Chapter.order_index).yield_per(CHAPTER_BATCH_SIZE)
+                file_path = DocumentExportService.export(
+                    project, self._chapters(job, chapters), job.format, job.settings,
+                    output_path, cache.temp_path('.docx')
+                )
+                job.file_path = cache.put(job.cache_key, job.ext, file_path) if cache.enabled else file_path
+                job.status = STATUS_DONE
+                logger.info(f"导出任务完成: {job.id}, 耗时{time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                logger.exception(f"导出任务失败: {job.id}, {e}")
+                job.status = STATUS_FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._emit(job)
+
+
+# 实例缓存
+_export_job_manager = None
+_manager_lock = threading.Lock()
+
+def get_export_jobs():
+    """获取导出任务管理器实例，确保在应用上下文中创建"""
+    global _export_job_manager
+    if _export_job_manager is None:
+        with _manager_lock:
+            if _export_job_manager is None:
+                app = current_app._get_current_object()
+                _export_job_manager = ExportJobManager(
+                    app,
+                    max_workers=app.config.get('EXPORT_MAX_WORKERS', 2),
+                    retention=app.config.get('EXPORT_JOB_RETENTION', 3600)
+                )
+    return _export_job_manager
@@ -0,0 +1,160 @@
+"""
+章节生成进度推送模块
+
+生成工作进程(Web进程内嵌的线程或单独部署的worker.py)在章节状态变化时，
+通过Socket.IO向/ws/generate命名空间的房间 generation:<项目ID> 推送事件，
+客户端订阅后不需要再轮询章节列表接口:
+- chapter_status: 章节状态变化(generating、done、failed、pending)，done时附带章节内容
+- chapter_delta: 生成中章节正文的文本增量，按WS_DELTA_INTERVAL合并后推送
+
+配置了WS_MESSAGE_QUEUE(如redis://localhost:6379/0)时，所有进程的推送经消息队列转发，
+多个gunicorn worker和独立的worker.py进程推送的事件都能送达连接在任一Web进程上的客户端；
+未配置时只在本进程内推送。
+"""
+import re
+import json
+import time
+import logging
+
+from app import socketio
+from app.utils.app_config import get_config
+
+logger = logging.getLogger(__name__)
+
+# 章节生成进度使用的命名空间
+GENERATE_NAMESPACE = '/ws/generate'
+
+# 章节内容JSON中正文字段的开头
+_CONTENT_START = re.compile(r'"content"\s*:\s*"')
+
+
+def generation_topic(project_id):
+    """项目章节生成进度推送使用的房间，客户端通过/ws/generate的subscribe事件加入"""
+    return f"generation:{project_id}"
+
+
+class ContentDeltaExtractor:
+    """从流式返回的章节JSON中增量提取content字段的正文
+
+    章节内容提示词要求模型输出{"chapterNumber": ..., "title": ..., "content": "..."}，
+    直接推送原始增量会把JSON转义字符也发给客户端。这里跳过content之前的部分，
+    对字符串中的转义序列逐个解码，转义序列被分在两个增量中时保留到下一次。
+    """
+
+    def __init__(self):
+        self._pending = ''
+        self._started = False
+        self._finished = False
+
+    def feed(self, text):
+        """输入一段模型输出，返回其中新增的正文文本"""
+        if self._finished:
+            return ''
+        pending = self._pending + text
+        if not self._started:
+            match = _CONTENT_START.search(pending)
+            if not match:
+                # 保留末尾可能是"content"开头的部分
+                self._pending = pending[-32:]
+                return ''
+            self._started = True
+            pending = pending[match.end():]
+
+        out = []
+        i = 0
+        n = len(pending)
+        while i < n:
+            ch = pending[i]
+            if ch == '"':
+                self._finished = True
+                i = n
+                break
+            if ch != '\\':
+                out.append(ch)
+                i += 1
+                continue
+            # 转义序列，\uXXXX为代理对时需要连续两个
+            length = 2
+            if i + 1 < n and pending[i + 1] == 'u':
+                length = 6
+                if pending[i + 2:i + 4].lower() in ('d8', 'd9', 'da', 'db'):
+                    length = 12
+            if i + length > n:
+                break
+            sequence = pending[i:i + length]
+            try:
+                out.append(json.loads(f'"{sequence}"'))
+            except ValueError:
+                out.append(sequence)
+            i += length
+        self._pending = pending[i:]
+        return ''.join(out)
+
+
+class ChapterProgressPublisher:
+    """推送单个章节的状态变化和正文增量"""
+
+    def __init__(self, project_id, chapter_number, job_id=None, interval=None):
+        """初始化
+
+        Args:
+            project_id: 项目ID
+            chapter_number: 章节编号
+            job_id: 生成任务ID（可选）
+            interval: 正文增量合并推送的最小间隔(秒)，默认使用WS_DELTA_INTERVAL
+        """
+        config = get_config()
+        self.project_id = project_id
+        self.chapter_number = chapter_number
+        self.job_id = job_id
+        self.interval = config.get('WS_DELTA_INTERVAL', 0.2) if interval is None else interval
+        self.push_deltas = config.get('GENERATION_PUSH_DELTAS', True)
+        self._extractor = ContentDeltaExtractor()
+        self._buffer = []
+        self._offset = 0
+        self._last_emit = 0
+
+    def _emit(self, event, data):
+        data = dict(data, project_id=self.project_id, chapter_number=self.chapter_number, job_id=self.job_id)
+        try:
+            socketio.emit(event, data, namespace=GENERATE_NAMESPACE, to=generation_topic(self.project_id))
+        except Exception as e:
+            # 推送失败不影响生成结果，客户端仍可通过章节列表接口获取状态
+            logger.warning(f"推送项目{self.project_id}章节{self.chapter_number}的{event}事件失败: {e}")
+
+    def status(self, status, content=None, error_message=None):
+        """推送章节状态变化，之前缓冲的正文增量先推送"""
+        self.flush()
+        data = {'status': status}
+        if content is not None:
+            data['content'] = content
+        if error_message:
+            data['error_message'] = error_message
+        self._emit('chapter_status', data)
+
+    def delta(self, text):
+        """输入模型输出的文本增量，提取正文后按间隔合并推送"""
+        if not self.push_deltas:
+            return
+        content = self._extractor.feed(text)
+        if not content:
+            return
+        self._buffer.append(content)
+        now = time.monotonic()
+        if now - self._last_emit >= self.interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        """推送缓冲的正文增量，offset为该增量在正文中的起始位置，客户端据此发现丢失的增量"""
+        if not self._buffer:
+            return
+        text = ''.join(self._buffer)
+        self._buffer = []
+        self._emit('chapter_delta', {'text': text, 'offset': self._offset})
+        self._offset += len(text)
+        self._last_emit = now if now is not None else time.monotonic()
+
+
+def publish_chapter_status(project_id, chapter_number, status, error_message=None, job_id=None):
+    """推送不经过生成过程的章节状态变化（例如租约过期后重新排队）"""
+    ChapterProgressPublisher(project_id, chapter_number, job_id=job_id).status(status, error_message=error_message)
@@ -0,0 +1,228 @@
+"""
+项目输入文件服务
+
+输入文件上传后按内容哈希存放在UPLOAD_FOLDER/inputs/<哈希><扩展名>，并登记为项目的输入文件。
+同一项目重复上传相同内容时直接返回已登记的记录，不再保存和解析；
+之后的大纲和内容生成请求通过input_file_id引用，无需再次上传。
+提取的文本由提取缓存按内容哈希保存在STORAGE_FOLDER下，检索索引在登记时于后台建立。
+没有任何记录引用的文件(包括旧版本按请求保存的input_<uuid>文件)由垃圾回收删除。
+"""
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from flask import request, current_app
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models.input_file import InputFile
+from app.models.job import GenerationJob
+from app.services.ai.content_extractor import ContentExtractor
+from app.services.ai.extraction_cache import get_extraction_cache
+from app.services.ai.input_retrieval import get_retrieval_index_store
+from app.utils.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# 无扩展名时根据Content-Type推断
+CONTENT_TYPE_EXTENSIONS = {
+    'application/msword': '.docx',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
+    'text/plain': '.txt',
+    'application/pdf': '.pdf'
+}
+
+# 上次垃圾回收的时间
+_last_gc = 0.0
+_gc_lock = threading.Lock()
+
+
+def input_folder():
+    """输入文件的存放目录"""
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'inputs')
+    os.makedirs(os.path.join(folder, 'tmp'), exist_ok=True)
+    return folder
+
+
+class InputFileService:
+    """输入文件的登记、引用和清理"""
+
+    @staticmethod
+    def guess_extension(file_storage):
+        """取上传文件的扩展名，没有扩展名时根据Content-Type推断，默认.docx"""
+        file_ext = os.path.splitext(secure_filename(file_storage.filename or ''))[1].lower()
+        if file_ext:
+            return file_ext
+        file_ext = CONTENT_TYPE_EXTENSIONS.get(file_storage.content_type)
+        if not file_ext:
+            logger.warning(f"未知的content-type: {file_storage.content_type}，使用.docx作为默认扩展名")
+            file_ext = '.docx'
+        return file_ext
+
+    @staticmethod
+    def file_path(input_file):
+        """输入文件的完整路径"""
+        return os.path.join(input_folder(), input_file.stored_name)
+
+    @staticmethod
+    def register(file_storage, project_id=None):
+        """登记上传的输入文件，同一项目内相同内容的文件只保存和解析一次
+
+        Args:
+            file_storage: 上传的文件(werkzeug FileStorage)
+            project_id: 项目ID（可选）
+
+        Returns:
+            tuple: (InputFile, 是否新登记)
+        """
+        folder = input_folder()
+        tmp_path = os.path.join(folder, 'tmp', uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        # 边保存边计算哈希
+        with open(tmp_path, 'wb') as f:
+            for block in iter(lambda: file_storage.stream.read(1024 * 1024), b''):
+                digest.update(block)
+                f.write(block)
+                size += len(block)
+        content_hash = digest.hexdigest()
+
+        existing = InputFile.query.filter_by(project_id=project_id, content_hash=content_hash).first()
+        if existing:
+            os.remove(tmp_path)
+            existing.last_used_at = datetime.utcnow()
+            db.session.commit()
+            logger.info(f"输入文件已登记过，复用: {existing.id} ({file_storage.filename})")
+            return existing, False
+
+        stored_name = f"{content_hash}{InputFileService.guess_extension(file_storage)}"
+        path = os.path.join(folder, stored_name)
+        if os.path.exists(path):
+            # 其它项目已上传过相同内容
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+
+        text = ContentExtractor.extract_file_content(path)
+        input_file = InputFile(
+            project_id=project_id,
+            original_filename=file_storage.filename,
+            stored_name=stored_name,
+            content_hash=content_hash,
+            file_size=size,
+            text_length=len(text),
+            token_count=count_tokens(text)
+        )
+        db.session.add(input_file)
+        db.session.commit()
+        logger.info(f"已登记输入文件: {input_file.id} ({file_storage.filename}), {size}字节, 约{input_file.token_count}个token")
+
+        # 后台建立检索索引，生成章节内容时只取相关段落
+        if current_app.config.get('RETRIEVAL_ENABLED', True):
+            get_retrieval_index_store().submit(path)
+        InputFileService.maybe_collect_garbage()
+        return input_file, True
+
+    @staticmethod
+    def resolve_request_input(project_id=None):
+        """从当前请求中取得输入文件路径
+
+        请求可以通过input_file_id(表单或JSON)引用已登记的文件，也可以上传input_file，
+        上传的文件会先登记(按内容去重)。
+
+        Args:
+            project_id: 请求所属的项目ID（可选），引用的文件必须属于该项目
+
+        Returns:
+            str: 输入文件路径，请求未提供输入文件时返回None
+
+        Raises:
+            ValueError: input_file_id无效或不属于该项目
+        """
+        json_data = request.get_json(silent=True) if request.is_json else None
+        input_file_id = request.form.get('input_file_id') or (json_data or {}).get('input_file_id')
+        if input_file_id:
+            try:
+                input_file = InputFile.query.get(int(input_file_id))
+            except (TypeError, ValueError):
+                input_file = None
+            if not input_file or (project_id and input_file.project_id and str(input_file.project_id) != str(project_id)):
+                raise ValueError(f'输入文件不存在: {input_file_id}')
+            input_file.last_used_at = datetime.utcnow()
+            db.session.commit()
+            return InputFileService.file_path(input_file)
+
+        upload = request.files.get('input_file')
+        if upload and upload.filename:
+            input_file, _ = InputFileService.register(upload, int(project_id) if project_id else None)
+            return InputFileService.file_path(input_file)
+        return None
+
+    @staticmethod
+    def delete(input_file):
+        """删除输入文件记录，没有其它记录引用时一并删除文件
+
+        引用该记录的生成任务改为不使用输入文件，避免外键约束阻止删除。
+        """
+        stored_name = input_file.stored_name
+        GenerationJob.query.filter(GenerationJob.input_file_id == input_file.id).update(
+            {'input_file_id': None}, synchronize_session=False
+        )
+        db.session.delete(input_file)
+        db.session.commit()
+        if not InputFile.query.filter_by(stored_name=stored_name).first():
+            path = os.path.join(input_folder(), stored_name)
+            if os.path.exists(path):
+                get_extraction_cache().invalidate(path)
+                os.remove(path)
+                logger.info(f"已删除输入文件: {path}")
+
+    @staticmethod
+    def collect_garbage(grace_seconds=None):
+        """删除没有记录引用的输入文件和中断上传留下的临时文件
+
+        最近grace_seconds秒内修改过的文件不删除，避免删除正在登记的文件。
+
+        Returns:
+            dict: {'removed': 删除的文件数, 'bytes': 释放的字节数}
+        """
+        global _last_gc
+        if grace_seconds is None:
+            grace_seconds = current_app.config.get('INPUT_GC_GRACE_SECONDS', 3600)
+        folder = input_folder()
+        referenced = {name for (name,) in db.session.query(InputFile.stored_name).distinct()}
+        cutoff = time.time() - grace_seconds
+        removed, freed = 0, 0
+        for directory, is_tmp in ((folder, False), (os.path.join(folder, 'tmp'), True)):
+            for entry in os.scandir(directory):
+                if not entry.is_file() or (not is_tmp and entry.name in referenced):
+                    continue
+                try:
+                    stat = entry.stat()
+                    if stat.st_mtime >= cutoff:
+                        continue
+                    os.remove(entry.path)
+                    removed += 1
+                    freed += stat.st_size
+                except OSError as e:
+                    logger.warning(f"删除输入文件失败: {entry.path}, {e}")
+        _last_gc = time.time()
+        if removed:
+            logger.info(f"输入文件垃圾回收: 删除{removed}个文件, 释放{freed}字节")
+        return {'removed': removed, 'bytes': freed}
+
+    @staticmethod
+    def maybe_collect_garbage():
+        """距上次垃圾回收超过INPUT_GC_INTERVAL秒时执行一次"""
+        interval = current_app.config.get('INPUT_GC_INTERVAL', 3600)
+        if time.time() - _last_gc < interval or not _gc_lock.acquire(blocking=False):
+            return
+        try:
+            InputFileService.collect_garbage()
+        except Exception as e:
+            logger.warning(f"输入文件垃圾回收失败: {e}")
+        finally:
+            _gc_lock.release()
@@ -0,0 +1,232 @@
+"""
+DOCX转PDF模块
+
+使用无界面LibreOffice(soffice --convert-to pdf)转换。LibreOffice冷启动时要初始化用户配置目录，
+耗时数秒，因此维护固定数量的转换槽位，每个槽位使用自己持久化的配置目录(同一配置目录不能被
+多个soffice进程同时使用)，启动时预热一次；并发转换数不超过槽位数，排队和转换都有超时。
+转换结果按DOCX内容哈希缓存在STORAGE_FOLDER下。
+"""
+import os
+import queue
+import shutil
+import signal
+import logging
+import tempfile
+import threading
+import subprocess
+import time
+from flask import current_app
+
+from app.utils.file_hash import file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+class PdfConversionError(Exception):
+    """PDF转换失败"""
+
+
+class _ConverterSlot:
+    """一个转换槽位，持有独立的LibreOffice用户配置目录"""
+
+    def __init__(self, soffice_path, profile_dir):
+        self.soffice_path = soffice_path
+        self.profile_dir = profile_dir
+        self.conversions = 0
+        # 配置目录是否已初始化(预热或转换成功过)
+        self.warmed = False
+        os.makedirs(profile_dir, exist_ok=True)
+
+    def convert(self, docx_path, out_dir, timeout):
+        """执行一次转换，返回生成的PDF路径"""
+        command = [
+            self.soffice_path, '--headless', '--invisible', '--nologo', '--norestore', '--nodefault',
+            f"-env:UserInstallation=file://{os.path.abspath(self.profile_dir)}",
+            '--convert-to', 'pdf', '--outdir', out_dir, docx_path
+        ]
+        # 独立进程组，超时时连同soffice.bin子进程一起结束
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+        try:
+            _, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            raise PdfConversionError(f"PDF转换超时({timeout}秒)")
+        pdf_path = os.path.join(out_dir, os.path.splitext(os.path.basename(docx_path))[0] + '.pdf')
+        if process.returncode != 0 or not os.path.exists(pdf_path):
+            raise PdfConversionError(
+                f"PDF转换失败(退出码{process.returncode}): {stderr.decode('utf-8', 'replace').strip()[:500]}"
+            )
+        self.conversions += 1
+        self.warmed = True
+        return pdf_path
+
+
+class PdfConverter:
+    """带槽位池和结果缓存的PDF转换器"""
+
+    def __init__(self, soffice_path, work_dir, pool_size=2, timeout=120, queue_timeout=60, max_cached=200):
+        """初始化转换器
+
+        Args:
+            soffice_path: soffice可执行文件路径
+            work_dir: 工作目录，存放各槽位的配置目录和PDF缓存
+            pool_size: 槽位数，即最大并发转换数
+            timeout: 单次转换超时(秒)
+            queue_timeout: 等待空闲槽位的超时(秒)
+            max_cached: 缓存的PDF文件数上限
+        """
+        self.soffice_path = soffice_path
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.max_cached = max_cached
+        self.cache_dir = os.path.join(work_dir, 'cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.pool_size = max(1, int(pool_size))
+        self._slots = queue.Queue()
+        for i in range(self.pool_size):
+            self._slots.put(_ConverterSlot(soffice_path, os.path.join(work_dir, 'profiles', f'slot-{i}')))
+        self._lock = threading.Lock()
+        self._stats = {
+            'conversions': 0,
+            'cache_hits': 0,
+            'failures': 0,
+            'timeouts': 0,
+            'queue_timeouts': 0,
+            'total_seconds': 0.0
+        }
+
+    def _evict(self):
+        """缓存文件数超过上限时删除最早使用的文件"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                entries.append((entry.stat().st_mtime, entry.path))
+        for _, path in sorted(entries)[:max(0, len(entries) - self.max_cached)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def convert(self, docx_path, output_path):
+        """把DOCX转换为PDF并写入output_path
+
+        Args:
+            docx_path: DOCX文件路径
+            output_path: PDF输出路径
+
+        Returns:
+            str: output_path
+
+        Raises:
+            PdfConversionError: 未安装LibreOffice、排队超时、转换超时或转换失败
+        """
+        # 待转换的DOCX是导出时生成的临时文件，直接按内容计算哈希，不按路径记录
+        cached = os.path.join(self.cache_dir, f"{file_sha256(docx_path)}.pdf")
+        if os.path.exists(cached):
+            os.utime(cached)
+            shutil.copyfile(cached, output_path)
+            with self._lock:
+                self._stats['cache_hits'] += 1
+            return output_path
+
+        if not shutil.which(self.soffice_path):
+            raise PdfConversionError(f"未找到LibreOffice({self.soffice_path})，无法导出PDF")
+        try:
+            slot = self._slots.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats['queue_timeouts'] += 1
+            raise PdfConversionError('PDF转换繁忙，请稍后重试')
+        started = time.perf_counter()
+        out_dir = tempfile.mkdtemp(prefix='pdf-')
+        try:
+            pdf_path = slot.convert(docx_path, out_dir, self.timeout)
+            tmp_cached = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.move(pdf_path, tmp_cached)
+            os.replace(tmp_cached, cached)
+        except PdfConversionError as e:
+            with self._lock:
+                self._stats['failures'] += 1
+                if '超时' in str(e):
+                    self._stats['timeouts'] += 1
+            raise
+        finally:
+            self._slots.put(slot)
+            shutil.rmtree(out_dir, ignore_errors=True)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats['conversions'] += 1
+            self._stats['total_seconds'] += elapsed
+        logger.info(f"PDF转换完成: {docx_path}, 耗时{elapsed:.2f}s")
+        self._evict()
+        shutil.copyfile(cached, output_path)
+        return output_path
+
+    def warm_up(self):
+        """让每个槽位转换一个空文档，提前初始化配置目录
+
+        每次只从空闲槽位中取出一个，预热完立即放回队尾，真实转换不需要等待所有槽位预热结束；
+        已被真实转换初始化过的槽位直接跳过。
+        """
+        if not shutil.which(self.soffice_path):
+            logger.warning(f"未找到LibreOffice({self.soffice_path})，跳过PDF转换预热")
+            return
+        from docx import Document as DocxDocument
+        work_dir = tempfile.mkdtemp(prefix='pdf-warmup-')
+        try:
+            docx_path = os.path.join(work_dir, 'warmup.docx')
+            DocxDocument().save(docx_path)
+            for _ in range(self.pool_size):
+                slot = self._slots.get()
+                try:
+                    if slot.warmed:
+                        continue
+                    started = time.perf_counter()
+                    slot.convert(docx_path, work_dir, self.timeout)
+                    logger.info(f"PDF转换槽位已预热: {slot.profile_dir}, 耗时{time.perf_counter() - started:.2f}s")
+                finally:
+                    self._slots.put(slot)
+        except Exception as e:
+            logger.warning(f"PDF转换预热失败: {e}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def stats(self):
+        """返回转换统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['idle_slots'] = self._slots.qsize()
+        stats['avg_seconds'] = round(stats['total_seconds'] / stats['conversions'], 3) if stats['conversions'] else 0.0
+        stats['total_seconds'] = round(stats['total_seconds'], 3)
+        return stats
+
+
+# 实例缓存
+_pdf_converter_instance = None
+_instance_lock = threading.Lock()
+
+def get_pdf_converter():
+    """获取PDF转换器实例，确保在应用上下文中创建；首次创建时在后台预热"""
+    global _pdf_converter_instance
+    if _pdf_converter_instance is None:
+        with _instance_lock:
+            if _pdf_converter_instance is None:
+                config = current_app.config
+                _pdf_converter_instance = PdfConverter(
+                    config.get('PDF_SOFFICE_PATH', 'soffice'),
+                    os.path.join(config['STORAGE_FOLDER'], 'pdf'),
+                    pool_size=config.get('PDF_POOL_SIZE', 2),
+                    timeout=config.get('PDF_CONVERT_TIMEOUT', 120),
+                    queue_timeout=config.get('PDF_QUEUE_TIMEOUT', 60),
+                    max_cached=config.get('PDF_CACHE_MAX_ENTRIES', 200)
+                )
+                if config.get('PDF_WARM_UP', True):
+                    threading.Thread(target=_pdf_converter_instance.warm_up, name='pdf-warm-up', daemon=True).start()
+    return _pdf_converter_instance
+
+
+def get_pdf_converter_stats():
+    """返回PDF转换统计；转换器尚未创建时返回空统计，查看指标不会创建转换器和启动预热"""
+    converter = _pdf_converter_instance
+    return converter.stats() if converter is not None else {}
@@ -0,0 +1,298 @@
+"""
+模板预览HTML缓存模块
+
+DOCX转HTML(mammoth)需要完整解析文档，代价较高。
+渲染结果按文件内容哈希、样式映射和标题缓存在STORAGE_FOLDER下，
+同时作为强ETag返回给浏览器，重复打开预览时只需一次条件请求。
+
+文档中的图片按内容哈希单独保存而不是以base64内联，
+HTML中通过/api/templates/<id>/assets/<文件名>引用，可被浏览器长期缓存并并行加载。
+渲染时记录每个文件引用的图片，assets接口只返回该模板预览中的图片。
+"""
+import os
+import re
+import hashlib
+import logging
+import mimetypes
+import shutil
+import threading
+
+import mammoth
+from flask import current_app
+
+from app.services.ai.extraction_cache import get_extraction_cache
+
+logger = logging.getLogger(__name__)
+
+# 渲染逻辑或页面样式变化时需要递增，使旧的缓存条目和ETag失效
+PREVIEW_VERSION = 3
+
+# 自定义样式映射，更好地处理Word文档的样式
+STYLE_MAP = """
+    p[style-name='Title'] => h1:fresh
+    p[style-name='Heading 1'] => h1:fresh
+    p[style-name='Heading 2'] => h2:fresh
+    p[style-name='Heading 3'] => h3:fresh
+    p[style-name='Heading 4'] => h4:fresh
+    p[style-name='Heading 5'] => h5:fresh
+    p[style-name='Heading 6'] => h6:fresh
+    r[style-name='Strong'] => strong
+    r[style-name='Emphasis'] => em
+    p[style-name='Quote'] => blockquote
+    p[style-name='Normal'] => p
+"""
+
+# 图片资源文件名: 内容sha256 + 扩展名
+ASSET_NAME_PATTERN = re.compile(r'^[0-9a-f]{64}\.[0-9a-z]{1,8}$')
+
+PAGE_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>{title}</title>
+    <style>
+        body {{ font-family: 'Segoe UI', Arial, sans-serif; line-height: 1.6; color: #333; max-width: 800px; margin: 0 auto; padding: 20px; }}
+        h1, h2, h3, h4, h5, h6 {{ margin-top: 24px; margin-bottom: 16px; font-weight: 600; line-height: 1.25; }}
+        h1 {{ font-size: 2em; border-bottom: 1px solid #eaecef; padding-bottom: 0.3em; }}
+        h2 {{ font-size: 1.5em; border-bottom: 1px solid #eaecef; padding-bottom: 0.3em; }}
+        p {{ margin-top: 0; margin-bottom: 16px; }}
+        img {{ max-width: 100%; }}
+        table {{ border-collapse: collapse; margin: 15px 0; width: 100%; }}
+        table, th, td {{ border: 1px solid #ddd; padding: 8px; }}
+        th {{ background-color: #f8f8f8; }}
+    </style>
+</head>
+<body>
+    {body}
+</body>
+</html>
+"""
+
+
+def render_docx_html(file_path, title, save_image):
+    """使用mammoth把DOCX转换为带基本样式的完整HTML页面
+
+    Args:
+        file_path: DOCX文件路径
+        title: 页面标题
+        save_image: 保存图片的函数，参数为(二进制内容, content_type)，返回图片URL
+    """
+    def image_handler(image):
+        with image.open() as image_bytes:
+            return {"src": save_image(image_bytes.read(), image.content_type)}
+
+    with open(file_path, 'rb') as docx_file:
+        result = mammoth.convert_to_html(
+            docx_file,
+            style_map=STYLE_MAP,
+            convert_image=mammoth.images.img_element(image_handler)
+        )
+    if result.messages:
+        logger.warning(f"Conversion warnings: {result.messages}")
+    return PAGE_TEMPLATE.format(title=title, body=result.value)
+
+
+def template_asset_base(template_id):
+    """模板预览中图片URL的前缀"""
+    return f"/api/templates/{template_id}/assets/"
+
+
+class PreviewCache:
+    """以文件内容哈希为键的预览HTML磁盘缓存"""
+
+    def __init__(self, cache_dir):
+        """初始化缓存
+
+        Args:
+            cache_dir: 磁盘缓存目录
+        """
+        self.cache_dir = cache_dir
+        self.assets_dir = os.path.join(cache_dir, 'assets')
+        # 文件路径 -> 最近一次使用的内容哈希，失效时据此删除该文件的缓存目录
+        self._path_hashes = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'not_modified': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'bytes_rendered': 0,
+            'bytes_served': 0,
+            'assets_written': 0,
+            'asset_bytes_written': 0
+        }
+        os.makedirs(self.assets_dir, exist_ok=True)
+
+    def _file_hash(self, file_path):
+        """文件内容哈希，复用提取缓存按路径记录的结果，文件未变化时不重新计算"""
+        file_hash = get_extraction_cache().file_hash(file_path)
+        with self._lock:
+            self._path_hashes[file_path] = file_hash
+        return file_hash
+
+    def _file_dir(self, file_hash):
+        # 同一文件的所有变体放在一个目录下，失效时整体删除
+        return os.path.join(self.cache_dir, file_hash[:2], file_hash)
+
+    def _disk_path(self, file_hash, etag):
+        return os.path.join(self._file_dir(file_hash), f"{etag}.html")
+
+    def _manifest_path(self, file_hash):
+        # 该文件的预览引用的图片资源名，每行一个
+        return os.path.join(self._file_dir(file_hash), 'assets.txt')
+
+    def _read_manifest(self, file_hash):
+        try:
+            with open(self._manifest_path(file_hash), 'r', encoding='utf-8') as f:
+                return set(f.read().split())
+        except OSError:
+            return set()
+
+    def _record_assets(self, file_hash, names):
+        """把渲染时写出的图片资源名合并到该文件的资源清单"""
+        with self._lock:
+            known = self._read_manifest(file_hash)
+            if set(names) <= known:
+                return
+            path = self._manifest_path(file_hash)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(sorted(known | set(names))))
+            os.replace(tmp_path, path)
+
+    def has_asset(self, file_path, name):
+        """图片资源是否属于该文件的预览"""
+        return name in self._read_manifest(self._file_hash(file_path))
+
+    def etag(self, file_path, title, asset_base):
+        """计算预览的ETag，文件、样式映射、标题、图片URL前缀或版本变化时都会改变
+
+        文件哈希按(mtime, size)记忆，文件未变化时不读取文件内容。
+        """
+        return hashlib.sha256(
+            f"{self._file_hash(file_path)}\n{STYLE_MAP}\n{title}\n{asset_base}\nv{PREVIEW_VERSION}".encode('utf-8')
+        ).hexdigest()
+
+    def store_asset(self, data, content_type):
+        """按内容哈希保存图片，相同图片只写一次
+
+        Returns:
+            str: 资源文件名
+        """
+        extension = (mimetypes.guess_extension(content_type or '') or '.bin').lstrip('.')
+        name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        path = os.path.join(self.assets_dir, name[:2], name)
+        if os.path.exists(path):
+            return name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._stats['assets_written'] += 1
+            self._stats['asset_bytes_written'] += len(data)
+        return name
+
+    def asset_path(self, name):
+        """返回图片资源的磁盘路径，文件名不合法或不存在时返回None"""
+        if not ASSET_NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.assets_dir, name[:2], name)
+        return path if os.path.exists(path) else None
+
+    def record_not_modified(self):
+        """记录一次304响应"""
+        with self._lock:
+            self._stats['not_modified'] += 1
+
+    def get_or_render(self, file_path, title, asset_base):
+        """获取预览HTML，未命中时渲染并写入磁盘
+
+        Args:
+            file_path: DOCX文件路径
+            title: 页面标题
+            asset_base: 图片URL前缀，后接资源文件名
+
+        Returns:
+            tuple: (etag, html)
+        """
+        file_hash = self._file_hash(file_path)
+        etag = self.etag(file_path, title, asset_base)
+        disk_path = self._disk_path(file_hash, etag)
+        if os.path.exists(disk_path):
+            try:
+                with open(disk_path, 'r', encoding='utf-8') as f:
+                    html = f.read()
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                    self._stats['bytes_served'] += len(html)
+                return etag, html
+            except OSError as e:
+                logger.warning(f"读取预览缓存失败: {disk_path}, {e}")
+
+        names = []
+
+        def image_url(data, content_type):
+            name = self.store_asset(data, content_type)
+            names.append(name)
+            return asset_base + name
+
+        html = render_docx_html(file_path, title, image_url)
+        with self._lock:
+            self._stats['misses'] += 1
+            self._stats['bytes_rendered'] += len(html)
+            self._stats['bytes_served'] += len(html)
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            tmp_path = f"{disk_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(html)
+            os.replace(tmp_path, disk_path)
+            self._record_assets(file_hash, names)
+        except OSError as e:
+            logger.warning(f"写入预览缓存失败: {disk_path}, {e}")
+        return etag, html
+
+    def invalidate(self, file_path):
+        """删除某个文件的所有预览缓存（模板文件被替换或删除时调用）
+
+        图片资源按内容寻址，可能被其它模板共用，不随之删除。
+
+        Args:
+            file_path: 文件路径
+        """
+        with self._lock:
+            file_hash = self._path_hashes.pop(file_path, None)
+        if not file_hash:
+            return
+        file_dir = self._file_dir(file_hash)
+        shutil.rmtree(file_dir, ignore_errors=True)
+        with self._lock:
+            self._stats['invalidations'] += 1
+        logger.info(f"已使预览缓存失效: {file_path}")
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats['not_modified'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((total - stats['misses']) / total, 4) if total else 0.0
+        return stats
+
+
+# 实例缓存
+_preview_cache_instance = None
+_instance_lock = threading.Lock()
+
+def get_preview_cache():
+    """获取预览缓存实例，确保在应用上下文中创建"""
+    global _preview_cache_instance
+    if _preview_cache_instance is None:
+        with _instance_lock:
+            if _preview_cache_instance is None:
+                cache_dir = os.path.join(current_app.config['STORAGE_FOLDER'], 'preview_cache')
+                _preview_cache_instance = PreviewCache(cache_dir)
+    return _preview_cache_instance
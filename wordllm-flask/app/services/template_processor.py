@@ -0,0 +1,197 @@
+"""
+模板上传后的后台预处理模块
+
+上传接口只负责保存文件，随后在后台线程中依次完成：
+提取纯文本(写入提取缓存)、渲染预览HTML(写入预览缓存)、解析标题层级并估算各节token数，
+结果和处理状态保存在Document行上。首次生成大纲或打开预览时直接命中这些缓存。
+"""
+import os
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from html.parser import HTMLParser
+
+from flask import current_app
+
+from app import db
+from app.models.document import Document
+from app.services.ai.content_extractor import ContentExtractor
+from app.services.preview_cache import get_preview_cache, template_asset_base
+from app.utils.token_counter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 预处理状态
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+# 支持预览渲染和标题解析的文件类型
+HTML_FILE_TYPES = ('docx', 'doc')
+
+
+class _HeadingParser(HTMLParser):
+    """从预览HTML中收集h1-h6标题"""
+
+    def __init__(self):
+        super().__init__()
+        self.headings = []
+        self._level = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if len(tag) == 2 and tag[0] == 'h' and tag[1] in '123456':
+            self._level = int(tag[1])
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if self._level and tag == f'h{self._level}':
+            title = ''.join(self._text).strip()
+            if title:
+                self.headings.append({'level': self._level, 'title': title})
+            self._level = None
+
+    def handle_data(self, data):
+        if self._level:
+            self._text.append(data)
+
+
+def template_file_path(template):
+    """返回模板文件的磁盘路径，文件不存在时返回None"""
+    if not template.file_path:
+        return None
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    for file_path in (os.path.join(upload_folder, 'template', template.file_path),
+                      os.path.join(upload_folder, template.file_path)):
+        if os.path.exists(file_path):
+            return file_path
+    return None
+
+
+class TemplateProcessor:
+    """模板预处理"""
+
+    @staticmethod
+    def extract_headings(html, text):
+        """解析标题层级，并按标题把正文分节估算token数
+
+        Args:
+            html: 预览HTML
+            text: 提取的纯文本(段落之间以换行分隔)
+
+        Returns:
+            list: [{'level', 'title', 'tokens'}]，tokens为该标题到下一个标题之间内容的token数
+        """
+        parser = _HeadingParser()
+        parser.feed(html)
+        headings = [dict(h, tokens=0) for h in parser.headings]
+        # 纯文本中标题也是单独的段落，按顺序匹配
+        current = None
+        next_index = 0
+        for paragraph in text.split('\n'):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if next_index < len(headings) and paragraph == headings[next_index]['title']:
+                current = headings[next_index]
+                next_index += 1
+            if current is not None:
+                current['tokens'] += estimate_tokens(paragraph)
+        return headings
+
+    @staticmethod
+    def process(template_id):
+        """执行一个模板的预处理（需在应用上下文中调用）
+
+        Returns:
+            bool: 是否处理成功
+        """
+        template = Document.query.get(template_id)
+        if not template:
+            return False
+        file_path = template_file_path(template)
+        if not file_path:
+            template.processing_status = STATUS_FAILED
+            template.processing_error = '模板文件不存在'
+            db.session.commit()
+            return False
+
+        template.processing_status = STATUS_PROCESSING
+        template.processing_error = None
+        db.session.commit()
+        started = datetime.utcnow()
+        try:
+            text = ContentExtractor.extract_file_content(file_path)
+            headings = []
+            if (template.file_type or '').lower() in HTML_FILE_TYPES:
+                _, html = get_preview_cache().get_or_render(
+                    file_path, template.title, template_asset_base(template.id)
+                )
+                headings = TemplateProcessor.extract_headings(html, text)
+            template.heading_outline = json.dumps(headings, ensure_ascii=False)
+            template.text_length = len(text)
+            template.token_count = estimate_tokens(text)
+            template.processing_status = STATUS_READY
+            template.processed_at = datetime.utcnow()
+            db.session.commit()
+            logger.info(f"模板{template_id}预处理完成: {len(text)}字符, {len(headings)}个标题, "
+                        f"耗时{(template.processed_at - started).total_seconds():.2f}s")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"模板{template_id}预处理失败: {e}")
+            template = Document.query.get(template_id)
+            if template:
+                template.processing_status = STATUS_FAILED
+                template.processing_error = str(e)
+                db.session.commit()
+            return False
+
+    @staticmethod
+    def submit(template):
+        """把模板加入后台预处理队列
+
+        Args:
+            template: 已提交到数据库的模板对象
+
+        Returns:
+            Future: 处理结果，未启用预处理时返回None
+        """
+        app = current_app._get_current_object()
+        if not app.config.get('TEMPLATE_PREPROCESS_ENABLED', True):
+            return None
+        template.processing_status = STATUS_PENDING
+        db.session.commit()
+        return get_template_executor().submit(_process_in_context, app, template.id)
+
+    @staticmethod
+    def headings(template):
+        """返回模板已解析的标题层级，尚未处理时返回None"""
+        if not template.heading_outline:
+            return None
+        return json.loads(template.heading_outline)
+
+
+def _process_in_context(app, template_id):
+    with app.app_context():
+        return TemplateProcessor.process(template_id)
+
+
+# 执行器实例
+_template_executor = None
+_executor_lock = threading.Lock()
+
+def get_template_executor():
+    """获取预处理线程池，确保在应用上下文中创建"""
+    global _template_executor
+    if _template_executor is None:
+        with _executor_lock:
+            if _template_executor is None:
+                _template_executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('TEMPLATE_PREPROCESS_WORKERS', 2),
+                    thread_name_prefix='template-process'
+                )
+    return _template_executor
@@ -0,0 +1,26 @@
+"""
+应用配置读取
+
+事件循环线程、生成线程池等位置没有应用上下文，无法使用current_app.config。
+create_app创建应用时记录它的配置，这些位置读取到的是create_app实际使用的config_class，而不是默认的Config。
+"""
+from flask import current_app, has_app_context
+
+# create_app记录的应用配置
+_app_config = None
+
+
+def set_app_config(config):
+    """记录应用的配置，由create_app调用"""
+    global _app_config
+    _app_config = config
+
+
+def get_config():
+    """返回当前应用的配置；不在应用上下文中时返回create_app记录的配置，尚未创建应用时返回Config的配置项"""
+    if has_app_context():
+        return current_app.config
+    if _app_config is not None:
+        return _app_config
+    from config import Config
+    return {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
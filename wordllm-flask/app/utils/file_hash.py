@@ -0,0 +1,13 @@
+"""
+文件内容哈希
+"""
+import hashlib
+
+
+def file_sha256(file_path, block_size=1024 * 1024):
+    """分块读取文件计算sha256，返回十六进制摘要"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
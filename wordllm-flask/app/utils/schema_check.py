@@ -0,0 +1,67 @@
+"""
+启动时的数据库索引检查
+
+查询频繁的列缺少索引时不会报错，只会随着数据量增长越来越慢，
+因此在应用启动时对比实际表结构，缺失时输出警告提示执行flask db upgrade。
+"""
+from sqlalchemy import inspect
+
+# 表名 -> [(列元组, 是否要求唯一)]
+EXPECTED_INDEXES = {
+    'chapters': [
+        (('project_id', 'chapter_number'), True),
+        (('project_id', 'order_index'), False),
+        (('parent_id',), False),
+    ],
+    'projects': [
+        (('created_at',), False),
+    ],
+    'input_files': [
+        (('project_id', 'content_hash'), True),
+        (('stored_name',), False),
+    ],
+}
+
+
+def find_missing_indexes(engine):
+    """对比数据库中的实际索引，返回缺失的索引
+
+    索引按列组合匹配，不要求名称一致；唯一约束也视为唯一索引。
+    数据表尚不存在时跳过（由迁移负责创建）。
+
+    Returns:
+        list: [(表名, 列元组, 是否唯一)]
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table, expected in EXPECTED_INDEXES.items():
+        if table not in tables:
+            continue
+        existing = {}
+        for index in inspector.get_indexes(table):
+            columns = tuple(index['column_names'])
+            existing[columns] = existing.get(columns, False) or bool(index.get('unique'))
+        for constraint in inspector.get_unique_constraints(table):
+            existing[tuple(constraint['column_names'])] = True
+        for columns, unique in expected:
+            if columns not in existing or (unique and not existing[columns]):
+                missing.append((table, columns, unique))
+    return missing
+
+
+def check_indexes(app):
+    """应用启动时检查索引，缺失时输出警告（不阻止启动）"""
+    if not app.config.get('SCHEMA_INDEX_CHECK', True):
+        return []
+    from app import db
+    try:
+        with app.app_context():
+            missing = find_missing_indexes(db.engine)
+    except Exception as e:
+        app.logger.warning(f"检查数据库索引失败: {e}")
+        return []
+    for table, columns, unique in missing:
+        kind = '唯一索引' if unique else '索引'
+        app.logger.warning(f"数据表{table}缺少{kind}({', '.join(columns)})，查询性能会随数据量下降，请执行 flask db upgrade")
+    return missing
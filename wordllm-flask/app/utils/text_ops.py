@@ -0,0 +1,183 @@
+"""
+文本操作(OT)
+
+一个操作是覆盖整个文本的组件列表，从头到尾依次为:
+- 正整数n: 保留n个字符
+- 负整数-n: 删除n个字符
+- 字符串s: 插入s
+例如在长度为10的文本第3个字符后插入"abc"并删除最后2个字符: [3, "abc", 5, -2]。
+位置和长度按Unicode码位计算。操作的基础长度(保留+删除)必须等于被修改文本的长度。
+"""
+
+
+def _check(ops):
+    if not isinstance(ops, list):
+        raise ValueError('操作必须是列表')
+    for op in ops:
+        if isinstance(op, bool) or not isinstance(op, (int, str)):
+            raise ValueError(f'无效的操作组件: {op!r}')
+
+
+def normalize(ops):
+    """校验操作并合并相邻的同类组件，相邻的删除和插入统一为插入在前"""
+    _check(ops)
+    builder = _Builder()
+    for op in ops:
+        builder.add(op)
+    return builder.ops
+
+
+def base_length(ops):
+    """操作要求的文本长度"""
+    return sum(abs(op) for op in ops if not isinstance(op, str))
+
+
+def target_length(ops):
+    """应用操作后的文本长度"""
+    return sum(len(op) if isinstance(op, str) else op for op in ops if isinstance(op, str) or op > 0)
+
+
+def apply(text, ops):
+    """把操作应用到文本上
+
+    Raises:
+        ValueError: 操作的基础长度与文本长度不一致
+    """
+    if base_length(ops) != len(text):
+        raise ValueError(f'操作的基础长度{base_length(ops)}与文本长度{len(text)}不一致')
+    out = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.append(text[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return ''.join(out)
+
+
+def compose(a, b):
+    """合并两个连续的操作，返回与先应用a再应用b等效的单个操作
+
+    客户端等待确认期间的多次编辑合并为一个操作，确认后一次发送。
+
+    Raises:
+        ValueError: a的结果长度与b的基础长度不一致
+    """
+    if target_length(a) != base_length(b):
+        raise ValueError('连续操作的长度不一致')
+    result = _Builder()
+    ia, ib = iter(a), iter(b)
+    op1, op2 = next(ia, None), next(ib, None)
+    while op1 is not None or op2 is not None:
+        if isinstance(op1, int) and op1 < 0:
+            # a删除的文本b看不到
+            result.add(op1)
+            op1 = next(ia, None)
+            continue
+        if isinstance(op2, str):
+            result.add(op2)
+            op2 = next(ib, None)
+            continue
+        if op1 is None or op2 is None:
+            raise ValueError('连续操作的长度不一致')
+        if isinstance(op1, str):
+            # b保留或删除a插入的文本
+            length = min(len(op1), abs(op2))
+            if op2 > 0:
+                result.add(op1[:length])
+            op1 = op1[length:] or next(ia, None)
+        else:
+            length = min(op1, abs(op2))
+            result.add(length if op2 > 0 else -length)
+            op1 = _consume(op1, length, ia)
+        op2 = _consume(op2, length, ib)
+    return result.ops
+
+
+def transform(a, b):
+    """变换基于同一文本的两个并发操作
+
+    返回(a', b')，满足 apply(apply(s, a), b') == apply(apply(s, b), a')。
+    同一位置的插入，a的插入在前。
+
+    Raises:
+        ValueError: 两个操作的基础长度不一致
+    """
+    if base_length(a) != base_length(b):
+        raise ValueError('并发操作的基础长度不一致')
+    a_prime, b_prime = _Builder(), _Builder()
+    ia, ib = iter(a), iter(b)
+    op1, op2 = next(ia, None), next(ib, None)
+    while op1 is not None or op2 is not None:
+        if isinstance(op1, str):
+            a_prime.add(op1)
+            b_prime.add(len(op1))
+            op1 = next(ia, None)
+            continue
+        if isinstance(op2, str):
+            a_prime.add(len(op2))
+            b_prime.add(op2)
+            op2 = next(ib, None)
+            continue
+        if op1 is None or op2 is None:
+            raise ValueError('并发操作的基础长度不一致')
+        if op1 > 0 and op2 > 0:
+            # 双方都保留
+            length = min(op1, op2)
+            a_prime.add(length)
+            b_prime.add(length)
+        elif op1 < 0 and op2 < 0:
+            # 双方删除同一段文本，变换后都不需要再删除
+            length = min(-op1, -op2)
+        elif op1 < 0:
+            # a删除b保留的文本
+            length = min(-op1, op2)
+            a_prime.add(-length)
+        else:
+            # a保留b删除的文本
+            length = min(op1, -op2)
+            b_prime.add(-length)
+        op1 = _consume(op1, length, ia)
+        op2 = _consume(op2, length, ib)
+    return a_prime.ops, b_prime.ops
+
+
+def _consume(op, length, rest):
+    """从保留或删除组件中消耗length个字符，用完时取下一个组件"""
+    remaining = abs(op) - length
+    if remaining:
+        return remaining if op > 0 else -remaining
+    return next(rest, None)
+
+
+class _Builder:
+    """逐个添加组件并保持操作的规范形式"""
+
+    def __init__(self):
+        self.ops = []
+
+    def add(self, op):
+        if isinstance(op, str):
+            if not op:
+                return
+            if self.ops and isinstance(self.ops[-1], str):
+                self.ops[-1] += op
+            elif self.ops and self.ops[-1] < 0:
+                # 删除和插入相邻时插入在前，相同效果的操作只有一种表示
+                if len(self.ops) > 1 and isinstance(self.ops[-2], str):
+                    self.ops[-2] += op
+                else:
+                    self.ops.insert(len(self.ops) - 1, op)
+            else:
+                self.ops.append(op)
+            return
+        if op == 0:
+            return
+        last = self.ops[-1] if self.ops else None
+        if last is not None and not isinstance(last, str) and (last > 0) == (op > 0):
+            self.ops[-1] += op
+        else:
+            self.ops.append(op)
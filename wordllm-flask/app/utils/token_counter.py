@@ -0,0 +1,58 @@
+"""
+文本token数计算
+
+安装了tiktoken时使用其本地分词器(cl100k_base)计数；未安装时按字符类别近似估算：
+中日韩字符约1个token，其余文本约每4个字符1个token。
+"""
+import re
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken为可选依赖
+    tiktoken = None
+
+# 中日韩统一表意文字、假名、谚文及全角标点
+_CJK_PATTERN = re.compile(r'[　-〿぀-ヿ㐀-䶿一-鿿가-힯＀-￯]')
+
+# tiktoken编码实例缓存
+_encoding = None
+
+
+def estimate_tokens(text):
+    """估算文本的token数
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def tokenizer_name():
+    """当前使用的计数方式"""
+    return 'tiktoken:cl100k_base' if tiktoken is not None else 'estimate'
+
+
+def count_tokens(text):
+    """计算文本的token数，优先使用本地分词器
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: token数
+    """
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is None:
+        return estimate_tokens(text)
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding('cl100k_base')
+    return len(_encoding.encode(text, disallowed_special=()))
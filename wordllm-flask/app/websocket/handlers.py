@@ -1,5 +1,22 @@
+from flask import request, current_app
 from flask_socketio import emit, join_room, leave_room, Namespace
 from app.utils.logger import logger
+from app.models.document import Document
+from app.models.project import Chapter
+from app.services.ai.async_model_caller import AsyncModelCaller
+from app.services.ai.async_runner import get_async_runner
+from app.services.ai.client_registry import get_async_openai_client
+from app.services.ai.content_extractor import ContentExtractor
+from app.services.ai.prompt_handler import PromptHandler
+from app.services.generation_events import generation_topic
+from app.services.collaboration import get_collaboration, collab_room
+
+def _chapter_id(data):
+    """取得协作编辑请求中的章节ID，客户端可能以字符串形式传入"""
+    try:
+        return int((data or {}).get('chapterId'))
+    except (TypeError, ValueError):
+        return None
 
 def setup_handlers(socketio):
     """设置WebSocket处理器"""
@@ -11,7 +28,7 @@ def setup_handlers(socketio):
         emit('status', {'status': 'connected'})
     
     @socketio.on('disconnect', namespace='/ws')
-    def handle_disconnect():
+    def handle_disconnect(reason=None):
         """处理断开连接事件"""
         logger.info("Client disconnected from WebSocket")
     
@@ -49,10 +66,77 @@ def setup_handlers(socketio):
             logger.info(f"Client connected to generation for session: {session_id}")
             emit('status', {'status': 'connected', 'sessionId': session_id})
         
-        def on_disconnect(self):
+        def on_disconnect(self, reason=None):
             """处理断开连接事件"""
             session_id = self.namespace.split('/')[-1]
             logger.info(f"Client disconnected from generation for session: {session_id}")
+        
+        def on_subscribe(self, data):
+            """订阅项目的章节生成进度，加入后先返回章节的当前状态"""
+            project_id = (data or {}).get('projectId')
+            if not project_id:
+                emit('error', {'error': 'Project ID is required'})
+                return
+            join_room(generation_topic(project_id))
+            logger.info(f"Client subscribed to generation progress of project: {project_id}")
+            chapters = Chapter.query.with_entities(
+                Chapter.chapter_number, Chapter.status, Chapter.error_message
+            ).filter_by(project_id=project_id).order_by(Chapter.order_index).all()
+            emit('chapter_snapshot', {
+                'project_id': project_id,
+                'chapters': [
+                    {'chapter_number': number, 'status': status, 'error_message': error_message}
+                    for number, status, error_message in chapters
+                ]
+            })
+            emit('status', {'status': 'subscribed', 'projectId': project_id})
+        
+        def on_unsubscribe(self, data):
+            """取消订阅项目的章节生成进度"""
+            project_id = (data or {}).get('projectId')
+            if not project_id:
+                emit('error', {'error': 'Project ID is required'})
+                return
+            leave_room(generation_topic(project_id))
+            logger.info(f"Client unsubscribed from generation progress of project: {project_id}")
+            emit('status', {'status': 'unsubscribed', 'projectId': project_id})
+        
+        def on_generate(self, data):
+            """流式生成大纲，模型调用在共享事件循环中异步执行，不占用处理线程"""
+            template_id = (data or {}).get('template_id')
+            if not template_id:
+                emit('error', {'error': 'Template ID is required'})
+                return
+            
+            template = Document.query.get(template_id)
+            if not template:
+                emit('error', {'error': f'Template {template_id} not found'})
+                return
+            
+            template_content = ContentExtractor.extract_template_content(template)
+            prompt = PromptHandler.build_outline_prompt(template_content, "", data.get('outline_prompt'))
+            
+            sid = request.sid
+            namespace = self.namespace
+            model = current_app.config.get('OPENAI_MODEL_NAME')
+            client = get_async_openai_client()
+            # regenerate为true时跳过响应缓存
+            use_cache = not data.get('regenerate', False)
+            
+            async def run():
+                full_content = []
+                try:
+                    async for delta in AsyncModelCaller.stream_model(client, model, prompt, use_cache=use_cache):
+                        full_content.append(delta)
+                        socketio.emit('chunk', {'content': delta}, namespace=namespace, to=sid)
+                    socketio.emit('done', {'content': ''.join(full_content)}, namespace=namespace, to=sid)
+                except Exception as e:
+                    logger.error(f"WebSocket generation failed: {e}")
+                    socketio.emit('error', {'error': str(e)}, namespace=namespace, to=sid)
+            
+            get_async_runner().submit(run())
+            logger.info(f"WebSocket generation started for template: {template_id}")
+            emit('status', {'status': 'generating', 'templateId': template_id})
     
     # 注册AI生成命名空间
     socketio.on_namespace(GenerateNamespace('/ws/generate'))
@@ -64,8 +148,9 @@ def setup_handlers(socketio):
             logger.info("Client connected to document collaboration")
             emit('status', {'status': 'connected'})
         
-        def on_disconnect(self):
+        def on_disconnect(self, reason=None):
             """处理断开连接事件"""
+            get_collaboration().leave_all(request.sid)
             logger.info("Client disconnected from document collaboration")
         
         def on_join(self, data):
@@ -92,8 +177,68 @@ def setup_handlers(socketio):
             logger.info(f"Client left document room: {room}")
             emit('status', {'status': 'left', 'documentId': document_id})
         
+        def on_open(self, data):
+            """打开章节的协作编辑会话，返回当前修订版本和内容
+
+            之后收到的chapter_ops中修订版本号不大于返回值的操作已包含在内容中，客户端应忽略。
+            """
+            chapter_id = _chapter_id(data)
+            if not chapter_id:
+                emit('error', {'error': 'Chapter ID is required'})
+                return
+            # 先加入房间再读取状态，避免漏掉两者之间排序的操作
+            join_room(collab_room(chapter_id))
+            session = get_collaboration().join(chapter_id, request.sid)
+            if session is None:
+                leave_room(collab_room(chapter_id))
+                emit('error', {'error': f'Chapter {chapter_id} not found'})
+                return
+            logger.info(f"Client opened chapter for collaboration: {chapter_id}")
+            emit('chapter_state', session.state())
+        
+        def on_close(self, data):
+            """关闭章节的协作编辑会话"""
+            chapter_id = _chapter_id(data)
+            if not chapter_id:
+                emit('error', {'error': 'Chapter ID is required'})
+                return
+            leave_room(collab_room(chapter_id))
+            get_collaboration().leave(chapter_id, request.sid)
+            emit('status', {'status': 'closed', 'chapterId': chapter_id})
+        
+        def on_op(self, data):
+            """提交编辑操作
+
+            请求包含chapterId、revision(操作基于的修订版本号)、ops、clientOpId，可选userId、timestamp。
+            客户端同一时间只能有一个未确认的操作，等待确认期间的编辑在本地合并，确认后再发送。
+            操作被拒绝时返回带resync标记的chapter_state，客户端以其内容重新开始。
+            """
+            data = data or {}
+            chapter_id = _chapter_id(data)
+            if not chapter_id or 'ops' not in data or 'revision' not in data:
+                emit('error', {'error': 'Chapter ID, revision and ops are required'})
+                return
+            collaboration = get_collaboration()
+            try:
+                collaboration.submit(
+                    chapter_id,
+                    request.sid,
+                    data['revision'],
+                    data['ops'],
+                    client_op_id=data.get('clientOpId'),
+                    user_id=data.get('userId', 'anonymous'),
+                    timestamp=data.get('timestamp')
+                )
+            except ValueError as e:
+                logger.warning(f"Rejected collaboration op on chapter {chapter_id}: {e}")
+                session = collaboration.get(chapter_id)
+                if session is None:
+                    emit('error', {'error': str(e)})
+                    return
+                emit('chapter_state', dict(session.state(), resync=True, clientOpId=data.get('clientOpId'), error=str(e)))
+        
         def on_update(self, data):
-            """处理文档更新事件"""
+            """处理文档更新事件(整篇内容广播，新客户端应使用open和op事件)"""
             if 'documentId' not in data or 'content' not in data:
                 emit('error', {'error': 'Document ID and content are required'})
                 return
@@ -0,0 +1,133 @@
+"""
+同步与异步流式模型调用的并发能力对比
+
+在本地启动一个兼容OpenAI接口的桩服务器(每个流式响应按固定间隔返回若干片段)，
+分别用线程池+ModelCaller(模拟有限线程数的gunicorn部署)和
+AsyncRunner+AsyncModelCaller(单个事件循环)发起同样数量的并发流式请求，
+比较总耗时和平均同时进行的流数量。
+
+默认每个流约5秒(20个片段、间隔0.25秒)，接近真实模型的输出节奏。片段间隔过小时
+客户端解析每个片段的CPU开销会成为瓶颈，两种方式的差距会缩小。
+
+使用方法:
+    python bench_async_streaming.py --streams 200 --threads 32
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import openai
+from aiohttp import web
+
+from app.services.ai.async_model_caller import AsyncModelCaller
+from app.services.ai.async_runner import AsyncRunner
+from app.services.ai.model_caller import ModelCaller
+
+
+def run_stub_server(port, chunks, interval):
+    """桩服务器进程入口，与被测客户端分开进程，避免争抢GIL"""
+    async def completions(request):
+        body = await request.json()
+        if not body.get('stream'):
+            return web.json_response({
+                'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': '{"chapters": []}'}}]
+            })
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for i in range(chunks):
+            await asyncio.sleep(interval)
+            chunk = {
+                'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': body['model'],
+                'choices': [{'index': 0, 'delta': {'content': f'片段{i} '}, 'finish_reason': None}]
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', completions)
+    web.run_app(app, host='127.0.0.1', port=port, backlog=4096, print=None)
+
+
+def start_stub_server(port, chunks, interval):
+    """启动桩服务器进程并等待端口可用"""
+    process = multiprocessing.Process(target=run_stub_server, args=(port, chunks, interval), daemon=True)
+    process.start()
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('桩服务器启动失败')
+
+
+def bench_sync(base_url, streams, threads):
+    """线程池中的同步流式调用，线程数即同时可服务的流数量上限"""
+    client = openai.OpenAI(
+        api_key='stub', base_url=base_url,
+        http_client=httpx.Client(limits=httpx.Limits(max_connections=threads, max_keepalive_connections=threads))
+    )
+
+    def one(_):
+        for chunk in ModelCaller.call_model_streaming(client, 'stub-model', 'benchmark'):
+            pass
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(one, range(streams)))
+    return time.perf_counter() - start
+
+
+def bench_async(base_url, streams):
+    """单个事件循环中的异步流式调用"""
+    runner = AsyncRunner(max_concurrent=streams)
+
+    async def main():
+        client = openai.AsyncOpenAI(
+            api_key='stub', base_url=base_url,
+            http_client=httpx.AsyncClient(limits=httpx.Limits(max_connections=streams, max_keepalive_connections=streams))
+        )
+
+        async def one():
+            async for _ in AsyncModelCaller.stream_model(client, 'stub-model', 'benchmark'):
+                pass
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(streams)))
+        return time.perf_counter() - start
+
+    return runner.submit(main()).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='同步/异步流式调用并发能力对比')
+    parser.add_argument('--streams', type=int, default=200, help='并发流式请求数')
+    parser.add_argument('--threads', type=int, default=32, help='同步方式的线程数(模拟gunicorn线程)')
+    parser.add_argument('--chunks', type=int, default=20, help='每个流返回的片段数')
+    parser.add_argument('--interval', type=float, default=0.25, help='片段间隔(秒)')
+    parser.add_argument('--port', type=int, default=18765)
+    args = parser.parse_args()
+
+    start_stub_server(args.port, args.chunks, args.interval)
+    base_url = f'http://127.0.0.1:{args.port}/v1'
+    stream_seconds = args.chunks * args.interval
+
+    print(f"并发流数: {args.streams}, 单个流时长约: {stream_seconds:.2f}s")
+    for name, elapsed in (
+        (f'同步({args.threads}线程)', bench_sync(base_url, args.streams, args.threads)),
+        ('异步(单事件循环)', bench_async(base_url, args.streams)),
+    ):
+        print(f"{name:<16} 总耗时: {elapsed:6.2f}s  平均同时进行的流: {args.streams * stream_seconds / elapsed:7.1f}")
+
+
+if __name__ == '__main__':
+    main()
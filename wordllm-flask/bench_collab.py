@@ -0,0 +1,313 @@
+"""
+协作编辑协议的流量和广播延迟对比
+
+在子进程中启动Web服务(临时SQLite数据库中有一个指定大小的章节)，
+用多个Socket.IO客户端模拟同时编辑该章节的用户，按固定频率插入文字，比较两种协议:
+- 整篇: 旧的update事件，每次编辑把整篇内容广播给房间内其他客户端
+- 操作: open/op事件，只发送编辑操作，由服务端排序后合并广播
+
+输出所有客户端合计的下行/上行字节速率、编辑到达其他客户端的延迟分位数，
+以及操作协议下各客户端最终内容是否一致、全部断开后服务端是否关闭了协作会话。
+
+使用方法:
+    python bench_collab.py                                   # 50个编辑者、100KB章节、每人每秒5次编辑
+    python bench_collab.py --editors 20 --size-kb 20 --duration 5 --modes ops
+
+客户端依赖python-socketio，安装websocket-client时使用WebSocket传输，否则使用长轮询。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import urllib.request
+
+import socketio as socketio_client
+from engineio.payload import Payload
+
+from config import Config
+from app.utils import text_ops
+
+NAMESPACE = '/ws/document'
+
+# 长轮询时一次响应可能包含大量消息，默认上限16个会使客户端断开
+Payload.max_decode_packets = 10000
+
+
+def bench_config(database_url):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        GENERATION_EMBEDDED_WORKER = False
+        CORS_ORIGIN = '*'
+    return BenchConfig
+
+
+def prepare_database(database_url, size_kb):
+    """创建表并写入一个size_kb大小的章节，返回章节ID"""
+    from app import create_app, db
+    from app.models.document import Document
+    from app.models.project import Project, Chapter
+
+    app = create_app(bench_config(database_url))
+    with app.app_context():
+        db.create_all()
+        template = Document(title='bench', file_path='bench.docx')
+        db.session.add(template)
+        db.session.commit()
+        project = Project(project_name='bench', template_name='bench', template_id=template.id)
+        db.session.add(project)
+        db.session.commit()
+        line = '协作编辑压测文本 collaboration benchmark text.\n'
+        content = line * (size_kb * 1024 // len(line.encode('utf-8')))
+        chapter = Chapter(project_id=project.id, chapter_number='1', title='bench', content=content, order_index=0)
+        db.session.add(chapter)
+        db.session.commit()
+        return chapter.id, content
+
+
+def run_server(database_url, port):
+    """服务进程入口，与客户端分开进程，避免争抢GIL"""
+    from app import create_app, socketio
+    app = create_app(bench_config(database_url))
+    socketio.run(app, host='127.0.0.1', port=port, debug=False, use_reloader=False, log_output=False)
+
+
+def start_server(database_url, port):
+    process = multiprocessing.Process(target=run_server, args=(database_url, port), daemon=True)
+    process.start()
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('服务启动失败')
+
+
+def collaboration_stats(url):
+    with urllib.request.urlopen(f'{url}/api/metrics/collaboration', timeout=5) as response:
+        return json.loads(response.read())['data']
+
+
+def wait_released(url, timeout=15):
+    """等待服务端处理断开: 编辑者退出会话，最后一个编辑者离开后会话写回并关闭"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        stats = collaboration_stats(url)
+        if stats['editors'] == 0 and stats['sessions'] == 0:
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def payload_size(data):
+    return len(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+
+class Editor:
+    """模拟一个编辑者，记录收发字节数和其他编辑者的编辑到达本客户端的延迟"""
+
+    def __init__(self, url, chapter_id, mode, index):
+        self.url = url
+        self.chapter_id = chapter_id
+        self.mode = mode
+        self.user_id = f'editor-{index}'
+        self.sio = socketio_client.Client(reconnection=False)
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.text = ''
+        self.revision = 0
+        # 已发送未确认的操作和等待发送的本地编辑(操作协议)
+        self.outstanding = None
+        self.outstanding_id = None
+        self.buffer = None
+        self.op_seq = 0
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.latencies = []
+        self.sio.on('document_update', self._on_document_update, namespace=NAMESPACE)
+        self.sio.on('chapter_state', self._on_chapter_state, namespace=NAMESPACE)
+        self.sio.on('chapter_ops', self._on_chapter_ops, namespace=NAMESPACE)
+
+    def connect(self, content):
+        self.sio.connect(self.url, namespaces=[NAMESPACE])
+        if self.mode == 'full':
+            self.text = content
+            self._emit('join', {'documentId': self.chapter_id})
+            self.ready.set()
+        else:
+            self._emit('open', {'chapterId': self.chapter_id})
+        if not self.ready.wait(10):
+            raise RuntimeError(f'{self.user_id}打开章节超时')
+
+    def _emit(self, event, data):
+        self.sent_bytes += payload_size(data)
+        self.sio.emit(event, data, namespace=NAMESPACE)
+
+    def _on_document_update(self, data):
+        self.received_bytes += payload_size(data)
+        self.latencies.append(time.time() - data['timestamp'])
+
+    def _on_chapter_state(self, data):
+        self.received_bytes += payload_size(data)
+        with self.lock:
+            self.text = data['content']
+            self.revision = data['revision']
+            self.outstanding = self.outstanding_id = self.buffer = None
+        self.ready.set()
+
+    def _on_chapter_ops(self, data):
+        self.received_bytes += payload_size(data)
+        now = time.time()
+        sid = self.sio.get_sid(NAMESPACE)
+        with self.lock:
+            for entry in data['ops']:
+                if entry['revision'] <= self.revision:
+                    continue
+                self.revision = entry['revision']
+                if entry['clientId'] == sid and entry['clientOpId'] == self.outstanding_id:
+                    # 自己的操作已排序，发送等待中的编辑
+                    self.outstanding = self.outstanding_id = None
+                    if self.buffer:
+                        self._send(self.buffer)
+                        self.buffer = None
+                    continue
+                ops = entry['ops']
+                if self.outstanding:
+                    self.outstanding, ops = text_ops.transform(self.outstanding, ops)
+                    if self.buffer:
+                        self.buffer, ops = text_ops.transform(self.buffer, ops)
+                self.text = text_ops.apply(self.text, ops)
+                if entry.get('timestamp'):
+                    self.latencies.append(now - entry['timestamp'])
+
+    def _send(self, ops):
+        """发送操作（调用方持有锁）"""
+        self.op_seq += 1
+        self.outstanding = ops
+        self.outstanding_id = f'{self.user_id}:{self.op_seq}'
+        self._emit('op', {
+            'chapterId': self.chapter_id,
+            'revision': self.revision,
+            'ops': ops,
+            'clientOpId': self.outstanding_id,
+            'userId': self.user_id,
+            'timestamp': time.time()
+        })
+
+    def edit(self):
+        """在随机位置插入几个字符"""
+        insert = random.choice(['a', '编辑', 'xyz', '，'])
+        with self.lock:
+            position = random.randint(0, len(self.text))
+            if self.mode == 'full':
+                self.text = self.text[:position] + insert + self.text[position:]
+                self._emit('update', {
+                    'documentId': self.chapter_id,
+                    'content': self.text,
+                    'userId': self.user_id,
+                    'timestamp': time.time()
+                })
+                return
+            ops = text_ops.normalize([position, insert, len(self.text) - position])
+            self.text = text_ops.apply(self.text, ops)
+            if self.outstanding is None:
+                self._send(ops)
+            else:
+                # 等待确认期间的编辑合并为一个操作
+                self.buffer = text_ops.compose(self.buffer, ops) if self.buffer else ops
+
+    def run(self, rate, duration):
+        interval = 1.0 / rate
+        deadline = time.time() + duration
+        next_edit = time.time() + random.random() * interval
+        while next_edit < deadline:
+            time.sleep(max(0, next_edit - time.time()))
+            self.edit()
+            next_edit += interval
+
+    def settled(self):
+        with self.lock:
+            return self.outstanding is None and self.buffer is None
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def bench(mode, args):
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    chapter_id, content = prepare_database(database_url, args.size_kb)
+    port = args.port + (0 if mode == 'full' else 1)
+    server = start_server(database_url, port)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        editors = [Editor(url, chapter_id, mode, i) for i in range(args.editors)]
+        for editor in editors:
+            editor.connect(content)
+        for editor in editors:
+            editor.sent_bytes = editor.received_bytes = 0
+        threads = [threading.Thread(target=editor.run, args=(args.rate, args.duration)) for editor in editors]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 等待已发送的编辑全部送达
+        deadline = time.time() + 10
+        while time.time() < deadline and not all(editor.settled() for editor in editors):
+            time.sleep(0.05)
+        time.sleep(1)
+        elapsed = time.time() - started
+        converged = None
+        released = None
+        if mode == 'ops':
+            converged = len({editor.text for editor in editors}) == 1
+        for editor in editors:
+            editor.sio.disconnect()
+        if mode == 'ops':
+            released = wait_released(url)
+        latencies = [value for editor in editors for value in editor.latencies]
+        return {
+            'down': sum(editor.received_bytes for editor in editors) / elapsed,
+            'up': sum(editor.sent_bytes for editor in editors) / elapsed,
+            'p50': percentile(latencies, 0.5) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'deliveries': len(latencies),
+            'converged': converged,
+            'released': released
+        }
+    finally:
+        server.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='协作编辑协议的流量和广播延迟对比')
+    parser.add_argument('--editors', type=int, default=50, help='同时编辑的客户端数')
+    parser.add_argument('--size-kb', type=int, default=100, help='章节大小(KB)')
+    parser.add_argument('--rate', type=float, default=5, help='每个编辑者每秒的编辑次数')
+    parser.add_argument('--duration', type=float, default=10, help='编辑持续时间(秒)')
+    parser.add_argument('--modes', nargs='+', choices=['full', 'ops'], default=['full', 'ops'])
+    parser.add_argument('--port', type=int, default=18800)
+    args = parser.parse_args()
+
+    print(f"编辑者: {args.editors}, 章节: {args.size_kb}KB, 每人每秒{args.rate}次编辑, 持续{args.duration}s")
+    print(f"{'协议':<6} {'下行(KB/s)':>12} {'上行(KB/s)':>12} {'延迟p50(ms)':>12} {'延迟p95(ms)':>12} {'送达次数':>10} {'内容一致':>8} {'会话释放':>8}")
+    for mode in args.modes:
+        result = bench(mode, args)
+        converged = '-' if result['converged'] is None else ('是' if result['converged'] else '否')
+        released = '-' if result['released'] is None else ('是' if result['released'] else '否')
+        print(f"{'整篇' if mode == 'full' else '操作':<6} {result['down'] / 1024:>12.1f} {result['up'] / 1024:>12.1f} "
+              f"{result['p50']:>12.1f} {result['p95']:>12.1f} {result['deliveries']:>10} {converged:>8} {released:>8}")
+
+
+if __name__ == '__main__':
+    main()
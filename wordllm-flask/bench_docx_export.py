@@ -0,0 +1,170 @@
+"""
+DOCX导出性能对比
+
+比较原先用python-docx在内存中构建完整文档的导出方式与流式写入document.xml的
+DocumentExportService.export_as_docx，报告耗时和进程峰值内存(RSS)。
+每种方式在独立子进程中运行，峰值内存互不影响。
+
+使用方法:
+    python bench_docx_export.py                          # 1000个章节
+    python bench_docx_export.py --chapters 3000 --paragraphs 8
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from docx import Document as DocxDocument
+from docx.shared import Cm, Pt
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+
+from config import Config
+from app import create_app, db
+from app.models.document import Document
+from app.models.project import Project, Chapter
+from app.services.document_export import DocumentExportService
+
+SETTINGS = {
+    'margins': {'top': 2.54, 'bottom': 2.54, 'left': 3.18, 'right': 3.18},
+    'level1_style': {'fontFamily': '黑体', 'fontSize': '三号', 'bold': True, 'alignment': '居中'},
+    'level2_style': {'fontFamily': '黑体', 'fontSize': '四号', 'bold': True},
+    'level3_style': {'fontSize': '小四', 'bold': True},
+    'text_style': {'fontSize': '小四', 'firstLineIndent': 2},
+    'section_number_style': {'number_style': 'number'}
+}
+
+WORDS = ['投标人', '技术方案', '项目实施', '质量保证', '售后服务', '进度计划', '系统架构', '安全措施', '人员配置', '验收标准']
+
+
+def make_config(database_url):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SCHEMA_INDEX_CHECK = False
+        GENERATION_EMBEDDED_WORKER = False
+    return BenchConfig
+
+
+def populate(chapters, paragraphs):
+    """写入一个包含chapters个章节的项目，每章paragraphs段约300字的正文"""
+    template = Document(title='bench', file_path='bench.docx')
+    db.session.add(template)
+    db.session.commit()
+    project = Project(project_name='bench', template_name='bench', template_id=template.id)
+    db.session.add(project)
+    db.session.commit()
+    rng = random.Random(0)
+    rows = []
+    for i in range(chapters):
+        number = f"{i // 50 + 1}.{i // 10 % 5 + 1}.{i % 10 + 1}" if i % 10 else f"{i // 50 + 1}.{i // 10 % 5 + 1}"
+        content = '\n\n'.join(
+            '，'.join(rng.choice(WORDS) + rng.choice(WORDS) for _ in range(30)) + '。'
+            for _ in range(paragraphs)
+        )
+        rows.append({'project_id': project.id, 'chapter_number': number, 'title': f'章节{i}',
+                     'content': content, 'order_index': i, 'status': 'done'})
+    db.session.execute(Chapter.__table__.insert(), rows)
+    db.session.commit()
+    return project.id
+
+
+def legacy_export(project, chapters, settings):
+    """原实现: 在内存中构建完整的python-docx文档，每个段落单独设置格式"""
+    doc = DocxDocument()
+    section = doc.sections[0]
+    margins = settings.get('margins', {})
+    section.top_margin = Cm(float(margins.get('top', 2.54)))
+    section.bottom_margin = Cm(float(margins.get('bottom', 2.54)))
+    section.left_margin = Cm(float(margins.get('left', 3.18)))
+    section.right_margin = Cm(float(margins.get('right', 3.18)))
+    section_number_style = settings.get('section_number_style', {})
+    title_styles = {1: settings.get('level1_style', {}), 2: settings.get('level2_style', {}), 3: settings.get('level3_style', {})}
+    text_style = settings.get('text_style', {})
+    for chapter in chapters:
+        level = min(str(chapter.chapter_number).count('.') + 1, 3)
+        title_style = title_styles.get(level, {})
+        number_prefix = DocumentExportService.get_number_style(chapter, section_number_style)
+        heading = doc.add_heading(level=level)
+        heading_text = heading.add_run(f"{number_prefix}{chapter.title}")
+        font_name = title_style.get('fontFamily', '仅宋体')
+        if font_name == '仅宋体':
+            font_name = '宋体'
+        heading_text.font.name = font_name
+        font_size_mapping = {'小三': 15, '三号': 16, '小四': 12, '四号': 14, '小五': 9, '五号': 10.5}
+        heading_text.font.size = Pt(font_size_mapping.get(title_style.get('fontSize', '四号'), 14))
+        if title_style.get('bold', True):
+            heading_text.font.bold = True
+        alignment_mapping = {'左对齐': WD_ALIGN_PARAGRAPH.LEFT, '居中': WD_ALIGN_PARAGRAPH.CENTER, '右对齐': WD_ALIGN_PARAGRAPH.RIGHT}
+        heading.alignment = alignment_mapping.get(title_style.get('alignment', '左对齐'), WD_ALIGN_PARAGRAPH.LEFT)
+        if chapter.content:
+            for para_text in chapter.content.split('\n\n'):
+                if para_text.strip():
+                    para = doc.add_paragraph()
+                    para.paragraph_format.first_line_indent = Pt(text_style.get('firstLineIndent', 2) * 10)
+                    para.alignment = alignment_mapping.get(text_style.get('alignment', '左对齐'), WD_ALIGN_PARAGRAPH.LEFT)
+                    run = para.add_run(para_text)
+                    run.font.name = '宋体'
+                    run._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
+                    run.font.size = Pt(font_size_mapping.get(text_style.get('fontSize', '小四'), 12))
+                    if text_style.get('bold', False):
+                        run.font.bold = True
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
+    doc.save(temp_file.name)
+    temp_file.close()
+    return temp_file.name
+
+
+def run_one(database_url, project_id, method):
+    """子进程中执行一次导出，输出 耗时 峰值内存 文件大小 段落数"""
+    app = create_app(make_config(database_url))
+    with app.app_context():
+        project = Project.query.get(project_id)
+        query = Chapter.query.filter_by(project_id=project_id).order_by(Chapter.order_index)
+        started = time.perf_counter()
+        if method == 'legacy':
+            path = legacy_export(project, query.all(), SETTINGS)
+        else:
+            path = DocumentExportService.export_as_docx(project, query.yield_per(100), SETTINGS)
+        elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    size = os.path.getsize(path)
+    paragraphs = len(DocxDocument(path).paragraphs)
+    os.remove(path)
+    print(f"{elapsed:.3f} {peak_kb} {size} {paragraphs}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DOCX导出性能对比')
+    parser.add_argument('--chapters', type=int, default=1000)
+    parser.add_argument('--paragraphs', type=int, default=6, help='每个章节的段落数')
+    parser.add_argument('--run', nargs=3, metavar=('DATABASE_URL', 'PROJECT_ID', 'METHOD'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args.run[0], int(args.run[1]), args.run[2])
+        return
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(make_config(database_url))
+    with app.app_context():
+        db.create_all()
+        project_id = populate(args.chapters, args.paragraphs)
+        db.session.remove()
+
+    print(f"导出{args.chapters}个章节，每章{args.paragraphs}段")
+    print(f"{'方式':<8} {'耗时(s)':>10} {'峰值RSS(MB)':>12} {'文件(KB)':>10} {'段落数':>8}")
+    for method, label in (('legacy', '内存构建'), ('stream', '流式写入')):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run', database_url, str(project_id), method],
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        elapsed, peak_kb, size, paragraphs = output.split()
+        print(f"{label:<8} {float(elapsed):>10.2f} {int(peak_kb) / 1024:>12.1f} {int(size) / 1024:>10.1f} {paragraphs:>8}")
+
+
+if __name__ == '__main__':
+    main()
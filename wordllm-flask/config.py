@@ -23,6 +23,7 @@ class Config:
     # 数据库配置
     SQLALCHEMY_DATABASE_URI = config_data.get('database', {}).get('DATABASE_URI', 'sqlite:///wordllm.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SCHEMA_INDEX_CHECK = config_data.get('database', {}).get('SCHEMA_INDEX_CHECK', True)  # 启动时检查索引是否缺失
     
     # JWT配置
     JWT_SECRET_KEY = config_data.get('jwt', {}).get('JWT_SECRET_KEY', 'jwt-secret-key')
@@ -32,12 +33,36 @@ class Config:
     UPLOAD_FOLDER = config_data.get('file_upload', {}).get('UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
     STORAGE_FOLDER = config_data.get('file_upload', {}).get('STORAGE_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage'))
     MAX_CONTENT_LENGTH = config_data.get('file_upload', {}).get('MAX_CONTENT_LENGTH', 16) * 1024 * 1024  # 默认16MB
+    TEMPLATE_PREPROCESS_ENABLED = config_data.get('file_upload', {}).get('TEMPLATE_PREPROCESS_ENABLED', True)  # 上传模板后在后台提取文本、渲染预览和解析标题
+    TEMPLATE_PREPROCESS_WORKERS = config_data.get('file_upload', {}).get('TEMPLATE_PREPROCESS_WORKERS', 2)  # 预处理线程数
+    INPUT_GC_INTERVAL = config_data.get('file_upload', {}).get('INPUT_GC_INTERVAL', 3600)  # 输入文件垃圾回收间隔(秒)，在登记新文件时检查
+    INPUT_GC_GRACE_SECONDS = config_data.get('file_upload', {}).get('INPUT_GC_GRACE_SECONDS', 3600)  # 未被引用的输入文件保留时间(秒)
     
     # OpenAI配置 - 特别注意这里
     OPENAI_API_KEY = config_data.get('openai', {}).get('OPENAI_API_KEY')
     OPENAI_MODEL_NAME = config_data.get('openai', {}).get('OPENAI_MODEL_NAME')
     OPENAI_API_BASE = config_data.get('openai', {}).get('OPENAI_API_BASE')
     
+    # OpenAI HTTP连接池配置，所有线程共享同一个客户端
+    OPENAI_MAX_CONNECTIONS = config_data.get('openai', {}).get('OPENAI_MAX_CONNECTIONS', 50)
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = config_data.get('openai', {}).get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 20)
+    OPENAI_KEEPALIVE_EXPIRY = config_data.get('openai', {}).get('OPENAI_KEEPALIVE_EXPIRY', 60)  # 空闲连接保持时间(秒)
+    OPENAI_TIMEOUT = config_data.get('openai', {}).get('OPENAI_TIMEOUT', 300)  # 单次请求超时(秒)
+    OPENAI_MAX_RETRIES = config_data.get('openai', {}).get('OPENAI_MAX_RETRIES', 2)
+    OPENAI_HTTP2 = config_data.get('openai', {}).get('OPENAI_HTTP2', True)  # 需要安装h2包才会生效
+    ASYNC_MODEL_CALLS = config_data.get('openai', {}).get('ASYNC_MODEL_CALLS', False)  # 流式接口默认是否走异步事件循环
+    ASYNC_MAX_CONCURRENT_CALLS = config_data.get('openai', {}).get('ASYNC_MAX_CONCURRENT_CALLS', 200)  # 事件循环中同时进行的模型调用上限
+    
+    # 提示词token预算
+    MODEL_CONTEXT_WINDOW = config_data.get('openai', {}).get('MODEL_CONTEXT_WINDOW', 32768)  # 默认上下文窗口(token)
+    MODEL_CONTEXT_WINDOWS = config_data.get('openai', {}).get('MODEL_CONTEXT_WINDOWS', {})  # 按模型名称覆盖上下文窗口
+    MODEL_MAX_OUTPUT_TOKENS = config_data.get('openai', {}).get('MODEL_MAX_OUTPUT_TOKENS', 2000)  # 模型调用的max_tokens
+    PROMPT_RESERVE_TOKENS = config_data.get('openai', {}).get('PROMPT_RESERVE_TOKENS', 512)  # 抵消token计数误差的余量
+    PROMPT_MAX_TOKENS = config_data.get('openai', {}).get('PROMPT_MAX_TOKENS', 16000)  # 提示词token上限，0表示只受上下文窗口限制
+    PROMPT_SUFFIX_RESERVE_TOKENS = config_data.get('openai', {}).get('PROMPT_SUFFIX_RESERVE_TOKENS', 512)  # 章节内容提示词中为章节信息和输出格式预留的token数
+    PROMPT_PREFIX_MODE = config_data.get('openai', {}).get('PROMPT_PREFIX_MODE', 'inline')  # 共用前缀的发送方式: inline、system或cache_control
+    PROMPT_PREFIX_MAX_PROJECTS = config_data.get('openai', {}).get('PROMPT_PREFIX_MAX_PROJECTS', 256)  # 前缀复用统计保留的项目数
+    
     # 速率限制配置
     RATE_LIMIT_WINDOW_MS = config_data.get('rate_limit', {}).get('RATE_LIMIT_WINDOW_MS', 900000)  # 15分钟
     RATE_LIMIT_MAX_REQUESTS = config_data.get('rate_limit', {}).get('RATE_LIMIT_MAX_REQUESTS', 100)
@@ -47,3 +72,58 @@ class Config:
     
     # WebSocket配置
     WS_HEARTBEAT_INTERVAL = config_data.get('websocket', {}).get('WS_HEARTBEAT_INTERVAL', 30000)  # 30秒
+    WS_MESSAGE_QUEUE = config_data.get('websocket', {}).get('WS_MESSAGE_QUEUE', '')  # Socket.IO消息队列地址(如redis://localhost:6379/0)，多个Web进程或单独的worker.py推送事件时需要配置，为空时只在本进程内推送
+    WS_DELTA_INTERVAL = config_data.get('websocket', {}).get('WS_DELTA_INTERVAL', 0.2)  # 章节正文增量合并推送的最小间隔(秒)
+    
+    # 协作编辑配置
+    COLLAB_BROADCAST_INTERVAL = config_data.get('collaboration', {}).get('COLLAB_BROADCAST_INTERVAL', 0.05)  # 合并广播编辑操作的间隔(秒)
+    COLLAB_HISTORY_OPS = config_data.get('collaboration', {}).get('COLLAB_HISTORY_OPS', 500)  # 每个章节在内存中保留的操作数，基于更早修订版本的操作需要重新同步
+    COLLAB_SNAPSHOT_OPS = config_data.get('collaboration', {}).get('COLLAB_SNAPSHOT_OPS', 200)  # 累计多少个操作后把内容写回chapters表
+    COLLAB_SNAPSHOT_INTERVAL = config_data.get('collaboration', {}).get('COLLAB_SNAPSHOT_INTERVAL', 10)  # 有未保存的操作时写回chapters表的最长间隔(秒)
+    
+    # SSE配置
+    SSE_HEARTBEAT_INTERVAL = config_data.get('sse', {}).get('SSE_HEARTBEAT_INTERVAL', 15)  # 没有事件时发送心跳注释的间隔(秒)，防止代理断开空闲连接
+    SSE_RETRY_MS = config_data.get('sse', {}).get('SSE_RETRY_MS', 3000)  # 建议客户端断线后重连的等待时间(毫秒)
+    SSE_STREAM_RETENTION = config_data.get('sse', {}).get('SSE_STREAM_RETENTION', 600)  # 生成结束后事件缓冲保留时间(秒)，期间可以断点续传
+    SSE_REPLAY_MAX_EVENTS = config_data.get('sse', {}).get('SSE_REPLAY_MAX_EVENTS', 10000)  # 每个事件流缓冲的最大事件数
+    SSE_MAX_WORKERS = config_data.get('sse', {}).get('SSE_MAX_WORKERS', 8)  # 同时执行的生成任务数
+    
+    # 缓存配置
+    EXTRACTION_CACHE_MAX_ENTRIES = config_data.get('cache', {}).get('EXTRACTION_CACHE_MAX_ENTRIES', 64)  # 内存中缓存的提取结果数
+    RESPONSE_CACHE_ENABLED = config_data.get('cache', {}).get('RESPONSE_CACHE_ENABLED', True)  # 是否缓存相同提示词的模型响应
+    RESPONSE_CACHE_TTL = config_data.get('cache', {}).get('RESPONSE_CACHE_TTL', 3600)  # 响应缓存有效期(秒)
+    RESPONSE_CACHE_MAX_ENTRIES = config_data.get('cache', {}).get('RESPONSE_CACHE_MAX_ENTRIES', 256)
+    RESPONSE_CACHE_MAX_BYTES = config_data.get('cache', {}).get('RESPONSE_CACHE_MAX_BYTES', 32)  # 响应缓存总容量(MB)
+    EXPORT_CACHE_ENABLED = config_data.get('cache', {}).get('EXPORT_CACHE_ENABLED', True)  # 是否缓存导出文件
+    EXPORT_CACHE_MAX_BYTES = config_data.get('cache', {}).get('EXPORT_CACHE_MAX_BYTES', 512)  # 导出缓存总容量(MB)
+    
+    # 导出配置
+    EXPORT_ASYNC_THRESHOLD = config_data.get('export', {}).get('EXPORT_ASYNC_THRESHOLD', 200000)  # 正文超过该字数时默认异步导出
+    EXPORT_MAX_WORKERS = config_data.get('export', {}).get('EXPORT_MAX_WORKERS', 2)  # 同时执行的异步导出任务数
+    EXPORT_JOB_RETENTION = config_data.get('export', {}).get('EXPORT_JOB_RETENTION', 3600)  # 完成的导出任务保留时间(秒)
+    PDF_SOFFICE_PATH = config_data.get('export', {}).get('PDF_SOFFICE_PATH', 'soffice')  # LibreOffice可执行文件
+    PDF_POOL_SIZE = config_data.get('export', {}).get('PDF_POOL_SIZE', 2)  # 同时进行的PDF转换数
+    PDF_CONVERT_TIMEOUT = config_data.get('export', {}).get('PDF_CONVERT_TIMEOUT', 120)  # 单次PDF转换超时(秒)
+    PDF_QUEUE_TIMEOUT = config_data.get('export', {}).get('PDF_QUEUE_TIMEOUT', 60)  # 等待空闲转换槽位的超时(秒)
+    PDF_CACHE_MAX_ENTRIES = config_data.get('export', {}).get('PDF_CACHE_MAX_ENTRIES', 200)  # 缓存的PDF文件数
+    PDF_WARM_UP = config_data.get('export', {}).get('PDF_WARM_UP', True)  # 首次使用时预热转换槽位
+    
+    # 输入文件检索配置
+    RETRIEVAL_ENABLED = config_data.get('retrieval', {}).get('RETRIEVAL_ENABLED', True)  # 生成章节时只放入输入文件的相关段落
+    RETRIEVAL_TOP_K = config_data.get('retrieval', {}).get('RETRIEVAL_TOP_K', 8)  # 每个章节最多选取的段落数
+    RETRIEVAL_MAX_TOKENS = config_data.get('retrieval', {}).get('RETRIEVAL_MAX_TOKENS', 3000)  # 每个章节选取段落的token上限
+    RETRIEVAL_CHUNK_TOKENS = config_data.get('retrieval', {}).get('RETRIEVAL_CHUNK_TOKENS', 300)  # 段落块大小(token)
+    RETRIEVAL_MIN_TOKENS = config_data.get('retrieval', {}).get('RETRIEVAL_MIN_TOKENS', 2000)  # 输入文件不超过该token数时直接使用全文
+    RETRIEVAL_MAX_INDEXES = config_data.get('retrieval', {}).get('RETRIEVAL_MAX_INDEXES', 8)  # 内存中缓存的索引数
+    
+    # 章节生成并发配置
+    GENERATION_MAX_WORKERS = config_data.get('generation', {}).get('GENERATION_MAX_WORKERS', 4)  # 全局同时进行的模型调用数
+    GENERATION_PROJECT_CONCURRENCY = config_data.get('generation', {}).get('GENERATION_PROJECT_CONCURRENCY', 2)  # 单个项目默认并发数
+    GENERATION_EMBEDDED_WORKER = config_data.get('generation', {}).get('GENERATION_EMBEDDED_WORKER', True)  # 是否在Web进程内执行任务，单独部署worker.py时关闭
+    GENERATION_JOB_LEASE_SECONDS = config_data.get('generation', {}).get('GENERATION_JOB_LEASE_SECONDS', 120)  # 任务租约时长，超时未心跳则重新排队
+    GENERATION_JOB_POLL_INTERVAL = config_data.get('generation', {}).get('GENERATION_JOB_POLL_INTERVAL', 2)  # 空闲时轮询任务表的间隔(秒)
+    GENERATION_JOB_MAX_ATTEMPTS = config_data.get('generation', {}).get('GENERATION_JOB_MAX_ATTEMPTS', 3)
+    GENERATION_PUSH_DELTAS = config_data.get('generation', {}).get('GENERATION_PUSH_DELTAS', True)  # 任务执行时是否流式调用模型并推送章节正文增量
+    GENERATION_BATCH_ENABLED = config_data.get('generation', {}).get('GENERATION_BATCH_ENABLED', False)  # 是否把同级叶子章节合并到一次模型调用中生成
+    GENERATION_BATCH_MAX_CHAPTERS = config_data.get('generation', {}).get('GENERATION_BATCH_MAX_CHAPTERS', 6)  # 每批最多的章节数
+    GENERATION_BATCH_CHAPTER_TOKENS = config_data.get('generation', {}).get('GENERATION_BATCH_CHAPTER_TOKENS', 600)  # 批量生成时每个章节预计的输出token数，决定每批章节数和字数要求
@@ -0,0 +1,14 @@
+"""
+gunicorn配置，gunicorn在工作目录中自动加载本文件
+
+    gunicorn -w 1 --threads 100 run:app
+"""
+
+
+def post_worker_init(worker):
+    """每个gunicorn worker加载应用后启动内嵌的章节生成工作线程
+
+    只在提供服务的进程中启动，flask db、维护脚本和基准脚本创建应用时不会领取任务。
+    """
+    from app.services.ai.job_queue import start_embedded_worker
+    start_embedded_worker(worker.wsgi)
@@ -0,0 +1,84 @@
+"""add chapter and project indexes
+
+Revision ID: a7c4e2b19d53
+Revises: 3f1c2a7d9e40
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e2b19d53'
+down_revision = '3f1c2a7d9e40'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def _keep_rank(row):
+    """重复章节中保留内容非空、更新时间最晚的一行，其次是ID最大的一行"""
+    return (bool((row.content or '').strip()), row.updated_at is not None, row.updated_at or 0, row.id)
+
+
+def _dedupe_chapters():
+    """建唯一索引前清理历史数据中重复的(project_id, chapter_number)
+
+    每组保留一行，其它行删除，指向被删除行的parent_id改为指向保留的行。被删除的行逐条写入日志。
+
+    Returns:
+        int: 删除的行数
+    """
+    bind = op.get_bind()
+    groups = bind.execute(sa.text(
+        'SELECT project_id, chapter_number FROM chapters '
+        'GROUP BY project_id, chapter_number HAVING COUNT(*) > 1'
+    )).fetchall()
+    removed = 0
+    for project_id, chapter_number in groups:
+        rows = bind.execute(sa.text(
+            'SELECT id, title, content, updated_at FROM chapters '
+            'WHERE project_id = :project_id AND chapter_number = :chapter_number'
+        ), {'project_id': project_id, 'chapter_number': chapter_number}).fetchall()
+        keep = max(rows, key=_keep_rank)
+        drop_ids = [row.id for row in rows if row.id != keep.id]
+        for row in rows:
+            if row.id != keep.id:
+                logger.warning(
+                    f"删除重复章节: id={row.id}, project_id={project_id}, chapter_number={chapter_number}, "
+                    f"title={row.title!r}, 内容{len(row.content or '')}字符; 保留id={keep.id}"
+                )
+        params = {'keep_id': keep.id, 'drop_ids': drop_ids}
+        bind.execute(sa.text(
+            'UPDATE chapters SET parent_id = :keep_id WHERE parent_id IN :drop_ids AND id != :keep_id'
+        ).bindparams(sa.bindparam('drop_ids', expanding=True)), params)
+        bind.execute(sa.text(
+            'UPDATE chapters SET parent_id = NULL WHERE id = :keep_id AND parent_id IN :drop_ids'
+        ).bindparams(sa.bindparam('drop_ids', expanding=True)), params)
+        bind.execute(sa.text(
+            'DELETE FROM chapters WHERE id IN :drop_ids'
+        ).bindparams(sa.bindparam('drop_ids', expanding=True)), {'drop_ids': drop_ids})
+        removed += len(drop_ids)
+    if removed:
+        logger.warning(f"共删除{removed}个重复章节({len(groups)}组)")
+    return removed
+
+
+def upgrade():
+    _dedupe_chapters()
+
+    op.create_index('uq_chapters_project_chapter_number', 'chapters', ['project_id', 'chapter_number'], unique=True)
+    op.create_index('ix_chapters_project_order_index', 'chapters', ['project_id', 'order_index'], unique=False)
+    op.create_index(op.f('ix_chapters_parent_id'), 'chapters', ['parent_id'], unique=False)
+    op.create_index(op.f('ix_projects_created_at'), 'projects', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_projects_created_at'), table_name='projects')
+    op.drop_index(op.f('ix_chapters_parent_id'), table_name='chapters')
+    op.drop_index('ix_chapters_project_order_index', table_name='chapters')
+    op.drop_index('uq_chapters_project_chapter_number', table_name='chapters')
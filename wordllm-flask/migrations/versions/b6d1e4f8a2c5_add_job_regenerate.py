@@ -0,0 +1,26 @@
+"""add regenerate flag to generation jobs
+
+Revision ID: b6d1e4f8a2c5
+Revises: f4a2d8c6b1e3
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1e4f8a2c5'
+down_revision = 'f4a2d8c6b1e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('regenerate', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.drop_column('regenerate')
@@ -0,0 +1,36 @@
+"""add template processing columns
+
+Revision ID: c5d8f1a3b7e2
+Revises: a7c4e2b19d53
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8f1a3b7e2'
+down_revision = 'a7c4e2b19d53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('processing_status', sa.String(length=20), nullable=True, comment='预处理状态: pending/processing/ready/failed'))
+        batch_op.add_column(sa.Column('processing_error', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('processed_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('heading_outline', sa.Text(), nullable=True, comment='标题层级及各节token数(JSON)'))
+        batch_op.add_column(sa.Column('text_length', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('token_count', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.drop_column('token_count')
+        batch_op.drop_column('text_length')
+        batch_op.drop_column('heading_outline')
+        batch_op.drop_column('processed_at')
+        batch_op.drop_column('processing_error')
+        batch_op.drop_column('processing_status')
@@ -0,0 +1,41 @@
+"""add input files
+
+Revision ID: e2b7c9d4f1a6
+Revises: c5d8f1a3b7e2
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7c9d4f1a6'
+down_revision = 'c5d8f1a3b7e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('input_files',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=True),
+    sa.Column('original_filename', sa.String(length=255), nullable=True),
+    sa.Column('stored_name', sa.String(length=100), nullable=False, comment='UPLOAD_FOLDER/inputs下的文件名: 内容哈希+扩展名'),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('file_size', sa.Integer(), nullable=True),
+    sa.Column('text_length', sa.Integer(), nullable=True),
+    sa.Column('token_count', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_input_files_project_hash', 'input_files', ['project_id', 'content_hash'], unique=True)
+    op.create_index(op.f('ix_input_files_stored_name'), 'input_files', ['stored_name'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_input_files_stored_name'), table_name='input_files')
+    op.drop_index('uq_input_files_project_hash', table_name='input_files')
+    op.drop_table('input_files')
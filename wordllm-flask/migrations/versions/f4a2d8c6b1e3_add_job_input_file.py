@@ -0,0 +1,28 @@
+"""add input file to generation jobs
+
+Revision ID: f4a2d8c6b1e3
+Revises: e2b7c9d4f1a6
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a2d8c6b1e3'
+down_revision = 'e2b7c9d4f1a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('input_file_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_generation_jobs_input_file_id', 'input_files', ['input_file_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_generation_jobs_input_file_id', type_='foreignkey')
+        batch_op.drop_column('input_file_id')
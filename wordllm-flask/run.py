@@ -8,6 +8,11 @@ load_dotenv()
 app = create_app()
 
 if __name__ == '__main__':
+    # 恢复上次进程退出时未完成的章节生成任务。只在提供服务的进程中启动，
+    # 调试模式下重载器的监控进程不启动；gunicorn部署由gunicorn.conf.py启动
+    if not app.config['DEBUG'] or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from app.services.ai.job_queue import start_embedded_worker
+        start_embedded_worker(app)
     port = int(os.environ.get('PORT', 5000))
     # 使用socketio运行应用，而不是app.run()
     socketio.run(
@@ -0,0 +1,23 @@
+"""
+独立的章节生成工作进程
+
+与Web进程分开部署时，在配置中把GENERATION_EMBEDDED_WORKER设为false，
+然后运行: python worker.py
+"""
+import signal
+from app import create_app
+from app.services.ai.job_queue import GenerationWorker
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+app = create_app()
+
+if __name__ == '__main__':
+    worker = GenerationWorker(app)
+    signal.signal(signal.SIGTERM, lambda *args: worker.stop())
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.stop()
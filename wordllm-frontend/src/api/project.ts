@@ -13,3 +13,14 @@ export async function createProject(data: {
   // 后端 /api/projects 支持 POST 创建
   return await request.post('/projects', data)
 }
+
+// 登记项目输入文件，相同内容只上传和解析一次，返回的id可作为input_file_id引用
+export async function uploadProjectInput(projectId: number, file: File) {
+  const formData = new FormData()
+  formData.append('input_file', file)
+  return await request.post(`/projects/${projectId}/inputs`, formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data'
+    }
+  })
+}
@@ -46,7 +46,8 @@ const router = createRouter({
       props: (route) => ({
         projectId: route.query.projectId,
         templateId: route.query.templateId ? Number(route.query.templateId) : null,
-        inputFileName: route.query.inputFileName
+        inputFileName: route.query.inputFileName,
+        inputFileId: route.query.inputFileId ? Number(route.query.inputFileId) : null
       })
     },
     {
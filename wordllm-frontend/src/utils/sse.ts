@@ -0,0 +1,127 @@
+// SSE事件流读取工具
+// 生成接口带 ?format=sse 时返回 text/event-stream，事件类型为 token、chapter、progress、done、error。
+// 连接中断时凭响应头 X-Stream-Id 和最后收到的事件ID，通过 GET /api/streams/<id> 续传，不会重新生成。
+
+export interface StreamEvent {
+  id: number
+  event: string
+  data: any
+}
+
+export interface EventStreamOptions {
+  // 最多重连次数
+  maxRetries?: number
+}
+
+const TERMINAL_EVENTS = ['done', 'error']
+
+/**
+ * 读取SSE响应直到收到 done 或 error 事件，中途断开时自动续传
+ * @param response fetch 返回的响应
+ * @param onEvent 每个事件的回调
+ */
+export async function readEventStream(
+  response: Response,
+  onEvent: (event: StreamEvent) => void,
+  options: EventStreamOptions = {}
+): Promise<void> {
+  const streamId = response.headers.get('X-Stream-Id')
+  const maxRetries = options.maxRetries ?? 5
+  let lastEventId = 0
+  let retryMs = 3000
+  let retries = 0
+  let current: Response = response
+
+  while (true) {
+    if (!current.ok) {
+      throw new Error(`请求失败: ${current.status} ${current.statusText}`)
+    }
+    const finished = await readOnce(current, (event) => {
+      lastEventId = event.id
+      onEvent(event)
+    }, (ms) => { retryMs = ms })
+    if (finished) {
+      return
+    }
+    if (!streamId || retries >= maxRetries) {
+      throw new Error('事件流连接中断')
+    }
+    retries += 1
+    await new Promise(resolve => setTimeout(resolve, retryMs))
+    current = await fetch(`/api/streams/${streamId}`, {
+      headers: { 'Last-Event-ID': String(lastEventId) }
+    })
+  }
+}
+
+// 读取一次连接，返回是否收到了结束事件
+async function readOnce(
+  response: Response,
+  onEvent: (event: StreamEvent) => void,
+  onRetry: (ms: number) => void
+): Promise<boolean> {
+  const reader = response.body?.getReader()
+  if (!reader) {
+    throw new Error('无法创建响应流读取器')
+  }
+  const decoder = new TextDecoder()
+  // 尚未凑成完整事件的数据
+  let pending = ''
+
+  while (true) {
+    let chunk: ReadableStreamReadResult<Uint8Array>
+    try {
+      chunk = await reader.read()
+    } catch (error) {
+      // 网络中断，由调用方按Last-Event-ID续传
+      console.warn('事件流连接中断:', error)
+      return false
+    }
+    const { done, value } = chunk
+    if (done) {
+      return false
+    }
+    pending += decoder.decode(value, { stream: true })
+    const blocks = pending.split('\n\n')
+    pending = blocks.pop() || ''
+    for (const block of blocks) {
+      const event = parseBlock(block, onRetry)
+      if (!event) {
+        continue
+      }
+      onEvent(event)
+      if (TERMINAL_EVENTS.includes(event.event)) {
+        reader.cancel()
+        return true
+      }
+    }
+  }
+}
+
+// 解析一个事件块，心跳注释和retry字段返回null
+function parseBlock(block: string, onRetry: (ms: number) => void): StreamEvent | null {
+  let id = 0
+  let event = 'message'
+  const data: string[] = []
+  for (const line of block.split('\n')) {
+    if (!line || line.startsWith(':')) {
+      continue
+    }
+    const index = line.indexOf(':')
+    const field = index < 0 ? line : line.slice(0, index)
+    const value = index < 0 ? '' : line.slice(index + 1).replace(/^ /, '')
+    if (field === 'id') {
+      id = Number(value)
+    } else if (field === 'event') {
+      event = value
+    } else if (field === 'data') {
+      data.push(value)
+    } else if (field === 'retry') {
+      onRetry(Number(value))
+    }
+  }
+  if (!data.length) {
+    return null
+  }
+  return { id, event, data: JSON.parse(data.join('\n')) }
+}
@@ -62,7 +62,8 @@ export function useChapterState() {
     // 1. 拉取章节目录
     let chapterList = []
     try {
-      const res = await fetch(`/api/projects/${projectId}/chapters`)
+      // 目录只取结构字段，正文在下面逐章获取
+      const res = await fetch(`/api/projects/${projectId}/chapters?fields=outline`)
       const data = await res.json()
       if (!data.success) throw new Error(data.message || 'Failed to get chapter outline')
       chapterList = data.data || []
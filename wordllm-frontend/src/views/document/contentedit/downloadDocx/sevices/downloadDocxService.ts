@@ -74,24 +74,20 @@ export async function downloadDocx(projectId: number, settings: ExportSettings):
       }
     );
     
-    // 创建Blob对象
-    const blob = new Blob([response.data], {
-      type: getContentType(settings.format)
-    });
-    
-    // 创建下载链接
-    const url = window.URL.createObjectURL(blob);
-    const link = document.createElement('a');
-    link.href = url;
-    link.setAttribute('download', getFileName(projectId, settings.format));
-    document.body.appendChild(link);
-    
-    // 触发下载
-    link.click();
-    
-    // 清理
-    document.body.removeChild(link);
-    window.URL.revokeObjectURL(url);
+    if (response.status === 202) {
+      // 大文档由后端异步导出，等待任务完成后直接下载
+      const job = JSON.parse(await (response.data as Blob).text()).data as ExportJob;
+      const downloadUrl = await waitForExportJob(job);
+      triggerDownload(downloadUrl, getFileName(projectId, settings.format));
+    } else {
+      // 创建Blob对象
+      const blob = new Blob([response.data], {
+        type: getContentType(settings.format)
+      });
+      const url = window.URL.createObjectURL(blob);
+      triggerDownload(url, getFileName(projectId, settings.format));
+      window.URL.revokeObjectURL(url);
+    }
     
     // 显示成功提示
     ElMessage.success('文档下载成功');
@@ -103,6 +99,52 @@ export async function downloadDocx(projectId: number, settings: ExportSettings):
   }
 }
 
+/**
+ * 异步导出任务
+ */
+interface ExportJob {
+  job_id: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  processed: number;
+  total: number;
+  progress: number;
+  error: string | null;
+  status_url: string;
+  download_url: string | null;
+}
+
+// 查询异步导出任务状态的间隔(毫秒)
+const EXPORT_POLL_INTERVAL = 1000;
+
+/**
+ * 轮询导出任务直到完成，返回下载地址
+ */
+async function waitForExportJob(job: ExportJob): Promise<string> {
+  let current = job;
+  while (current.status !== 'done') {
+    if (current.status === 'failed') {
+      throw new Error(current.error || '导出失败');
+    }
+    await new Promise(resolve => setTimeout(resolve, EXPORT_POLL_INTERVAL));
+    const { data } = await axios.get(current.status_url);
+    current = data.data as ExportJob;
+    console.log(`[downloadDocxService] 导出进度: ${current.processed}/${current.total}`);
+  }
+  return current.download_url as string;
+}
+
+/**
+ * 通过临时链接触发浏览器下载
+ */
+function triggerDownload(url: string, fileName: string) {
+  const link = document.createElement('a');
+  link.href = url;
+  link.setAttribute('download', fileName);
+  document.body.appendChild(link);
+  link.click();
+  document.body.removeChild(link);
+}
+
 /**
  * 根据格式获取内容类型
  */
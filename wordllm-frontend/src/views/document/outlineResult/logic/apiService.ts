@@ -33,7 +33,8 @@ export async function fetchChapters(projectId: string | number) {
     throw new Error('无效的项目ID')
   }
   
-  const apiUrl = `/api/projects/${numericProjectId}/chapters`
+  // 目录页只需要章节结构，不拉取正文
+  const apiUrl = `/api/projects/${numericProjectId}/chapters?fields=outline`
   console.log('[DEBUG-1.5] 发送请求到:', apiUrl)
   
   // Normalize keys to camelCase for frontend
@@ -88,12 +89,12 @@ export async function fetchChapters(projectId: string | number) {
 
 // 保存章节到数据库
 export async function saveChaptersToDB() {
-  const projectId = outlineState.projectId.value
+  const projectId = outlineState.projectId
   if (!projectId) {
     throw new Error('未找到项目ID，无法保存章节')
   }
   
-  if (!outlineState.chapters.value || outlineState.chapters.value.length === 0) {
+  if (!outlineState.chapters || outlineState.chapters.length === 0) {
     throw new Error('没有章节数据可保存')
   }
   
@@ -104,7 +105,7 @@ export async function saveChaptersToDB() {
         'Content-Type': 'application/json'
       },
       body: JSON.stringify({
-        chapters: outlineState.chapters.value
+        chapters: outlineState.chapters
       })
     })
     
@@ -124,14 +125,14 @@ export async function saveChaptersToDB() {
 
 // 继续生成子章节
 export async function continueGenerateSubchapters(useRequirement = false, requirement = '') {
-  const projectId = outlineState.projectId.value
-  const templateId = outlineState.templateId.value
+  const projectId = outlineState.projectId
+  const templateId = outlineState.templateId
   
   if (!projectId || !templateId) {
     throw new Error('项目ID或模板ID不存在，无法继续生成')
   }
   
-  if (!outlineState.chapters.value || outlineState.chapters.value.length === 0) {
+  if (!outlineState.chapters || outlineState.chapters.length === 0) {
     throw new Error('没有章节数据，无法继续生成')
   }
   
@@ -140,7 +141,9 @@ export async function continueGenerateSubchapters(useRequirement = false, requir
     const requestBody = {
       project_id: projectId,
       template_id: templateId,
-      chapters: outlineState.chapters.value
+      chapters: outlineState.chapters,
+      // 引用创建项目时登记的输入文件，无需重新上传
+      input_file_id: outlineState.inputFileId
     }
     
     if (useRequirement && requirement) {
@@ -163,8 +166,8 @@ export async function continueGenerateSubchapters(useRequirement = false, requir
     
     // 更新章节数据
     if (result.data && Array.isArray(result.data.chapters)) {
-      outlineState.chapters.value = result.data.chapters
-      outlineState.hasGeneratedSubchapters.value = true
+      outlineState.chapters = result.data.chapters
+      outlineState.hasGeneratedSubchapters = true
       
       // 保存到数据库
       await saveChaptersToDB()
@@ -181,14 +184,14 @@ export async function continueGenerateSubchapters(useRequirement = false, requir
 
 // 生成文档内容
 export async function generateDocumentContent() {
-  const projectId = outlineState.projectId.value
-  const templateId = outlineState.templateId.value
+  const projectId = outlineState.projectId
+  const templateId = outlineState.templateId
   
   if (!projectId || !templateId) {
     throw new Error('项目ID或模板ID不存在，无法生成文档内容')
   }
   
-  if (!outlineState.chapters.value || outlineState.chapters.value.length === 0) {
+  if (!outlineState.chapters || outlineState.chapters.length === 0) {
     throw new Error('无可用的章节数据')
   }
   
@@ -200,10 +203,11 @@ export async function generateDocumentContent() {
     const postBody = {
       template_id: templateId,
       project_id: projectId,
-      chapters: outlineState.chapters.value.map(ch => ({
+      chapters: outlineState.chapters.map(ch => ({
         chapterNumber: ch.chapterNumber,
         title: ch.title
-      }))
+      })),
+      input_file_id: outlineState.inputFileId
     }
     
     console.log('[前端调试] generateDocument POST /api/documents/start-generate-content 请求体:', postBody)
@@ -8,6 +8,8 @@ export const outlineState = reactive({
   inputFileName: '输入文件.docx',
   templateId: null as number|null,
   inputFilePath: null as string|null,
+  // 创建项目时登记的输入文件ID，重新生成大纲、子章节和内容时引用
+  inputFileId: null as number|null,
   templatePath: '', // 添加模板文件路径
   allChecked: false,
   chapters: [] as Chapter[],
@@ -23,6 +25,7 @@ export async function initializeFromRoute(route: RouteLocationNormalizedLoaded)
   const projectIdParam = route?.query?.projectId
   const templateIdParam = route?.query?.templateId
   const inputFileNameParam = route?.query?.inputFileName
+  const inputFileIdParam = route?.query?.inputFileId
   
   if (!projectIdParam) {
     throw new Error('未找到项目ID，无法加载大纲')
@@ -32,11 +35,13 @@ export async function initializeFromRoute(route: RouteLocationNormalizedLoaded)
   outlineState.projectId = projectIdParam as string
   if (inputFileNameParam) outlineState.inputFileName = inputFileNameParam as string
   if (templateIdParam) outlineState.templateId = Number(templateIdParam)
+  if (inputFileIdParam) outlineState.inputFileId = Number(inputFileIdParam)
   
   return {
     projectId: outlineState.projectId,
     templateId: outlineState.templateId,
-    inputFileName: outlineState.inputFileName
+    inputFileName: outlineState.inputFileName,
+    inputFileId: outlineState.inputFileId
   }
 }
 
@@ -22,7 +22,7 @@ export async function regenerate() {
 
 // 实际执行重新生成大纲的函数
 export async function regenerateChapters(preserveEdited = false) {
-  if (!outlineState.projectId.value || !outlineState.templateId.value) {
+  if (!outlineState.projectId || !outlineState.templateId) {
     ElMessage.error('项目ID或模板ID不存在，无法重新生成')
     return
   }
@@ -37,24 +37,29 @@ export async function regenerateChapters(preserveEdited = false) {
   })
   
   try {
-    // 准备请求参数
-    const params = new URLSearchParams()
-    params.append('template_id', String(outlineState.templateId.value))
-    params.append('project_id', outlineState.projectId.value)
+    // 准备请求参数，输入文件引用创建项目时登记的input_file_id
+    const body: Record<string, any> = {
+      template_id: outlineState.templateId,
+      project_id: outlineState.projectId,
+      input_file_id: outlineState.inputFileId
+    }
     
     // 如果有自定义要求，也加入参数
     if (regenerateRequirement.value) {
-      params.append('requirement', regenerateRequirement.value)
+      body.requirement = regenerateRequirement.value
     }
     
     // 如果要保留用户编辑的部分，则传递当前章节数据
-    if (preserveEdited && outlineState.chapters.value.length > 0) {
-      params.append('preserveEdited', 'true')
-      params.append('currentChapters', JSON.stringify(outlineState.chapters.value))
+    if (preserveEdited && outlineState.chapters.length > 0) {
+      body.preserved_chapters = outlineState.chapters
     }
     
     // 调用API重新生成大纲
-    const response = await fetch(`/api/outlines/regenerate?${params.toString()}`)
+    const response = await fetch('/api/outlines/regenerate', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(body)
+    })
     const result = await response.json()
     
     if (!result.success) {
@@ -63,7 +68,7 @@ export async function regenerateChapters(preserveEdited = false) {
     
     // 更新章节数据
     if (result.data && Array.isArray(result.data.chapters)) {
-      outlineState.chapters.value = result.data.chapters
+      outlineState.chapters = result.data.chapters
       ElMessage.success('章节大纲已重新生成')
       
       // 保存到数据库
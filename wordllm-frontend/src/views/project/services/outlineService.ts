@@ -2,6 +2,15 @@
  * 大纲服务 - 处理大纲生成和编辑相关API
  */
 
+// 输入文件: 已登记的输入文件ID直接引用，否则上传文件
+function appendInputFile(formData: FormData, inputFile?: File | number) {
+  if (typeof inputFile === 'number') {
+    formData.append('input_file_id', String(inputFile));
+  } else if (inputFile) {
+    formData.append('input_file', inputFile);
+  }
+}
+
 // 生成大纲
 export async function generateOutline(templateId: number, formData: FormData) {
   try {
@@ -26,7 +35,7 @@ export async function regenerateOutline(
   templateId: number, 
   preservedChapters: any[] = [], 
   requirement: string = '',
-  inputFile?: File
+  inputFile?: File | number
 ) {
   try {
     const formData = new FormData();
@@ -40,9 +49,7 @@ export async function regenerateOutline(
       formData.append('preserved_chapters', JSON.stringify(preservedChapters));
     }
     
-    if (inputFile) {
-      formData.append('input_file', inputFile);
-    }
+    appendInputFile(formData, inputFile);
     
     const response = await fetch('/api/outlines/regenerate', {
       method: 'POST',
@@ -61,15 +68,13 @@ export async function regenerateOutline(
 }
 
 // 生成子章节
-export async function generateSubchapters(templateId: number, chapters: any[], inputFile?: File) {
+export async function generateSubchapters(templateId: number, chapters: any[], inputFile?: File | number) {
   try {
     const formData = new FormData();
     formData.append('template_id', templateId.toString());
     formData.append('chapters', JSON.stringify(chapters));
     
-    if (inputFile) {
-      formData.append('input_file', inputFile);
-    }
+    appendInputFile(formData, inputFile);
     
     const response = await fetch('/api/outlines/generate-subchapters', {
       method: 'POST',